@@ -0,0 +1,91 @@
+from datetime import date, timedelta
+
+from sqlalchemy import Date, Integer, cast, extract, func, literal_column
+
+from database import db
+
+
+def bucket_granularity(start_date, end_date):
+    span = (end_date - start_date).days
+    if span <= 31:
+        return "day"
+    if span <= 120:
+        return "week"
+    return "month"
+
+
+def build_buckets(start_date, end_date):
+    """Granularity and chart labels for every bucket in the inclusive range."""
+    gran = bucket_granularity(start_date, end_date)
+    if gran == "day":
+        count = (end_date - start_date).days + 1
+        labels = [
+            (start_date + timedelta(days=idx)).strftime("%m/%d")
+            for idx in range(count)
+        ]
+        return gran, labels
+    if gran == "week":
+        count = ((end_date - start_date).days // 7) + 1
+        labels = [
+            (start_date + timedelta(days=idx * 7)).strftime("%m/%d")
+            for idx in range(count)
+        ]
+        return gran, labels
+
+    # month
+    month_count = (end_date.year - start_date.year) * 12 + (end_date.month - start_date.month) + 1
+    labels = []
+    year = start_date.year
+    month = start_date.month
+    for _ in range(month_count):
+        labels.append(date(year, month, 1).strftime("%b %Y"))
+        month += 1
+        if month > 12:
+            month = 1
+            year += 1
+    return gran, labels
+
+
+def _int_literal(value):
+    # Rendered inline rather than bound so the SELECT and GROUP BY expressions
+    # are textually identical, which PostgreSQL requires for grouping.
+    return literal_column(str(int(value)), Integer)
+
+
+def bucket_index(column, gran, start_date):
+    """
+    SQL expression for the bucket a date/datetime column falls into.
+
+    Buckets match ``build_buckets``: days and 7-day weeks are counted from
+    ``start_date``, months are calendar months. Group by the returned
+    expression to get one row per bucket from the database.
+    """
+    dialect = db.session.get_bind().dialect.name
+
+    if gran == "month":
+        start_month = start_date.year * 12 + start_date.month
+        if dialect == "sqlite":
+            month_number = (
+                cast(func.strftime("%Y", column), Integer) * _int_literal(12)
+                + cast(func.strftime("%m", column), Integer)
+            )
+        else:
+            month_number = cast(extract("year", column) * _int_literal(12) + extract("month", column), Integer)
+        return month_number - _int_literal(start_month)
+
+    if dialect == "sqlite":
+        days = cast(
+            func.julianday(func.date(column)) - func.julianday(literal_column(f"'{start_date.isoformat()}'")),
+            Integer,
+        )
+    else:
+        # date - date is a whole number of days in PostgreSQL
+        days = cast(column, Date) - literal_column(f"DATE '{start_date.isoformat()}'", Date)
+    if gran == "week":
+        return days // _int_literal(7)
+    return days
+
+
+def fill_buckets(labels, totals, default=0):
+    """Zero-filled series for ``labels`` from a {bucket_index: value} mapping."""
+    return [totals.get(idx, default) for idx in range(len(labels))]
@@ -0,0 +1,278 @@
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import and_, delete, func, insert, inspect, literal
+
+from cache import ANALYTICS_TAG, invalidate_on_commit
+from database import db
+from models import AnalyticsDailyRollup, ContactInteractions, Invoice, InvoiceBalance, Payment, Tasks
+
+
+UNASSIGNED = 0
+CHUNK_SIZE = 1000
+
+METRICS = (
+    "payments",
+    "interactions",
+    "tasks_created",
+    "tasks_completed",
+    "invoices_opened",
+    "invoices_closed",
+)
+
+
+def _to_decimal(value):
+    try:
+        return Decimal(str(value))
+    except Exception:
+        return Decimal("0")
+
+
+def _to_cents(value):
+    return int((_to_decimal(value).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)) * 100)
+
+
+def _day(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and value:
+        return datetime.strptime(value[:10], "%Y-%m-%d").date()
+    return None
+
+
+def _user_filter(column, user_id):
+    if user_id is None:
+        return None
+    if user_id == UNASSIGNED:
+        return column.is_(None)
+    return column == user_id
+
+
+def _range_filter(column, start_day, end_day):
+    clauses = []
+    if start_day:
+        clauses.append(column >= datetime.combine(start_day, time.min))
+    if end_day:
+        clauses.append(column < datetime.combine(end_day + timedelta(days=1), time.min))
+    return clauses
+
+
+def _filtered(query, column, user_column, start_day, end_day, user_id):
+    clauses = _range_filter(column, start_day, end_day)
+    user_clause = _user_filter(user_column, user_id)
+    if user_clause is not None:
+        clauses.append(user_clause)
+    return query.filter(*clauses) if clauses else query
+
+
+def _grouped(metric, column, user_column, start_day, end_day, user_id, dimension=None, amount=None, extra=()):
+    """Rows of (day, user, dimension, count, amount) grouped in SQL by calendar day."""
+    day = func.date(column)
+    entities = [day, user_column, dimension if dimension is not None else literal(""), func.count()]
+    if amount is not None:
+        entities.append(func.coalesce(func.sum(amount), 0))
+    query = _filtered(db.session.query(*entities), column, user_column, start_day, end_day, user_id)
+    query = query.filter(column.isnot(None), *extra)
+    group = [day, user_column] + ([dimension] if dimension is not None else [])
+    for row in query.group_by(*group):
+        yield {
+            "metric": metric,
+            "day": _day(row[0]),
+            "user_id": row[1] or UNASSIGNED,
+            "dimension": row[2] or "",
+            "count": int(row[3] or 0),
+            "amount_cents": _to_cents(row[4]) if amount is not None else 0,
+            "value_total": 0,
+        }
+
+
+def _closed_invoices(start_day, end_day, user_id):
+    """Invoices paid in full, bucketed by final payment day; value_total sums days to pay."""
+    query = (
+        db.session.query(
+            InvoiceBalance.latest_payment_at,
+            InvoiceBalance.final_cents,
+            Invoice.date_created,
+            Invoice.sales_rep_id,
+        )
+        .join(Invoice, Invoice.invoice_id == InvoiceBalance.invoice_id)
+        .filter(
+            InvoiceBalance.paid_in_full == True,
+            InvoiceBalance.latest_payment_at.isnot(None),
+            Invoice.date_created.isnot(None),
+        )
+    )
+    query = _filtered(query, InvoiceBalance.latest_payment_at, Invoice.sales_rep_id, start_day, end_day, user_id)
+    buckets = {}
+    for latest_paid, final_cents, date_created, sales_rep_id in query.yield_per(CHUNK_SIZE):
+        paid_day = _day(latest_paid)
+        key = (paid_day, sales_rep_id or UNASSIGNED)
+        bucket = buckets.setdefault(key, {
+            "metric": "invoices_closed",
+            "day": paid_day,
+            "user_id": key[1],
+            "dimension": "",
+            "count": 0,
+            "amount_cents": 0,
+            "value_total": 0,
+        })
+        bucket["count"] += 1
+        bucket["amount_cents"] += int(final_cents or 0)
+        bucket["value_total"] += (paid_day - _day(date_created)).days
+    return buckets.values()
+
+
+def _source_rows(metric, start_day=None, end_day=None, user_id=None):
+    if metric == "payments":
+        return _grouped(metric, Payment.date_paid, Payment.sales_rep_id, start_day, end_day, user_id,
+                        amount=Payment.total_paid)
+    if metric == "interactions":
+        return _grouped(metric, ContactInteractions.created_at, ContactInteractions.user_id, start_day, end_day, user_id,
+                        dimension=ContactInteractions.interaction_type)
+    if metric == "tasks_created":
+        return _grouped(metric, Tasks.date_created, Tasks.assigned_to, start_day, end_day, user_id)
+    if metric == "tasks_completed":
+        return _grouped(metric, Tasks.completed_at, Tasks.assigned_to, start_day, end_day, user_id,
+                        extra=(Tasks.is_completed == True,))
+    if metric == "invoices_opened":
+        return _grouped(metric, Invoice.date_created, Invoice.sales_rep_id, start_day, end_day, user_id,
+                        amount=Invoice.final_total)
+    if metric == "invoices_closed":
+        return _closed_invoices(start_day, end_day, user_id)
+    raise ValueError(f"Unknown rollup metric: {metric}")
+
+
+def _stored_days(obj, *columns):
+    """
+    Days of ``columns`` on the flushed row, as ``DATE()`` in the database.
+
+    The recompute buckets rows with ``DATE()`` in the session's time zone, so
+    the keys must too: the in-memory value may carry another zone (payments
+    are stamped in US/Central) and fall on a different day.
+    """
+    identity = inspect(obj).identity
+    if identity is None:
+        return [_day(getattr(obj, column.key)) for column in columns]
+    primary_key = inspect(type(obj)).primary_key
+    row = (
+        db.session.query(*[func.date(column) for column in columns])
+        .filter(*[column == value for column, value in zip(primary_key, identity)])
+        .first()
+    )
+    return [_day(value) for value in row] if row else [None] * len(columns)
+
+
+def _keys_for(obj):
+    if isinstance(obj, Payment):
+        (paid_day,) = _stored_days(obj, Payment.date_paid)
+        return [("payments", paid_day, obj.sales_rep_id)]
+    if isinstance(obj, ContactInteractions):
+        (created_day,) = _stored_days(obj, ContactInteractions.created_at)
+        return [("interactions", created_day, obj.user_id)]
+    if isinstance(obj, Tasks):
+        created_day, completed_day = _stored_days(obj, Tasks.date_created, Tasks.completed_at)
+        keys = [("tasks_created", created_day, obj.assigned_to)]
+        if obj.is_completed:
+            keys.append(("tasks_completed", completed_day, obj.assigned_to))
+        return keys
+    if isinstance(obj, Invoice):
+        (created_day,) = _stored_days(obj, Invoice.date_created)
+        keys = [("invoices_opened", created_day, obj.sales_rep_id)]
+        balance = db.session.get(InvoiceBalance, obj.invoice_id)
+        if balance and balance.paid_in_full:
+            (paid_day,) = _stored_days(balance, InvoiceBalance.latest_payment_at)
+            keys.append(("invoices_closed", paid_day, obj.sales_rep_id))
+        return keys
+    raise TypeError(f"No analytics rollups for {type(obj).__name__}")
+
+
+def rollup_keys(*objects):
+    """
+    The (metric, day, user) buckets the given rows currently count towards.
+
+    Take the keys before and after a write and pass their union to
+    ``refresh_rollups`` so both the old and the new buckets are corrected.
+    """
+    db.session.flush()
+    keys = set()
+    for obj in objects:
+        if obj is None:
+            continue
+        for metric, day, user_id in _keys_for(obj):
+            if day:
+                keys.add((metric, day, user_id or UNASSIGNED))
+    return keys
+
+
+def refresh_rollups(keys):
+    """Recompute the given buckets from the source tables inside the current transaction."""
+    if not keys:
+        return 0
+    db.session.flush()
+    for metric, day, user_id in sorted(keys):
+        db.session.execute(
+            delete(AnalyticsDailyRollup).where(
+                AnalyticsDailyRollup.metric == metric,
+                AnalyticsDailyRollup.day == day,
+                AnalyticsDailyRollup.user_id == user_id,
+            )
+        )
+        rows = list(_source_rows(metric, day, day, user_id))
+        if rows:
+            db.session.execute(insert(AnalyticsDailyRollup), rows)
+    invalidate_on_commit(ANALYTICS_TAG)
+    return len(keys)
+
+
+def rebuild_rollups(start_day=None, end_day=None, metrics=METRICS):
+    """Recompute every bucket between ``start_day`` and ``end_day`` (unbounded when None) and commit."""
+    total = 0
+    for metric in metrics:
+        clauses = [AnalyticsDailyRollup.metric == metric]
+        if start_day:
+            clauses.append(AnalyticsDailyRollup.day >= start_day)
+        if end_day:
+            clauses.append(AnalyticsDailyRollup.day <= end_day)
+        db.session.execute(delete(AnalyticsDailyRollup).where(and_(*clauses)))
+
+        batch = []
+        for row in _source_rows(metric, start_day, end_day):
+            batch.append(row)
+            if len(batch) >= CHUNK_SIZE:
+                db.session.execute(insert(AnalyticsDailyRollup), batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(AnalyticsDailyRollup), batch)
+            total += len(batch)
+    invalidate_on_commit(ANALYTICS_TAG)
+    db.session.commit()
+    return total
+
+
+def rollup_query(metric, start_day, end_day, user_id=None):
+    """Base query over one metric's (or a tuple of metrics') buckets in an inclusive day range."""
+    if isinstance(metric, (tuple, list)):
+        metric_filter = AnalyticsDailyRollup.metric.in_(metric)
+    else:
+        metric_filter = AnalyticsDailyRollup.metric == metric
+    query = AnalyticsDailyRollup.query.filter(
+        metric_filter,
+        AnalyticsDailyRollup.day >= start_day,
+        AnalyticsDailyRollup.day <= end_day,
+    )
+    if user_id:
+        query = query.filter(AnalyticsDailyRollup.user_id == user_id)
+    return query
+
+
+def rollup_totals(metric, start_day, end_day, user_id=None):
+    """Summed (count, amount_cents, value_total) for one metric over a day range."""
+    count, amount_cents, value_total = rollup_query(metric, start_day, end_day, user_id).with_entities(
+        func.coalesce(func.sum(AnalyticsDailyRollup.count), 0),
+        func.coalesce(func.sum(AnalyticsDailyRollup.amount_cents), 0),
+        func.coalesce(func.sum(AnalyticsDailyRollup.value_total), 0),
+    ).one()
+    return int(count or 0), int(amount_cents or 0), int(value_total or 0)
@@ -1,8 +1,12 @@
 from flask import Flask, jsonify
-from flask_session import Session
 from flask_cors import CORS
 from config import Config
 from database import db
+from cache import init_cache
+from instrumentation import init_instrumentation
+from outbox import init_outbox
+from schema_migrations import check_schema
+from session_store import init_sessions
 import os
 
 # Route Blueprints
@@ -18,6 +22,7 @@ from routes.department_routes import department_bp
 from routes.employee_routes import employee_bp
 from routes.industry_routes import industry_bp
 from routes.invoice_routes import invoice_bp
+from routes.metrics_routes import metrics_bp
 from routes.notes_routes import notes_bp
 from routes.notification_routes import notification_bp
 from routes.payment_routes import payment_bp
@@ -37,8 +42,12 @@ app.url_map.strict_slashes = False
 # ProxyFix middleware removed - no longer needed with Tailscale Funnel
 # Tailscale handles header proxying securely through its tunnel
 
-Session(app)
+init_cache(app)
+init_sessions(app)
 db.init_app(app)
+init_instrumentation(app)
+init_outbox(app)
+check_schema(app)
 
 def get_cors_origins():
     env_origins = os.getenv("CORS_ORIGINS", "").strip()
@@ -72,6 +81,7 @@ app.register_blueprint(department_bp, url_prefix="/departments")
 app.register_blueprint(employee_bp, url_prefix="/employees")
 app.register_blueprint(industry_bp, url_prefix="/industries")
 app.register_blueprint(invoice_bp, url_prefix="/invoices")
+app.register_blueprint(metrics_bp, url_prefix="/metrics")
 app.register_blueprint(notes_bp, url_prefix="/notes")
 app.register_blueprint(notification_bp, url_prefix="/notifications")
 app.register_blueprint(payment_bp, url_prefix="/payment")
@@ -105,6 +115,5 @@ def test_cors():
 #             app.run(host="0.0.0.0", port=5001, debug=True)
             
 if __name__ == "__main__":
-    with app.app_context():
-        db.create_all()
+    # Schema changes go through `python -m scripts.migrate upgrade`; startup only checks the version.
     app.run(host="0.0.0.0", port=5002, debug=False)
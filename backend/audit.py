@@ -1,17 +1,21 @@
 from datetime import date, datetime
 from decimal import Decimal
 
+from sqlalchemy import insert
+
 from models import AuditLog, Users
 from database import db
+from outbox import enqueue, register
+
+
+AUDIT_LOG_KIND = "audit_log"
 
 
-def _resolve_user_email(user_id, fallback_email=None):
-    if fallback_email:
-        return fallback_email
-    if not user_id:
-        return None
-    user = Users.query.get(user_id)
-    return user.email if user else None
+def _emails_by_user(user_ids):
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids:
+        return {}
+    return dict(db.session.query(Users.user_id, Users.email).filter(Users.user_id.in_(user_ids)))
 
 
 def _json_safe(value):
@@ -41,18 +45,32 @@ def create_audit_log(
     before_data=None,
     after_data=None,
 ):
-    resolved_email = _resolve_user_email(user_id, user_email)
-    audit = AuditLog(
-        entity_type=entity_type,
-        entity_id=entity_id,
-        action=action,
-        user_id=user_id,
-        user_email=resolved_email,
-        account_id=account_id,
-        invoice_id=invoice_id,
-        contact_id=contact_id,
-        before_data=_json_safe(before_data),
-        after_data=_json_safe(after_data),
-    )
-    db.session.add(audit)
-    return audit
+    """Queue an audit row through the outbox; it commits with the caller's change."""
+    return enqueue(AUDIT_LOG_KIND, {
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "action": action,
+        "user_id": user_id,
+        "user_email": user_email,
+        "account_id": account_id,
+        "invoice_id": invoice_id,
+        "contact_id": contact_id,
+        "before_data": _json_safe(before_data),
+        "after_data": _json_safe(after_data),
+        "created_at": datetime.now().isoformat(sep=" "),
+    })
+
+
+@register(AUDIT_LOG_KIND)
+def _write_audit_logs(payloads):
+    """Insert queued audit rows, resolving missing actor emails with one query per batch."""
+    emails = _emails_by_user(payload["user_id"] for payload in payloads if not payload.get("user_email"))
+    rows = [
+        dict(
+            payload,
+            user_email=payload.get("user_email") or emails.get(payload["user_id"]),
+            created_at=datetime.fromisoformat(payload["created_at"]),
+        )
+        for payload in payloads
+    ]
+    db.session.execute(insert(AuditLog).values(rows))
@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import db
+from models import (
+    Account,
+    AnalyticsDailyRollup,
+    Contact,
+    ContactInteractions,
+    Invoice,
+    InvoiceBalance,
+    InvoicePipeline,
+    Payment,
+    Tasks,
+    Users,
+)
+
+
+DEFAULT_TTL = 300
+LOCAL_MAX_ENTRIES = 10000
+
+ANALYTICS_TAG = "analytics"
+PIPELINES_TAG = "pipelines"
+
+# Committing a flush that touched one of these models invalidates the tags.
+# Bulk Core statements bypass the unit of work and must call
+# ``invalidate_on_commit`` themselves.
+MODEL_TAGS = {
+    Account: (ANALYTICS_TAG, PIPELINES_TAG),
+    AnalyticsDailyRollup: (ANALYTICS_TAG,),
+    Contact: (ANALYTICS_TAG,),
+    ContactInteractions: (ANALYTICS_TAG,),
+    Invoice: (ANALYTICS_TAG, PIPELINES_TAG),
+    InvoiceBalance: (ANALYTICS_TAG, PIPELINES_TAG),
+    InvoicePipeline: (ANALYTICS_TAG, PIPELINES_TAG),
+    Payment: (ANALYTICS_TAG, PIPELINES_TAG),
+    Tasks: (ANALYTICS_TAG,),
+    Users: (ANALYTICS_TAG,),
+}
+
+
+class LocalCacheBackend:
+    """In-process LRU with per-key expiry; the default tier and the stand-in for Redis."""
+
+    def __init__(self, max_entries=LOCAL_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at < now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            return [self._live(key, now) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add(self, key, value):
+        with self._lock:
+            if self._live(key, time.monotonic()) is not None:
+                return False
+            self._entries[key] = (value, None)
+            return True
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCacheBackend:
+    """Shared tier on any redis-py compatible client (redis.Redis, fakeredis.FakeRedis)."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get_many(self, keys):
+        return self.client.mget(keys)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=ttl)
+
+    def add(self, key, value):
+        return bool(self.client.set(key, value, nx=True))
+
+    def delete(self, keys):
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self):
+        self.client.flushdb()
+
+
+class Cache:
+    """
+    JSON values with tag-based invalidation on top of a key/value backend.
+
+    Each tag has an opaque token; an entry records the tokens of its tags when
+    it was computed, and ``invalidate_tags`` replaces them, so every entry of a
+    tag goes stale at once without tracking its keys. A missing token (e.g.
+    evicted) counts as stale too.
+    """
+
+    def __init__(self, backend, prefix="theofficecms:", default_ttl=DEFAULT_TTL):
+        self.backend = backend
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    def _tag_key(self, tag):
+        return f"{self.prefix}tag:{tag}"
+
+    @staticmethod
+    def _token(raw):
+        if raw is None:
+            return None
+        return raw.decode("utf-8") if isinstance(raw, bytes) else raw
+
+    def tag_tokens(self, tags):
+        """Current token of each tag, creating tokens for tags never seen before."""
+        tags = list(tags)
+        if not tags:
+            return {}
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        tokens = [self._token(raw) for raw in self.backend.get_many(tag_keys)]
+        for idx, token in enumerate(tokens):
+            if token is None:
+                self.backend.add(tag_keys[idx], uuid.uuid4().hex)
+                tokens[idx] = self._token(self.backend.get_many([tag_keys[idx]])[0])
+        return dict(zip(tags, tokens))
+
+    def _fresh_value(self, raw, tokens):
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        if any(entry["tags"].get(tag) != token for tag, token in tokens.items()):
+            return None
+        return entry
+
+    def get(self, key, tags=()):
+        tags = list(tags)
+        raws = self.backend.get_many([self._key(key)] + [self._tag_key(tag) for tag in tags])
+        tokens = {tag: self._token(raw) for tag, raw in zip(tags, raws[1:])}
+        if any(token is None for token in tokens.values()):
+            return None
+        entry = self._fresh_value(raws[0], tokens)
+        return entry["value"] if entry else None
+
+    def set(self, key, value, ttl=None, tags=(), tokens=None):
+        if tokens is None:
+            tokens = self.tag_tokens(tags)
+        payload = json.dumps({"value": value, "tags": tokens}, separators=(",", ":"))
+        self.backend.set(self._key(key), payload, ttl or self.default_ttl)
+
+    def cached(self, key, loader, ttl=None, tags=()):
+        """
+        Return the cached value for ``key`` or compute, store and return it.
+
+        Tag tokens are read before ``loader`` runs, so an invalidation that
+        lands mid-computation leaves the stored value already stale.
+        """
+        value = self.get(key, tags)
+        if value is not None:
+            return value
+        tokens = self.tag_tokens(tags)
+        value = loader()
+        self.set(key, value, ttl=ttl, tokens=tokens)
+        return value
+
+    def delete(self, *keys):
+        self.backend.delete([self._key(key) for key in keys])
+
+    def invalidate_tags(self, *tags):
+        for tag in tags:
+            self.backend.set(self._tag_key(tag), uuid.uuid4().hex)
+
+
+cache = Cache(LocalCacheBackend())
+
+
+def redis_client(url):
+    if url.startswith("fakeredis://"):
+        import fakeredis
+        return fakeredis.FakeRedis()
+    try:
+        import redis
+    except ImportError as exc:
+        raise RuntimeError("CACHE_URL points at Redis but the 'redis' package is not installed") from exc
+    return redis.Redis.from_url(url)
+
+
+def invalidate_on_commit(*tags, session=None):
+    """Invalidate ``tags`` once the current transaction commits (dropped on rollback)."""
+    session = session or db.session()
+    session.info.setdefault("cache_tags", set()).update(tags)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tags(session, _flush_context):
+    tags = set()
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        tags.update(MODEL_TAGS.get(type(instance), ()))
+    if tags:
+        session.info.setdefault("cache_tags", set()).update(tags)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_tags(session):
+    tags = session.info.pop("cache_tags", None)
+    if tags:
+        cache.invalidate_tags(*tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_tags(session):
+    session.info.pop("cache_tags", None)
+
+
+def init_cache(app):
+    """
+    Pick the cache tier from ``CACHE_URL`` (app config or environment).
+
+    ``redis://`` / ``rediss://`` / ``unix://`` URLs use a shared Redis (which
+    ``init_sessions`` also picks up for sessions); ``fakeredis://`` runs the
+    Redis code path against an in-process fake. With no URL the in-process LRU
+    is used.
+    """
+    url = app.config.get("CACHE_URL") or os.environ.get("CACHE_URL")
+    cache.default_ttl = int(app.config.get("CACHE_DEFAULT_TTL", os.environ.get("CACHE_DEFAULT_TTL", DEFAULT_TTL)))
+    if not url:
+        cache.backend = LocalCacheBackend()
+        return cache
+
+    cache.backend = RedisCacheBackend(redis_client(url))
+    return cache
@@ -0,0 +1,297 @@
+import calendar
+from datetime import date, timedelta
+from functools import lru_cache
+
+from sqlalchemy import and_, or_
+
+from models import CalendarEvent, CalendarEventException
+
+
+# The RRULE subset the calendar supports (RFC 5545 names):
+#   FREQ=DAILY|WEEKLY|MONTHLY|YEARLY [;INTERVAL=n] [;COUNT=n | ;UNTIL=YYYYMMDD] [;BYDAY=MO,WE,...]
+# BYDAY applies to WEEKLY rules only. MONTHLY/YEARLY repeat on the series'
+# start day and skip months (or years) that lack it, as RFC 5545 does.
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+MAX_COUNT = 1000
+EXPANSION_CACHE_SIZE = 1024
+# Longest window a listing may expand (a year view plus a little slack).
+MAX_WINDOW_DAYS = 400
+# Stops a MONTHLY/YEARLY rule whose start day never recurs (e.g. Feb 29 every 4 years from an odd year).
+MAX_MONTH_STEPS = 12 * 1000
+# UNTIL dates past this are rejected; they would only push date arithmetic towards date.max.
+MAX_UNTIL = date(2199, 12, 31)
+
+# Fields an exception row can override on a single occurrence.
+OVERRIDE_FIELDS = ("event_title", "location", "start_time", "end_time", "notes")
+
+
+def parse_rule(rule):
+    """Parse an RRULE string into a dict; raises ValueError on anything outside the supported subset."""
+    if not rule:
+        raise ValueError("Recurrence rule is empty")
+    rule = rule.strip().upper()
+    if rule.startswith("RRULE:"):
+        rule = rule[len("RRULE:"):]
+    parts = {}
+    for part in rule.split(";"):
+        if not part:
+            continue
+        key, sep, value = part.partition("=")
+        if not sep or not value:
+            raise ValueError(f"Invalid recurrence rule part: {part}")
+        parts[key] = value
+
+    freq = parts.pop("FREQ", None)
+    if freq not in FREQUENCIES:
+        raise ValueError(f"FREQ must be one of {', '.join(FREQUENCIES)}")
+    parsed = {"freq": freq, "interval": 1, "count": None, "until": None, "byday": None}
+
+    if "INTERVAL" in parts:
+        parsed["interval"] = int(parts.pop("INTERVAL"))
+        if parsed["interval"] < 1:
+            raise ValueError("INTERVAL must be at least 1")
+    if "COUNT" in parts and "UNTIL" in parts:
+        raise ValueError("COUNT and UNTIL cannot both be set")
+    if "COUNT" in parts:
+        parsed["count"] = int(parts.pop("COUNT"))
+        if not 1 <= parsed["count"] <= MAX_COUNT:
+            raise ValueError(f"COUNT must be between 1 and {MAX_COUNT}")
+    if "UNTIL" in parts:
+        until = parts.pop("UNTIL")[:8]
+        parsed["until"] = date(int(until[:4]), int(until[4:6]), int(until[6:8]))
+        if parsed["until"] > MAX_UNTIL:
+            raise ValueError(f"UNTIL must be on or before {MAX_UNTIL.strftime('%Y%m%d')}")
+    if "BYDAY" in parts:
+        if freq != "WEEKLY":
+            raise ValueError("BYDAY is only supported with FREQ=WEEKLY")
+        days = parts.pop("BYDAY").split(",")
+        if any(day not in WEEKDAYS for day in days):
+            raise ValueError(f"BYDAY values must be in {', '.join(WEEKDAYS)}")
+        parsed["byday"] = tuple(sorted({WEEKDAYS.index(day) for day in days}))
+    if parts:
+        raise ValueError(f"Unsupported recurrence rule parts: {', '.join(sorted(parts))}")
+    return parsed
+
+
+def normalize_rule(rule):
+    """Canonical form of ``rule`` for storage, or None for an empty rule."""
+    if not rule:
+        return None
+    parsed = parse_rule(rule)
+    parts = [f"FREQ={parsed['freq']}"]
+    if parsed["interval"] != 1:
+        parts.append(f"INTERVAL={parsed['interval']}")
+    if parsed["byday"]:
+        parts.append("BYDAY=" + ",".join(WEEKDAYS[day] for day in parsed["byday"]))
+    if parsed["count"]:
+        parts.append(f"COUNT={parsed['count']}")
+    if parsed["until"]:
+        parts.append(f"UNTIL={parsed['until'].strftime('%Y%m%d')}")
+    return ";".join(parts)
+
+
+def _add_months(day, months, anchor_day):
+    """``day`` moved ``months`` ahead, on ``anchor_day``; None when that month is too short."""
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    if anchor_day > calendar.monthrange(year, month)[1]:
+        return None
+    return date(year, month, anchor_day)
+
+
+def _iter_dates(parsed, dtstart, skip_to=None):
+    """
+    Occurrence dates in order, unbounded unless COUNT/UNTIL end the series.
+
+    Without COUNT, the start of the series is skipped arithmetically up to
+    the period containing ``skip_to``, so expanding a window years into a
+    daily series costs the same as expanding the first one.
+    """
+    freq, interval = parsed["freq"], parsed["interval"]
+    can_skip = skip_to is not None and parsed["count"] is None and skip_to > dtstart
+
+    if freq == "DAILY":
+        step = 0
+        if can_skip:
+            step = (skip_to - dtstart).days // interval
+        while True:
+            yield dtstart + timedelta(days=step * interval)
+            step += 1
+
+    elif freq == "WEEKLY":
+        weekdays = parsed["byday"] or (dtstart.weekday(),)
+        week_start = dtstart - timedelta(days=dtstart.weekday())
+        step = 0
+        if can_skip:
+            step = ((skip_to - week_start).days // 7) // interval
+        while True:
+            current_week = week_start + timedelta(weeks=step * interval)
+            for weekday in weekdays:
+                day = current_week + timedelta(days=weekday)
+                if day >= dtstart:
+                    yield day
+            step += 1
+
+    else:
+        months = interval if freq == "MONTHLY" else interval * 12
+        step = 0
+        if can_skip:
+            elapsed = (skip_to.year - dtstart.year) * 12 + skip_to.month - dtstart.month
+            step = max(elapsed // months, 0)
+        while True:
+            day = _add_months(dtstart, step * months, dtstart.day)
+            if day is not None:
+                yield day
+            step += 1
+            if step * months > MAX_MONTH_STEPS:
+                return
+
+
+@lru_cache(maxsize=EXPANSION_CACHE_SIZE)
+def _expand(rule, dtstart, window_start, window_end):
+    parsed = parse_rule(rule)
+    dates = []
+    for index, day in enumerate(_iter_dates(parsed, dtstart, skip_to=window_start)):
+        if parsed["count"] is not None and index >= parsed["count"]:
+            break
+        if parsed["until"] is not None and day > parsed["until"]:
+            break
+        if day > window_end:
+            break
+        if day >= window_start:
+            dates.append(day)
+    return tuple(dates)
+
+
+def occurrence_dates(rule, dtstart, window_start, window_end):
+    """
+    Start dates of the occurrences of ``rule`` from ``dtstart`` that fall in
+    [window_start, window_end].
+
+    Only the requested window is expanded. Results are kept in a small
+    in-process LRU keyed by (rule, dtstart, window): the expansion depends on
+    nothing else, so editing a series changes the key and nothing needs
+    invalidating.
+    """
+    if window_end < window_start:
+        return ()
+    return _expand(rule, dtstart, window_start, window_end)
+
+
+def series_until(rule, dtstart):
+    """Date of the last occurrence, or None for a series without an end."""
+    parsed = parse_rule(rule)
+    if parsed["count"] is None and parsed["until"] is None:
+        return None
+    skip_to = None
+    if parsed["count"] is None:
+        # Start one period before UNTIL: the last occurrence can't come earlier,
+        # so a distant UNTIL costs no more than a near one.
+        lead = {"DAILY": parsed["interval"], "WEEKLY": 7 * parsed["interval"]}.get(parsed["freq"])
+        if lead:
+            skip_to = parsed["until"] - timedelta(days=lead)
+    last = None
+    for index, day in enumerate(_iter_dates(parsed, dtstart, skip_to=skip_to)):
+        if parsed["count"] is not None and index >= parsed["count"]:
+            break
+        if parsed["until"] is not None and day > parsed["until"]:
+            break
+        last = day
+    return last or dtstart
+
+
+def in_window(window_start=None, window_end=None):
+    """
+    Filter for events with anything to show in the window: single events
+    overlapping it, and series that have started by its end and not finished
+    before its start.
+    """
+    single = [CalendarEvent.recurrence_rule.is_(None)]
+    series = [CalendarEvent.recurrence_rule.isnot(None)]
+    if window_start:
+        single.append(CalendarEvent.end_date >= window_start)
+        series.append(or_(CalendarEvent.recurrence_until.is_(None), CalendarEvent.recurrence_until >= window_start))
+    if window_end:
+        single.append(CalendarEvent.start_date <= window_end)
+        series.append(CalendarEvent.start_date <= window_end)
+    return or_(and_(*single), and_(*series))
+
+
+class Occurrence:
+    """One expanded instance of a recurring event, shaped like a ``CalendarEvent`` for serializers."""
+
+    def __init__(self, series, occurrence_date, exception=None):
+        self.series = series
+        self.occurrence_date = occurrence_date
+        self.is_override = exception is not None
+        duration = series.end_date - series.start_date
+        for column in ("event_id", "reminder_minutes", "account_id", "user_id",
+                       "contact_name", "phone_number", "recurrence_rule"):
+            setattr(self, column, getattr(series, column))
+        for field in OVERRIDE_FIELDS:
+            override = getattr(exception, field, None) if exception is not None else None
+            setattr(self, field, override if override is not None else getattr(series, field))
+        self.start_date = (exception.start_date if exception is not None and exception.start_date else occurrence_date)
+        self.end_date = (exception.end_date if exception is not None and exception.end_date else self.start_date + duration)
+
+
+def _exceptions_by_series(series_ids, window_start, window_end):
+    exceptions = {}
+    if not series_ids:
+        return exceptions
+    rows = CalendarEventException.query.filter(
+        CalendarEventException.event_id.in_(series_ids),
+        or_(
+            CalendarEventException.occurrence_date.between(window_start, window_end),
+            CalendarEventException.start_date.between(window_start, window_end),
+        ),
+    )
+    for row in rows:
+        exceptions[(row.event_id, row.occurrence_date)] = row
+    return exceptions
+
+
+def expand_events(events, window_start, window_end):
+    """
+    Single events as they are, plus every occurrence of each series that
+    overlaps [window_start, window_end] with its exception applied.
+
+    Exceptions for all series come from one query; cancelled occurrences are
+    dropped, and overrides moved into the window from outside it are included.
+    """
+    series = [event for event in events if event.recurrence_rule]
+    # Multi-day occurrences starting up to the longest duration before the
+    # window overlap it, so their exceptions are needed too.
+    longest = max((event.end_date - event.start_date for event in series), default=timedelta(0))
+    exceptions = _exceptions_by_series([event.event_id for event in series], window_start - longest, window_end)
+
+    expanded = [event for event in events if not event.recurrence_rule]
+    for event in series:
+        # A multi-day occurrence starting before the window can still overlap it.
+        lead = event.end_date - event.start_date
+        dates = set(occurrence_dates(event.recurrence_rule, event.start_date, window_start - lead, window_end))
+        # Overrides moved into the window from an occurrence outside it.
+        dates.update(
+            day for (event_id, day) in exceptions
+            if event_id == event.event_id and day not in dates
+            and occurrence_dates(event.recurrence_rule, event.start_date, day, day)
+        )
+        for day in sorted(dates):
+            exception = exceptions.get((event.event_id, day))
+            if exception is not None and exception.is_cancelled:
+                continue
+            occurrence = Occurrence(event, day, exception)
+            if occurrence.end_date >= window_start and occurrence.start_date <= window_end:
+                expanded.append(occurrence)
+
+    expanded.sort(key=lambda item: (item.start_date, _time_key(item.start_time), item.event_id))
+    return expanded
+
+
+def _time_key(value):
+    try:
+        return value.time()
+    except AttributeError:
+        return value
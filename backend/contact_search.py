@@ -0,0 +1,188 @@
+import re
+
+from sqlalchemy import Float, Integer, bindparam, cast, delete, func, insert, literal, literal_column, or_, text
+
+from database import db
+from models import Account, AccountContacts, Contact, ContactSearch, Users
+
+
+SEARCH_CONFIG = literal_column("'simple'::regconfig")
+CHUNK_SIZE = 1000
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _document(*parts):
+    return " ".join(part.strip().lower() for part in parts if part and part.strip())
+
+
+def _build_documents(contact_ids):
+    """Searchable text per contact: its own fields, linked accounts and owner."""
+    contacts = (
+        db.session.query(
+            Contact.contact_id,
+            Contact.first_name,
+            Contact.last_name,
+            Contact.title,
+            Contact.email,
+            Contact.phone,
+            Users.first_name.label("owner_first_name"),
+            Users.last_name.label("owner_last_name"),
+        )
+        .outerjoin(Users, Users.user_id == Contact.contact_owner_user_id)
+        .filter(Contact.contact_id.in_(contact_ids))
+        .all()
+    )
+    account_parts = {}
+    account_rows = (
+        db.session.query(
+            AccountContacts.contact_id,
+            Account.business_name,
+            Account.address,
+            Account.city,
+            Account.state,
+            Account.email,
+            Account.phone_number,
+        )
+        .join(Account, Account.account_id == AccountContacts.account_id)
+        .filter(AccountContacts.contact_id.in_(contact_ids))
+        .order_by(AccountContacts.contact_id, Account.account_id)
+        .all()
+    )
+    for row in account_rows:
+        account_parts.setdefault(row.contact_id, []).extend(
+            [row.business_name, row.address, row.city, row.state, row.email, row.phone_number]
+        )
+
+    return {
+        row.contact_id: _document(
+            row.first_name,
+            row.last_name,
+            row.title,
+            row.email,
+            row.phone,
+            *account_parts.get(row.contact_id, []),
+            row.owner_first_name,
+            row.owner_last_name,
+        )
+        for row in contacts
+    }
+
+
+def _write_documents(contact_ids, documents):
+    db.session.execute(delete(ContactSearch).where(ContactSearch.contact_id.in_(contact_ids)))
+    rows = [{"contact_id": contact_id, "document": document} for contact_id, document in documents.items()]
+    if rows:
+        db.session.execute(insert(ContactSearch), rows)
+
+    if _dialect() == "sqlite":
+        db.session.execute(
+            text("DELETE FROM contact_search_fts WHERE rowid IN :contact_ids").bindparams(
+                bindparam("contact_ids", expanding=True)
+            ),
+            {"contact_ids": list(contact_ids)},
+        )
+        if rows:
+            db.session.execute(
+                text("INSERT INTO contact_search_fts (rowid, document) VALUES (:contact_id, :document)"),
+                rows,
+            )
+
+
+def refresh_contact_search(contact_ids):
+    """
+    Rebuild the search documents for the given contacts in the current transaction.
+
+    Contacts that no longer exist are dropped from the index.
+    """
+    contact_ids = sorted({int(contact_id) for contact_id in contact_ids if contact_id})
+    if not contact_ids:
+        return 0
+    db.session.flush()
+    for chunk in _chunks(contact_ids):
+        _write_documents(chunk, _build_documents(chunk))
+    return len(contact_ids)
+
+
+def contact_ids_for_account(account_id):
+    return [
+        row.contact_id
+        for row in AccountContacts.query.with_entities(AccountContacts.contact_id)
+        .filter(AccountContacts.account_id == account_id)
+        .all()
+    ]
+
+
+def contact_ids_for_owner(user_id):
+    return [
+        row.contact_id
+        for row in Contact.query.with_entities(Contact.contact_id)
+        .filter(Contact.contact_owner_user_id == user_id)
+        .all()
+    ]
+
+
+def rebuild_contact_search():
+    """Replace the whole search index from the contacts, accounts and users tables."""
+    db.session.execute(delete(ContactSearch))
+    if _dialect() == "sqlite":
+        db.session.execute(text("DELETE FROM contact_search_fts"))
+    contact_ids = [row.contact_id for row in db.session.query(Contact.contact_id).order_by(Contact.contact_id)]
+    for chunk in _chunks(contact_ids):
+        _write_documents(chunk, _build_documents(chunk))
+    db.session.commit()
+    return len(contact_ids)
+
+
+def _like_pattern(term):
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def apply_contact_search(query, term):
+    """
+    Restrict a Contact query to contacts matching ``term``.
+
+    Every word of the term is matched as a prefix against the full-text index
+    (PostgreSQL tsvector, SQLite FTS5); the whole term also matches as a
+    substring anywhere in the document, served by the trigram index on
+    PostgreSQL. Returns the filtered query and a rank expression where higher
+    is a better match.
+    """
+    term = term.strip().lower()
+    tokens = _TOKEN_RE.findall(term)
+    query = query.join(ContactSearch, ContactSearch.contact_id == Contact.contact_id)
+    substring = ContactSearch.document.like(_like_pattern(term), escape="\\")
+    dialect = _dialect()
+
+    if tokens and dialect == "postgresql":
+        tsquery = func.to_tsquery(SEARCH_CONFIG, " & ".join(f"{token}:*" for token in tokens))
+        vector = func.to_tsvector(SEARCH_CONFIG, ContactSearch.document)
+        query = query.filter(or_(vector.op("@@")(tsquery), substring))
+        return query, cast(func.ts_rank(vector, tsquery), Float)
+
+    if tokens and dialect == "sqlite":
+        hits = (
+            text(
+                "SELECT rowid AS contact_id, bm25(contact_search_fts) AS score "
+                "FROM contact_search_fts WHERE contact_search_fts MATCH :match"
+            )
+            .bindparams(match=" ".join(f'"{token}"*' for token in tokens))
+            .columns(contact_id=Integer, score=Float)
+            .subquery("contact_search_hits")
+        )
+        query = query.outerjoin(hits, hits.c.contact_id == Contact.contact_id).filter(
+            or_(hits.c.contact_id.isnot(None), substring)
+        )
+        return query, func.coalesce(-hits.c.score, 0.0)
+
+    return query.filter(substring), literal(0.0, Float)
@@ -0,0 +1,285 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache import RedisCacheBackend, cache
+from database import db
+from models import Invoice, InvoicePipelineFollower, Notifications
+
+
+CHANNEL = "theofficecms:events"
+SUBSCRIBER_QUEUE_SIZE = 100
+MAX_STREAMS_PER_USER = 5
+HEARTBEAT_SECONDS = 15
+# Streams close after this long and EventSource reconnects, so a dead client
+# never pins a worker thread for more than one window.
+MAX_STREAM_SECONDS = 300
+
+_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class TooManyStreams(Exception):
+    pass
+
+
+class Subscription:
+    """
+    One open stream: a bounded queue the hub offers events to without blocking.
+
+    A client that falls ``SUBSCRIBER_QUEUE_SIZE`` events behind loses its
+    backlog and gets a single ``resync`` event instead, telling it to reload
+    from ``/notifications/feed``; publishers never wait on a slow reader.
+    """
+
+    def __init__(self, user_id, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        self.user_id = user_id
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._overflowed = threading.Event()
+
+    def offer(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self._overflowed.set()
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+    def next_message(self, timeout):
+        """The next message, a ``resync`` after an overflow, or None when ``timeout`` passes first."""
+        if self._overflowed.is_set():
+            self._overflowed.clear()
+            return {"event": "resync", "data": {}}
+        try:
+            message = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if self._overflowed.is_set():
+            self._overflowed.clear()
+            return {"event": "resync", "data": {}}
+        return message
+
+
+class EventHub:
+    """
+    Per-process registry of open streams, keyed by user.
+
+    With a Redis cache tier, published events go through a Redis channel and
+    a listener thread in every process hands them to its local streams, so a
+    worker (or job) that commits a change reaches users connected to any
+    other worker. Without Redis, events reach streams in the same process only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._listener_pid = None
+
+    def subscribe(self, user_id):
+        self._ensure_listener()
+        with self._lock:
+            if len(self._subscribers[user_id]) >= MAX_STREAMS_PER_USER:
+                raise TooManyStreams(user_id)
+            subscription = Subscription(user_id)
+            self._subscribers[user_id].add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            streams = self._subscribers.get(subscription.user_id)
+            if streams is not None:
+                streams.discard(subscription)
+                if not streams:
+                    del self._subscribers[subscription.user_id]
+
+    def stream_count(self):
+        with self._lock:
+            return sum(len(streams) for streams in self._subscribers.values())
+
+    def dispatch(self, messages):
+        for message in messages:
+            with self._lock:
+                targets = [
+                    subscription
+                    for user_id in message["user_ids"]
+                    for subscription in self._subscribers.get(user_id, ())
+                ]
+            for subscription in targets:
+                subscription.offer({"event": message["event"], "data": message["data"]})
+
+    def publish(self, messages):
+        if not messages:
+            return
+        client = _redis()
+        if client is None:
+            self.dispatch(messages)
+            return
+        try:
+            client.publish(CHANNEL, json.dumps(messages))
+        except Exception as exc:
+            print(f"❌ Event stream publish failed: {exc}")
+
+    def _ensure_listener(self):
+        client = _redis()
+        if client is None:
+            return
+        with self._lock:
+            # Threads don't survive a fork; start one per worker process.
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+        threading.Thread(target=self._listen, args=(client,), name="event-stream-listener", daemon=True).start()
+
+    def _listen(self, client):
+        while True:
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                for item in pubsub.listen():
+                    if item.get("type") == "message":
+                        self.dispatch(json.loads(item["data"]))
+            except Exception as exc:
+                print(f"❌ Event stream listener error: {exc}")
+                time.sleep(1)
+
+
+def _redis():
+    backend = cache.backend
+    return backend.client if isinstance(backend, RedisCacheBackend) else None
+
+
+hub = EventHub()
+
+
+def _fmt(value):
+    return value.strftime(_TIME_FORMAT) if value else None
+
+
+def publish_on_commit(user_ids, event_name, data, session=None):
+    """Push ``data`` to ``user_ids``' open streams once the current transaction commits."""
+    user_ids = sorted({int(user_id) for user_id in user_ids if user_id})
+    if not user_ids:
+        return
+    session = session or db.session()
+    session.info.setdefault("stream_events", []).append({
+        "user_ids": user_ids,
+        "event": event_name,
+        "data": data,
+    })
+
+
+def notification_event(row):
+    """Stream payload for a notification (an ORM instance or a RETURNING row)."""
+    if isinstance(row, Notifications):
+        # Read the instance state directly: loading an expired attribute would
+        # query the database from inside the flush.
+        values = row.__dict__
+    else:
+        values = row._mapping
+    return {
+        "notification_id": values.get("notification_id"),
+        "type": values.get("type"),
+        "title": values.get("title"),
+        "message": values.get("message"),
+        "link": values.get("link"),
+        "account_id": values.get("account_id"),
+        "invoice_id": values.get("invoice_id"),
+        "source_type": values.get("source_type"),
+        "source_id": values.get("source_id"),
+        "event_time": _fmt(values.get("event_time")),
+        "created_at": _fmt(values.get("created_at") or datetime.now()),
+    }
+
+
+def publish_notifications(rows, session=None):
+    for row in rows:
+        user_id = row.__dict__.get("user_id") if isinstance(row, Notifications) else row.user_id
+        publish_on_commit([user_id], "notification", notification_event(row), session=session)
+
+
+def _pipeline_audience(invoice_ids):
+    """{invoice_id: {user_id, ...}}: pipeline followers plus the sales rep, in two queries."""
+    audience = defaultdict(set)
+    invoice_ids = list(invoice_ids)
+    if not invoice_ids:
+        return audience
+    follower_rows = db.session.query(InvoicePipelineFollower.invoice_id, InvoicePipelineFollower.user_id).filter(
+        InvoicePipelineFollower.invoice_id.in_(invoice_ids)
+    )
+    rep_rows = db.session.query(Invoice.invoice_id, Invoice.sales_rep_id).filter(Invoice.invoice_id.in_(invoice_ids))
+    for invoice_id, user_id in list(follower_rows) + list(rep_rows):
+        if user_id:
+            audience[invoice_id].add(user_id)
+    return audience
+
+
+def publish_pipeline_history(rows):
+    """Push new pipeline timeline rows (dicts with the history columns) to the users following each invoice."""
+    rows = list(rows)
+    if not rows:
+        return
+    audience = _pipeline_audience({row["invoice_id"] for row in rows})
+    for row in rows:
+        created_at = row.get("created_at")
+        publish_on_commit(audience.get(row["invoice_id"], ()), "pipeline", {
+            "invoice_id": row["invoice_id"],
+            "stage": row.get("stage"),
+            "action": row.get("action"),
+            "note": row.get("note"),
+            "actor_user_id": row.get("actor_user_id"),
+            "created_at": created_at.strftime(_TIME_FORMAT) if hasattr(created_at, "strftime") else created_at,
+        })
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_new_notifications(session, _flush_context):
+    # ORM-created notifications (create_notification) have their ids by now;
+    # bulk inserts publish their RETURNING rows themselves.
+    publish_notifications(
+        [instance for instance in session.new if isinstance(instance, Notifications)],
+        session=session,
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed_events(session):
+    messages = session.info.pop("stream_events", None)
+    if messages:
+        hub.publish(messages)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_uncommitted_events(session):
+    session.info.pop("stream_events", None)
+
+
+def format_sse(event_name, data):
+    return f"event: {event_name}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream(subscription, greeting, max_seconds=MAX_STREAM_SECONDS, heartbeat_seconds=HEARTBEAT_SECONDS):
+    """SSE body for one subscription: the greeting, then events, with comment heartbeats while idle."""
+    try:
+        yield f"retry: 3000\n{format_sse('sync', greeting)}"
+        deadline = time.monotonic() + max_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            message = subscription.next_message(timeout=min(heartbeat_seconds, remaining))
+            if message is None:
+                # Also how a vanished client is noticed: the write fails and the generator closes.
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(message["event"], message["data"])
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,223 @@
+import heapq
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+SLOWEST_STATEMENTS = 5
+STATEMENT_PREVIEW_CHARS = 300
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _env_flag(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() == "true"
+
+
+def _statement_preview(statement):
+    return " ".join(str(statement).split())[:STATEMENT_PREVIEW_CHARS]
+
+
+def _keep_slowest(slowest, duration_ms, statement):
+    entry = (duration_ms, _statement_preview(statement))
+    if len(slowest) < SLOWEST_STATEMENTS:
+        heapq.heappush(slowest, entry)
+    elif entry[0] > slowest[0][0]:
+        heapq.heapreplace(slowest, entry)
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class RouteMetrics:
+    """
+    Rolling per-route request samples.
+
+    Each route keeps its last ``window`` requests (latency, SQL count, SQL time,
+    response bytes) plus the slowest statements seen since the last reset, so
+    memory is bounded by routes x window.
+    """
+
+    def __init__(self, window=500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, route, latency_ms, sql_count, sql_ms, response_bytes, slowest):
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = {"samples": deque(maxlen=self.window), "total": 0, "slowest": []}
+                self._routes[route] = stats
+            stats["samples"].append((latency_ms, sql_count, sql_ms, response_bytes))
+            stats["total"] += 1
+            for duration_ms, statement in slowest:
+                _keep_slowest(stats["slowest"], duration_ms, statement)
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+    def snapshot(self):
+        with self._lock:
+            routes = {
+                route: (list(stats["samples"]), stats["total"], list(stats["slowest"]))
+                for route, stats in self._routes.items()
+            }
+
+        summary = []
+        for route, (samples, total, slowest) in routes.items():
+            latencies = sorted(sample[0] for sample in samples)
+            sql_counts = [sample[1] for sample in samples]
+            sql_times = [sample[2] for sample in samples]
+            sizes = [sample[3] for sample in samples if sample[3] is not None]
+
+            histogram = {}
+            for bound in LATENCY_BUCKETS_MS:
+                histogram[f"le_{bound}ms"] = sum(1 for latency in latencies if latency <= bound)
+            histogram["inf"] = len(latencies)
+
+            summary.append({
+                "route": route,
+                "requests_total": total,
+                "window": len(samples),
+                "latency_ms": {
+                    "p50": _percentile(latencies, 0.50),
+                    "p95": _percentile(latencies, 0.95),
+                    "p99": _percentile(latencies, 0.99),
+                    "max": latencies[-1] if latencies else None,
+                },
+                "latency_histogram": histogram,
+                "sql_count": {
+                    "avg": round(sum(sql_counts) / len(sql_counts), 2) if sql_counts else 0,
+                    "max": max(sql_counts) if sql_counts else 0,
+                },
+                "sql_ms": {
+                    "avg": round(sum(sql_times) / len(sql_times), 2) if sql_times else 0,
+                    "max": max(sql_times) if sql_times else 0,
+                },
+                "response_bytes_avg": round(sum(sizes) / len(sizes)) if sizes else None,
+                "slowest_statements": [
+                    {"ms": duration_ms, "statement": statement}
+                    for duration_ms, statement in sorted(slowest, reverse=True)
+                ],
+            })
+
+        summary.sort(key=lambda item: item["sql_count"]["avg"], reverse=True)
+        return summary
+
+
+route_metrics = RouteMetrics()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    duration_ms = round((time.perf_counter() - started.pop()) * 1000, 2)
+    stats = g.get("sql_stats")
+    if stats is None:
+        return
+    stats["count"] += 1
+    stats["ms"] += duration_ms
+    _keep_slowest(stats["slowest"], duration_ms, statement)
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    started = conn.info.get("query_started") if conn is not None else None
+    if started:
+        started.pop()
+
+
+def _route_name():
+    rule = request.url_rule.rule if request.url_rule else "<unmatched>"
+    return f"{request.method} {rule}"
+
+
+def _response_size(response):
+    if response.direct_passthrough or response.is_streamed:
+        return response.content_length
+    return response.calculate_content_length()
+
+
+def init_instrumentation(app):
+    """
+    Record SQL count/time, latency and response size for every request.
+
+    Results go to a ``Server-Timing`` header, the rolling ``route_metrics``
+    (served by ``/metrics/routes``) and, with ``REQUEST_METRICS_LOG=true``, one
+    JSON line per request on stdout. Settings come from app config, falling
+    back to environment variables of the same name.
+    """
+    if not app.config.get("REQUEST_METRICS_ENABLED", _env_flag("REQUEST_METRICS_ENABLED", True)):
+        return
+
+    route_metrics.window = int(app.config.get(
+        "REQUEST_METRICS_WINDOW",
+        os.environ.get("REQUEST_METRICS_WINDOW", route_metrics.window),
+    ))
+    log_json = app.config.get("REQUEST_METRICS_LOG", _env_flag("REQUEST_METRICS_LOG", False))
+
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+    @app.before_request
+    def _start_request_metrics():
+        g.request_started = time.perf_counter()
+        g.sql_stats = {"count": 0, "ms": 0.0, "slowest": []}
+
+    @app.after_request
+    def _finish_request_metrics(response):
+        stats = g.get("sql_stats")
+        started = g.get("request_started")
+        if stats is None or started is None:
+            return response
+
+        latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        sql_ms = round(stats["ms"], 2)
+        response_bytes = _response_size(response)
+        route = _route_name()
+
+        response.headers["Server-Timing"] = (
+            f'db;dur={sql_ms};desc="{stats["count"]} queries", app;dur={latency_ms}'
+        )
+        route_metrics.record(route, latency_ms, stats["count"], sql_ms, response_bytes, stats["slowest"])
+
+        if log_json:
+            print(json.dumps({
+                "event": "request_metrics",
+                "route": route,
+                "path": request.path,
+                "status": response.status_code,
+                "latency_ms": latency_ms,
+                "sql_count": stats["count"],
+                "sql_ms": sql_ms,
+                "response_bytes": response_bytes,
+                "slowest_statements": [
+                    {"ms": duration_ms, "statement": statement}
+                    for duration_ms, statement in sorted(stats["slowest"], reverse=True)
+                ],
+            }), flush=True)
+        return response
@@ -0,0 +1,113 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import delete, insert
+
+from cache import ANALYTICS_TAG, PIPELINES_TAG, invalidate_on_commit
+from database import db
+from models import Invoice, InvoiceBalance
+from pipeline_stages import invoice_payment_stats, payment_totals_subquery
+
+
+def _to_decimal(value):
+    try:
+        return Decimal(str(value))
+    except Exception:
+        return Decimal("0")
+
+
+def _to_cents(value):
+    return int((_to_decimal(value).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)) * 100)
+
+
+def cents_to_decimal(cents):
+    return Decimal(int(cents or 0)) / Decimal(100)
+
+
+def _balance_values(final_total, total_paid, latest_payment):
+    final_cents = _to_cents(final_total or 0)
+    paid_cents = _to_cents(total_paid or 0)
+    return {
+        "final_cents": final_cents,
+        "paid_cents": paid_cents,
+        "remaining_cents": max(final_cents - paid_cents, 0),
+        "latest_payment_at": latest_payment,
+        "paid_in_full": final_cents <= 0 or paid_cents >= final_cents,
+    }
+
+
+def refresh_invoice_balance(invoice):
+    """
+    Recompute the stored balance for one invoice inside the current transaction.
+
+    Call after adding, editing or deleting a payment, or after changing the
+    invoice total. Pending changes are flushed first so the aggregate sees them.
+    """
+    db.session.flush()
+    total_paid, latest_payment = invoice_payment_stats(invoice.invoice_id)
+    balance = InvoiceBalance.query.get(invoice.invoice_id)
+    if not balance:
+        balance = InvoiceBalance(invoice_id=invoice.invoice_id)
+        db.session.add(balance)
+    for key, value in _balance_values(invoice.final_total, total_paid, latest_payment).items():
+        setattr(balance, key, value)
+    return balance
+
+
+def invoice_status(balance, due_date, today):
+    """Invoice status label derived from a stored balance."""
+    if balance.paid_in_full:
+        return "Paid"
+    if not balance.paid_cents:
+        return "Past Due" if due_date and today > due_date else "Pending"
+    if due_date and today > due_date:
+        return "Past Due"
+    return "Partial"
+
+
+def _computed_balances():
+    totals = payment_totals_subquery()
+    query = (
+        db.session.query(Invoice.invoice_id, Invoice.final_total, totals.c.total_paid, totals.c.latest_paid)
+        .outerjoin(totals, totals.c.invoice_id == Invoice.invoice_id)
+    )
+    for row in query.yield_per(1000):
+        values = _balance_values(row.final_total, row.total_paid, row.latest_paid)
+        values["invoice_id"] = row.invoice_id
+        yield values
+
+
+def rebuild_invoice_balances(chunk_size=1000):
+    """Replace every stored balance with one recomputed from the payments table."""
+    rows = list(_computed_balances())
+    db.session.execute(delete(InvoiceBalance))
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(insert(InvoiceBalance), rows[start:start + chunk_size])
+    invalidate_on_commit(ANALYTICS_TAG, PIPELINES_TAG)
+    db.session.commit()
+    return len(rows)
+
+
+def verify_invoice_balances():
+    """Return the invoices whose stored balance disagrees with their payments."""
+    stored = {
+        balance.invoice_id: balance
+        for balance in InvoiceBalance.query.all()
+    }
+    mismatches = []
+    for expected in _computed_balances():
+        balance = stored.pop(expected["invoice_id"], None)
+        if balance is None:
+            mismatches.append({"invoice_id": expected["invoice_id"], "problem": "missing"})
+            continue
+        for key in ("final_cents", "paid_cents", "remaining_cents", "paid_in_full"):
+            if getattr(balance, key) != expected[key]:
+                mismatches.append({
+                    "invoice_id": expected["invoice_id"],
+                    "problem": key,
+                    "stored": getattr(balance, key),
+                    "expected": expected[key],
+                })
+                break
+    for invoice_id in stored:
+        mismatches.append({"invoice_id": invoice_id, "problem": "orphaned"})
+    return mismatches
@@ -0,0 +1,99 @@
+from collections import namedtuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+
+from database import db
+from models import (
+    Account,
+    AccountContacts,
+    Commissions,
+    Contact,
+    Invoice,
+    InvoiceBalance,
+    InvoiceServices,
+    Payment,
+    PaymentMethods,
+    Service,
+    TaxRates,
+    Users,
+)
+
+
+InvoiceDetail = namedtuple("InvoiceDetail", ["header", "payments", "services"])
+
+SalesRep = aliased(Users, name="sales_rep")
+Logger = aliased(Users, name="logger")
+
+
+def _header_query(invoice_id):
+    commission_total = (
+        select(func.sum(Commissions.commission_amount))
+        .where(Commissions.invoice_id == Invoice.invoice_id)
+        .correlate(Invoice)
+        .scalar_subquery()
+    )
+    primary_contact_id = (
+        select(AccountContacts.contact_id)
+        .where(AccountContacts.account_id == Invoice.account_id)
+        .order_by(AccountContacts.is_primary.desc(), AccountContacts.created_at.asc())
+        .limit(1)
+        .correlate(Invoice)
+        .scalar_subquery()
+    )
+    return (
+        db.session.query(
+            Invoice,
+            Account,
+            SalesRep,
+            InvoiceBalance,
+            TaxRates.rate.label("tax_rate"),
+            commission_total.label("commission_total"),
+            Contact.contact_id.label("primary_contact_id"),
+            Contact.first_name.label("primary_contact_first_name"),
+            Contact.last_name.label("primary_contact_last_name"),
+        )
+        .outerjoin(Account, Account.account_id == Invoice.account_id)
+        .outerjoin(SalesRep, SalesRep.user_id == Invoice.sales_rep_id)
+        .outerjoin(InvoiceBalance, InvoiceBalance.invoice_id == Invoice.invoice_id)
+        .outerjoin(TaxRates, TaxRates.zip_code == Account.zip_code)
+        .outerjoin(Contact, Contact.contact_id == primary_contact_id)
+        .filter(Invoice.invoice_id == invoice_id)
+    )
+
+
+def load_invoice_detail(invoice_id):
+    """
+    Load everything the invoice drawer shows in three queries.
+
+    The header row joins the account, sales rep, stored balance, tax rate,
+    commission total and primary contact; payments come with their method name
+    and logging user; services with their catalog entry. Returns None when the
+    invoice does not exist.
+    """
+    header = _header_query(invoice_id).first()
+    if header is None:
+        return None
+
+    payments = (
+        db.session.query(
+            Payment,
+            PaymentMethods.method_name,
+            Logger.username.label("logged_by_username"),
+            Logger.first_name.label("logged_by_first_name"),
+            Logger.last_name.label("logged_by_last_name"),
+        )
+        .outerjoin(PaymentMethods, PaymentMethods.method_id == Payment.payment_method)
+        .outerjoin(Logger, Logger.username == Payment.logged_by)
+        .filter(Payment.invoice_id == invoice_id)
+        .all()
+    )
+
+    services = (
+        db.session.query(InvoiceServices, Service)
+        .join(Service, InvoiceServices.service_id == Service.service_id)
+        .filter(InvoiceServices.invoice_id == invoice_id)
+        .all()
+    )
+
+    return InvoiceDetail(header, payments, services)
@@ -0,0 +1,136 @@
+import time
+from datetime import datetime, timedelta
+
+from database import db
+from models import JobRun, JobRunPhase
+
+
+# Unfinished runs older than this are abandoned instead of resumed, so a rerun
+# never replays a stale "now" (reminder windows, overdue dates) from days ago.
+RESUME_WINDOW = timedelta(hours=6)
+
+
+class PhaseCheckpoint:
+    """
+    Persisted progress of one job phase.
+
+    The phase reads ``cursor`` to seek past rows it already handled and calls
+    ``record_chunk`` before committing each chunk, so the cursor moves in the
+    same transaction as the chunk's writes.
+    """
+
+    def __init__(self, record):
+        self.record = record
+        self._mark = time.monotonic()
+
+    @property
+    def completed(self):
+        return self.record.completed_at is not None
+
+    @property
+    def cursor(self):
+        return self.record.cursor
+
+    def _elapsed_ms(self):
+        mark = time.monotonic()
+        elapsed = int((mark - self._mark) * 1000)
+        self._mark = mark
+        return elapsed
+
+    def record_chunk(self, cursor, rows_scanned, notifications_written=0):
+        record = self.record
+        record.cursor = cursor
+        record.chunks = (record.chunks or 0) + 1
+        record.rows_scanned = (record.rows_scanned or 0) + rows_scanned
+        record.notifications_written = (record.notifications_written or 0) + notifications_written
+        record.wall_ms = (record.wall_ms or 0) + self._elapsed_ms()
+
+    def complete(self):
+        self.record.wall_ms = (self.record.wall_ms or 0) + self._elapsed_ms()
+        self.record.completed_at = datetime.now()
+        db.session.commit()
+
+
+class JobRunner:
+    """
+    Run a batch job as named phases with a checkpoint per phase.
+
+    ``start`` resumes the latest unfinished run of the job (within
+    ``RESUME_WINDOW``) or opens a new one; ``run.started_at`` is the job's
+    "now" either way, so a resumed run makes the same decisions as the
+    original attempt.
+    """
+
+    def __init__(self, job_name, fresh=False):
+        self.job_name = job_name
+        self.fresh = fresh
+        self.run = None
+        self.resumed = False
+
+    def _latest_unfinished(self):
+        return (
+            JobRun.query
+            .filter(JobRun.job_name == self.job_name)
+            .filter(JobRun.status.in_(("running", "failed")))
+            .order_by(JobRun.started_at.desc())
+            .first()
+        )
+
+    def start(self):
+        now = datetime.now()
+        run = self._latest_unfinished()
+        if run and (self.fresh or run.started_at < now - RESUME_WINDOW):
+            (
+                JobRun.query
+                .filter(JobRun.job_name == self.job_name)
+                .filter(JobRun.status.in_(("running", "failed")))
+                .update({"status": "abandoned", "finished_at": now}, synchronize_session=False)
+            )
+            run = None
+
+        if run:
+            run.status = "running"
+            run.error = None
+            self.resumed = True
+        else:
+            run = JobRun(job_name=self.job_name, status="running", started_at=now)
+            db.session.add(run)
+        db.session.commit()
+        self.run = run
+        return run
+
+    def phase(self, name):
+        record = JobRunPhase.query.get((self.run.run_id, name))
+        if not record:
+            record = JobRunPhase(run_id=self.run.run_id, phase=name)
+            db.session.add(record)
+            db.session.commit()
+        return PhaseCheckpoint(record)
+
+    def finish(self):
+        self.run.status = "completed"
+        self.run.finished_at = datetime.now()
+        db.session.commit()
+
+    def fail(self, error):
+        db.session.rollback()
+        self.run.status = "failed"
+        self.run.error = str(error)
+        db.session.commit()
+
+    def metrics(self):
+        phases = (
+            JobRunPhase.query
+            .filter(JobRunPhase.run_id == self.run.run_id)
+            .all()
+        )
+        return {
+            phase.phase: {
+                "chunks": phase.chunks,
+                "rows_scanned": phase.rows_scanned,
+                "notifications_written": phase.notifications_written,
+                "wall_ms": phase.wall_ms,
+                "completed": phase.completed_at is not None,
+            }
+            for phase in phases
+        }
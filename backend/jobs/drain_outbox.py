@@ -0,0 +1,29 @@
+import argparse
+
+from app import app
+from database import db
+from models import OutboxEntry
+from outbox import DRAIN_BATCH_SIZE, drain_outbox
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending outbox side effects (audit rows, follower notifications, pipeline history).")
+    parser.add_argument("--batch-size", type=int, default=DRAIN_BATCH_SIZE, help="Entries claimed per transaction")
+    parser.add_argument("--retry-failed", action="store_true", help="Requeue entries that exhausted their attempts first")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.retry_failed:
+            requeued = OutboxEntry.query.filter_by(status="failed").update(
+                {"status": "pending", "attempts": 0, "available_at": db.func.now()},
+                synchronize_session=False,
+            )
+            db.session.commit()
+            print(f"🔁 Requeued {requeued} failed entr{'y' if requeued == 1 else 'ies'}.")
+        applied = drain_outbox(batch_size=args.batch_size)
+        failed = OutboxEntry.query.filter_by(status="failed").count()
+        print(f"✅ Applied {applied} outbox entr{'y' if applied == 1 else 'ies'}; {failed} failed.")
+
+
+if __name__ == "__main__":
+    main()
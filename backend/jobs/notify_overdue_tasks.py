@@ -1,11 +1,24 @@
-from datetime import datetime, timedelta
-from decimal import Decimal, ROUND_HALF_UP
+import argparse
+from datetime import timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, insert, update
 
 from app import app
 from database import db
-from models import Tasks, Account, Invoice, InvoicePipeline, InvoicePipelineHistory, Payment, InvoicePipelineFollower
+from event_stream import publish_pipeline_history
+from models import Tasks, Account, Invoice, InvoicePipeline, InvoicePipelineHistory, Payment
 from audit import create_audit_log
-from notifications import create_notification
+from cache import ANALYTICS_TAG, PIPELINES_TAG, invalidate_on_commit
+from job_runs import JobRunner
+from notification_fanout import follower_rows, followers_by_target, pipeline_update_values
+from notifications import bulk_create_notifications, notification_values
+from pipeline_stages import STAGE_LABELS, is_paid_in_full
+from reminder_schedule import fire_due_reminders
+
+
+JOB_NAME = "notify_overdue_tasks"
+CHUNK_SIZE = 1000
 
 
 def _to_decimal(value):
@@ -15,260 +28,343 @@ def _to_decimal(value):
         return Decimal("0")
 
 
-def _to_cents(value):
-    return int((_to_decimal(value).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)) * 100)
-
-
 def _build_task_link(task):
     return f"/tasks/{task.task_id}"
 
 
-def notify_overdue_tasks():
-    today = datetime.now().date()
-    now = datetime.now()
-    reminder_window_end = now + timedelta(minutes=15)
+def _keyset_chunks(query, key_column, key, chunk_size, start_after=None):
+    """
+    Yield the rows of ``query`` in ``key_column`` order, ``chunk_size`` at a time.
+
+    Each chunk is a fresh query seeking past the last key, so rows updated by
+    the caller between chunks (and dropping out of the filter) never shift the
+    window, and only one chunk is held in memory. ``start_after`` resumes from
+    a checkpointed key.
+    """
+    last_key = start_after
+    while True:
+        chunk_query = query
+        if last_key is not None:
+            chunk_query = chunk_query.filter(key_column > last_key)
+        rows = chunk_query.order_by(key_column).limit(chunk_size).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last_key = key(rows[-1])
+
+
+def _insert_rows(model, rows):
+    if rows:
+        db.session.execute(insert(model).values(rows))
+
+
+def _insert_history(rows):
+    _insert_rows(InvoicePipelineHistory, rows)
+    publish_pipeline_history(rows)
+
+
+def _account_names(account_ids):
+    account_ids = {account_id for account_id in account_ids if account_id}
+    if not account_ids:
+        return {}
+    return dict(
+        db.session.query(Account.account_id, Account.business_name)
+        .filter(Account.account_id.in_(account_ids))
+        .all()
+    )
 
-    upcoming_tasks = (
-        Tasks.query
-        .filter(Tasks.is_completed == False)
-        .filter(Tasks.due_date.isnot(None))
-        .filter(Tasks.due_date >= now)
-        .filter(Tasks.due_date <= reminder_window_end)
-        .filter(Tasks.reminder_sent_at.is_(None))
+
+def _payment_stats_by_invoice(invoice_ids):
+    """Paid total and latest payment date for each invoice, in one grouped query."""
+    if not invoice_ids:
+        return {}
+    rows = (
+        db.session.query(
+            Payment.invoice_id,
+            func.coalesce(func.sum(Payment.total_paid), 0),
+            func.max(Payment.date_paid),
+        )
+        .filter(Payment.invoice_id.in_(invoice_ids))
+        .group_by(Payment.invoice_id)
         .all()
     )
+    return {
+        invoice_id: (_to_decimal(total_paid or 0), latest_payment)
+        for invoice_id, total_paid, latest_payment in rows
+    }
 
-    for task in upcoming_tasks:
-        account = Account.query.get(task.account_id) if task.account_id else None
-        link = _build_task_link(task)
-        title = "Task reminder"
-        message = account.business_name if account else task.task_description
-
-        if task.assigned_to:
-            create_notification(
-                user_id=task.assigned_to,
-                notif_type="task_reminder",
-                title=title,
-                message=message,
-                link=link,
-                source_type="task",
-                source_id=task.task_id,
-                event_time=task.due_date,
-            )
 
-        if task.user_id and task.user_id != task.assigned_to:
-            create_notification(
-                user_id=task.user_id,
-                notif_type="task_reminder",
-                title=title,
-                message=message,
-                link=link,
-                source_type="task",
-                source_id=task.task_id,
-                event_time=task.due_date,
-            )
+def _pipeline_query(*criteria):
+    return (
+        db.session.query(InvoicePipeline, Invoice, Account.business_name)
+        .join(Invoice, Invoice.invoice_id == InvoicePipeline.invoice_id)
+        .join(Account, Account.account_id == Invoice.account_id)
+        .filter(*criteria)
+    )
+
+
+def _pipeline_chunks(query, checkpoint, chunk_size):
+    return _keyset_chunks(
+        query,
+        InvoicePipeline.invoice_id,
+        lambda row: row.InvoicePipeline.invoice_id,
+        chunk_size,
+        start_after=checkpoint.cursor,
+    )
 
-        task.reminder_sent_at = now
 
-    overdue_tasks = (
-        Tasks.query
+def _notify_tasks(criteria, notif_type, title, stamp, checkpoint, chunk_size):
+    """
+    Notify the assignee and creator of every matching open task, one chunk at a time.
+
+    ``stamp`` maps the task column marking the notification as sent to its new
+    value; it is written with one UPDATE per chunk and committed together with
+    that chunk's notifications and checkpoint.
+    """
+    query = (
+        db.session.query(
+            Tasks.task_id,
+            Tasks.user_id,
+            Tasks.assigned_to,
+            Tasks.account_id,
+            Tasks.task_description,
+            Tasks.due_date,
+        )
         .filter(Tasks.is_completed == False)
         .filter(Tasks.due_date.isnot(None))
-        .filter(Tasks.due_date < now)
-        .filter(
-            (Tasks.overdue_notified_at.is_(None))
-            | (Tasks.overdue_notified_at < today)
-        )
-        .all()
+        .filter(*criteria)
     )
 
-    for task in overdue_tasks:
-        account = Account.query.get(task.account_id) if task.account_id else None
-        link = _build_task_link(task)
-        title = "Task overdue"
-        message = account.business_name if account else task.task_description
-
-        if task.assigned_to:
-            create_notification(
-                user_id=task.assigned_to,
-                notif_type="task_overdue",
-                title=title,
-                message=message,
-                link=link,
-                source_type="task",
-                source_id=task.task_id,
-            )
+    chunks = _keyset_chunks(query, Tasks.task_id, lambda row: row.task_id, chunk_size, start_after=checkpoint.cursor)
+    for tasks in chunks:
+        account_names = _account_names(task.account_id for task in tasks)
+        rows = []
+        for task in tasks:
+            if task.account_id in account_names:
+                message = account_names[task.account_id]
+            else:
+                message = task.task_description
+            recipients = []
+            if task.assigned_to:
+                recipients.append(task.assigned_to)
+            if task.user_id and task.user_id != task.assigned_to:
+                recipients.append(task.user_id)
+            for user_id in recipients:
+                rows.append(notification_values(
+                    user_id=user_id,
+                    notif_type=notif_type,
+                    title=title,
+                    message=message,
+                    link=_build_task_link(task),
+                    source_type="task",
+                    source_id=task.task_id,
+                ))
+
+        written = bulk_create_notifications(rows)
+        db.session.execute(
+            update(Tasks)
+            .where(Tasks.task_id.in_([task.task_id for task in tasks]))
+            .values(stamp)
+            .execution_options(synchronize_session=False)
+        )
+        checkpoint.record_chunk(tasks[-1].task_id, len(tasks), written)
+        db.session.commit()
 
-        if task.user_id and task.user_id != task.assigned_to:
-            create_notification(
-                user_id=task.user_id,
-                notif_type="task_overdue",
-                title=title,
-                message=message,
-                link=link,
-                source_type="task",
-                source_id=task.task_id,
-            )
 
-        task.overdue_notified_at = today
+def _send_due_reminders(now, checkpoint, chunk_size):
+    """Task and calendar reminders due by ``now``, popped from the scheduled_reminders queue."""
+    fire_due_reminders(
+        now=now,
+        batch_size=chunk_size,
+        on_batch=lambda entries, written: checkpoint.record_chunk(None, len(entries), written),
+    )
+
+
+def _send_overdue_notices(now, checkpoint, chunk_size):
+    today = now.date()
+    _notify_tasks(
+        [
+            Tasks.due_date < now,
+            (Tasks.overdue_notified_at.is_(None)) | (Tasks.overdue_notified_at < today),
+        ],
+        "task_overdue",
+        "Task overdue",
+        {Tasks.overdue_notified_at: today},
+        checkpoint,
+        chunk_size,
+    )
 
-    if overdue_tasks or upcoming_tasks:
-        db.session.commit()
 
-    _flag_payment_not_received(now)
+def notify_overdue_tasks(chunk_size=CHUNK_SIZE, fresh=False):
+    """
+    Run every phase of the job, resuming an interrupted run where it stopped.
 
+    Returns the runner so callers can report ``runner.metrics()``.
+    """
+    runner = JobRunner(JOB_NAME, fresh=fresh)
+    run = runner.start()
+    now = run.started_at
+    try:
+        for name, phase in PHASES:
+            checkpoint = runner.phase(name)
+            if checkpoint.completed:
+                continue
+            phase(now, checkpoint, chunk_size)
+            checkpoint.complete()
+    except Exception as exc:
+        runner.fail(exc)
+        raise
+    runner.finish()
+    return runner
+
+
+def _escalate_payment_issues(now, checkpoint, chunk_size):
     payment_issue_cutoff = now - timedelta(days=2)
-    pipeline_issues = (
-        db.session.query(InvoicePipeline, Invoice, Account)
-        .join(Invoice, Invoice.invoice_id == InvoicePipeline.invoice_id)
-        .join(Account, Account.account_id == Invoice.account_id)
-        .filter(InvoicePipeline.current_stage == "payment_not_received")
-        .filter(InvoicePipeline.payment_issue_notified_at.isnot(None))
-        .filter(InvoicePipeline.payment_issue_notified_at <= payment_issue_cutoff)
-        .filter(InvoicePipeline.payment_issue_escalated_at.is_(None))
-        .all()
+    query = _pipeline_query(
+        InvoicePipeline.current_stage == "payment_not_received",
+        InvoicePipeline.payment_issue_notified_at.isnot(None),
+        InvoicePipeline.payment_issue_notified_at <= payment_issue_cutoff,
+        InvoicePipeline.payment_issue_escalated_at.is_(None),
     )
 
-    for pipeline, invoice, account in pipeline_issues:
-        create_notification(
-            user_id=invoice.sales_rep_id,
-            notif_type="pipeline_payment_issue_followup",
-            title="Payment issue follow-up",
-            message=f"{account.business_name} • Invoice #{invoice.invoice_id} • Payment issue unresolved for 2+ days. Please call the contact.",
-            link=f"/pipelines/invoice/{invoice.invoice_id}",
-            account_id=invoice.account_id,
-            invoice_id=invoice.invoice_id,
-            source_type="invoice",
-            source_id=invoice.invoice_id,
+    for rows in _pipeline_chunks(query, checkpoint, chunk_size):
+        notifications = []
+        history = []
+        for _pipeline, invoice, business_name in rows:
+            notifications.append(notification_values(
+                user_id=invoice.sales_rep_id,
+                notif_type="pipeline_payment_issue_followup",
+                title="Payment issue follow-up",
+                message=f"{business_name} • Invoice #{invoice.invoice_id} • Payment issue unresolved for 2+ days. Please call the contact.",
+                link=f"/pipelines/invoice/{invoice.invoice_id}",
+                account_id=invoice.account_id,
+                invoice_id=invoice.invoice_id,
+                source_type="invoice",
+                source_id=invoice.invoice_id,
+            ))
+            history.append({
+                "invoice_id": invoice.invoice_id,
+                "stage": "payment_not_received",
+                "action": "escalation",
+                "note": "Payment issue escalated after 2 days without resolution.",
+                "actor_user_id": None,
+            })
+
+        written = bulk_create_notifications(notifications)
+        _insert_history(history)
+        db.session.execute(
+            update(InvoicePipeline)
+            .where(InvoicePipeline.invoice_id.in_([row.InvoicePipeline.invoice_id for row in rows]))
+            .values(payment_issue_escalated_at=now)
+            .execution_options(synchronize_session=False)
         )
-        db.session.add(InvoicePipelineHistory(
-            invoice_id=invoice.invoice_id,
-            stage="payment_not_received",
-            action="escalation",
-            note="Payment issue escalated after 2 days without resolution.",
-            actor_user_id=None,
-        ))
-        pipeline.payment_issue_escalated_at = now
-
-    if pipeline_issues:
+        checkpoint.record_chunk(rows[-1].InvoicePipeline.invoice_id, len(rows), written)
         db.session.commit()
 
-    _advance_paid_pipelines(now)
-
-
-def _payment_stats(invoice_id):
-    total_paid = db.session.query(db.func.coalesce(db.func.sum(Payment.total_paid), 0)).filter(
-        Payment.invoice_id == invoice_id
-    ).scalar() or 0
-    latest_payment = db.session.query(db.func.max(Payment.date_paid)).filter(
-        Payment.invoice_id == invoice_id
-    ).scalar()
-    return _to_decimal(total_paid), latest_payment
-
-
-def _notify_pipeline_followers(invoice, account, stage_label, action_required=False):
-    followers = InvoicePipelineFollower.query.filter_by(invoice_id=invoice.invoice_id).all()
-    if not followers:
-        return
-    for follower in followers:
-        create_notification(
-            user_id=follower.user_id,
-            notif_type="pipeline_update",
-            title=f"Pipeline update: {stage_label}",
-            message=f"{account.business_name} • Invoice #{invoice.invoice_id} • {stage_label}"
-            + (" • Action required" if action_required else ""),
-            link=f"/pipelines/invoice/{invoice.invoice_id}",
-            account_id=invoice.account_id,
-            invoice_id=invoice.invoice_id,
-            source_type="invoice_pipeline",
-            source_id=invoice.invoice_id,
-        )
 
+def _flag_payment_not_received(now, checkpoint, chunk_size):
+    query = _pipeline_query(InvoicePipeline.payment_issue_notified_at.is_(None))
 
-def _flag_payment_not_received(now):
-    pipelines = (
-        db.session.query(InvoicePipeline, Invoice, Account)
-        .join(Invoice, Invoice.invoice_id == InvoicePipeline.invoice_id)
-        .join(Account, Account.account_id == Invoice.account_id)
-        .all()
-    )
+    for rows in _pipeline_chunks(query, checkpoint, chunk_size):
+        invoice_ids = [row.InvoicePipeline.invoice_id for row in rows]
+        payment_stats = _payment_stats_by_invoice(invoice_ids)
+        flagged = []
+        for pipeline, invoice, business_name in rows:
+            total_paid, _latest_payment = payment_stats.get(invoice.invoice_id, (Decimal("0"), None))
+            if is_paid_in_full(invoice.final_total, total_paid):
+                continue
 
-    for pipeline, invoice, account in pipelines:
-        total_paid, _latest_payment = _payment_stats(invoice.invoice_id)
-        final_total = _to_decimal(invoice.final_total or 0)
-        paid_cents = _to_cents(total_paid)
-        final_cents = _to_cents(final_total)
-        if final_cents <= 0 or paid_cents >= final_cents:
-            continue
+            order_date = pipeline.order_placed_at or invoice.date_created
+            if not order_date:
+                continue
 
-        order_date = pipeline.order_placed_at or invoice.date_created
-        if not order_date:
-            continue
+            days_since_order = (now.date() - order_date.date()).days
+            if days_since_order < 2:
+                continue
 
-        days_since_order = (now.date() - order_date.date()).days
-        if days_since_order < 2:
-            continue
+            flagged.append((invoice, business_name))
 
-        if pipeline.payment_issue_notified_at is not None:
+        if not flagged:
+            checkpoint.record_chunk(rows[-1].InvoicePipeline.invoice_id, len(rows))
+            db.session.commit()
             continue
 
-        pipeline.current_stage = "payment_not_received"
-        pipeline.payment_not_received_at = pipeline.payment_not_received_at or now
-        pipeline.payment_issue_notified_at = now
-        pipeline.updated_at = now
-
-        db.session.add(InvoicePipelineHistory(
-            invoice_id=invoice.invoice_id,
-            stage="payment_not_received",
-            action="status_change",
-            note="Payment not received",
-            actor_user_id=None,
-        ))
-        db.session.add(InvoicePipelineHistory(
-            invoice_id=invoice.invoice_id,
-            stage="payment_not_received",
-            action="email",
-            note="Payment issue email sent to contact. Please contact support to continue order.",
-            actor_user_id=None,
-        ))
-
-        create_audit_log(
-            entity_type="invoice_pipeline_email",
-            entity_id=invoice.invoice_id,
-            action="payment_issue",
-            user_id=None,
-            user_email=None,
-            after_data={
+        followers = followers_by_target("invoice", [invoice.invoice_id for invoice, _name in flagged])
+        notifications = []
+        history = []
+        for invoice, business_name in flagged:
+            history.append({
+                "invoice_id": invoice.invoice_id,
+                "stage": "payment_not_received",
+                "action": "status_change",
+                "note": "Payment not received",
+                "actor_user_id": None,
+            })
+            history.append({
+                "invoice_id": invoice.invoice_id,
                 "stage": "payment_not_received",
+                "action": "email",
                 "note": "Payment issue email sent to contact. Please contact support to continue order.",
-            },
-            account_id=invoice.account_id,
-            invoice_id=invoice.invoice_id,
-        )
+                "actor_user_id": None,
+            })
+
+            create_audit_log(
+                entity_type="invoice_pipeline_email",
+                entity_id=invoice.invoice_id,
+                action="payment_issue",
+                user_id=None,
+                user_email=None,
+                after_data={
+                    "stage": "payment_not_received",
+                    "note": "Payment issue email sent to contact. Please contact support to continue order.",
+                },
+                account_id=invoice.account_id,
+                invoice_id=invoice.invoice_id,
+            )
 
-        create_notification(
-            user_id=invoice.sales_rep_id,
-            notif_type="pipeline_payment_issue",
-            title="Payment issue email sent",
-            message=f"{account.business_name} • Invoice #{invoice.invoice_id} • Payment issue email sent to contact.",
-            link=f"/pipelines/invoice/{invoice.invoice_id}",
-            account_id=invoice.account_id,
-            invoice_id=invoice.invoice_id,
-            source_type="invoice",
-            source_id=invoice.invoice_id,
-        )
+            notifications.append(notification_values(
+                user_id=invoice.sales_rep_id,
+                notif_type="pipeline_payment_issue",
+                title="Payment issue email sent",
+                message=f"{business_name} • Invoice #{invoice.invoice_id} • Payment issue email sent to contact.",
+                link=f"/pipelines/invoice/{invoice.invoice_id}",
+                account_id=invoice.account_id,
+                invoice_id=invoice.invoice_id,
+                source_type="invoice",
+                source_id=invoice.invoice_id,
+            ))
+            notifications.extend(follower_rows(
+                followers.get(invoice.invoice_id, []),
+                pipeline_update_values(
+                    invoice.invoice_id,
+                    invoice.account_id,
+                    business_name,
+                    "payment_not_received",
+                    action_required=True,
+                ),
+            ))
 
-        _notify_pipeline_followers(
-            invoice,
-            account,
-            "Payment not received",
-            action_required=True,
+        db.session.execute(
+            update(InvoicePipeline)
+            .where(InvoicePipeline.invoice_id.in_([invoice.invoice_id for invoice, _name in flagged]))
+            .values(
+                current_stage="payment_not_received",
+                payment_not_received_at=func.coalesce(InvoicePipeline.payment_not_received_at, now),
+                payment_issue_notified_at=now,
+                updated_at=now,
+            )
+            .execution_options(synchronize_session=False)
         )
-
-    db.session.commit()
+        invalidate_on_commit(ANALYTICS_TAG, PIPELINES_TAG)
+        _insert_history(history)
+        written = bulk_create_notifications(notifications)
+        checkpoint.record_chunk(rows[-1].InvoicePipeline.invoice_id, len(rows), written)
+        db.session.commit()
 
 
-def _advance_paid_pipelines(now):
+def _advance_paid_pipelines(now, checkpoint, chunk_size):
     stage_order = [
         "payment_received",
         "order_packaged",
@@ -281,90 +377,101 @@ def _advance_paid_pipelines(now):
         "order_shipped": "order_shipped_at",
         "order_delivered": "order_delivered_at",
     }
-    stage_labels = {
-        "payment_received": "Payment received",
-        "order_packaged": "Order packaged",
-        "order_shipped": "Order shipped",
-        "order_delivered": "Order delivered",
-    }
+    for rows in _pipeline_chunks(_pipeline_query(), checkpoint, chunk_size):
+        invoice_ids = [row.InvoicePipeline.invoice_id for row in rows]
+        payment_stats = _payment_stats_by_invoice(invoice_ids)
+        followers = followers_by_target("invoice", invoice_ids)
+        notifications = []
+        history = []
+        for pipeline, invoice, business_name in rows:
+            total_paid, latest_payment = payment_stats.get(invoice.invoice_id, (Decimal("0"), None))
+            if not is_paid_in_full(invoice.final_total, total_paid):
+                continue
+
+            payment_date = pipeline.payment_received_at or latest_payment
+            if not payment_date:
+                payment_date = now
+                pipeline.payment_received_at = now
+
+            days_since = (now.date() - payment_date.date()).days
+            if days_since >= 3:
+                target_stage = "order_delivered"
+            elif days_since >= 2:
+                target_stage = "order_shipped"
+            elif days_since >= 1:
+                target_stage = "order_packaged"
+            else:
+                target_stage = "payment_received"
+
+            if pipeline.current_stage not in stage_order:
+                pipeline.current_stage = "payment_received"
+
+            current_index = stage_order.index(pipeline.current_stage)
+            target_index = stage_order.index(target_stage)
+            if target_index <= current_index:
+                continue
+
+            stage_time_map = {
+                "payment_received": payment_date,
+                "order_packaged": payment_date + timedelta(days=1),
+                "order_shipped": payment_date + timedelta(days=2),
+                "order_delivered": payment_date + timedelta(days=3),
+            }
+
+            for idx in range(current_index + 1, target_index + 1):
+                stage = stage_order[idx]
+                field = stage_fields.get(stage)
+                if field and getattr(pipeline, field) is None:
+                    setattr(pipeline, field, stage_time_map.get(stage, now))
+                pipeline.current_stage = stage
+                pipeline.updated_at = now
+                history.append({
+                    "invoice_id": invoice.invoice_id,
+                    "stage": stage,
+                    "action": "status_change",
+                    "note": STAGE_LABELS.get(stage, stage),
+                    "actor_user_id": None,
+                })
+                notifications.extend(follower_rows(
+                    followers.get(invoice.invoice_id, []),
+                    pipeline_update_values(invoice.invoice_id, invoice.account_id, business_name, stage),
+                ))
+
+        _insert_history(history)
+        written = bulk_create_notifications(notifications)
+        checkpoint.record_chunk(rows[-1].InvoicePipeline.invoice_id, len(rows), written)
+        db.session.commit()
 
-    pipelines = (
-        db.session.query(InvoicePipeline, Invoice, Account)
-        .join(Invoice, Invoice.invoice_id == InvoicePipeline.invoice_id)
-        .join(Account, Account.account_id == Invoice.account_id)
-        .all()
-    )
 
-    for pipeline, invoice, account in pipelines:
-        total_paid, latest_payment = _payment_stats(invoice.invoice_id)
-        final_total = _to_decimal(invoice.final_total or 0)
-        paid_cents = _to_cents(total_paid)
-        final_cents = _to_cents(final_total)
-        if final_cents > 0 and paid_cents < final_cents:
-            continue
+# Order matters: escalation only sees issues flagged on earlier runs, and paid
+# pipelines advance after unpaid ones are flagged.
+PHASES = (
+    ("due_reminders", _send_due_reminders),
+    ("overdue_tasks", _send_overdue_notices),
+    ("flag_payment_not_received", _flag_payment_not_received),
+    ("escalate_payment_issues", _escalate_payment_issues),
+    ("advance_paid_pipelines", _advance_paid_pipelines),
+)
 
-        payment_date = pipeline.payment_received_at or latest_payment
-        if not payment_date:
-            payment_date = now
-            pipeline.payment_received_at = now
-
-        days_since = (now.date() - payment_date.date()).days
-        if days_since >= 3:
-            target_stage = "order_delivered"
-        elif days_since >= 2:
-            target_stage = "order_shipped"
-        elif days_since >= 1:
-            target_stage = "order_packaged"
-        else:
-            target_stage = "payment_received"
-
-        if pipeline.current_stage not in stage_order:
-            pipeline.current_stage = "payment_received"
-
-        current_index = stage_order.index(pipeline.current_stage)
-        target_index = stage_order.index(target_stage)
-        if target_index <= current_index:
-            continue
 
-        stage_time_map = {
-            "payment_received": payment_date,
-            "order_packaged": payment_date + timedelta(days=1),
-            "order_shipped": payment_date + timedelta(days=2),
-            "order_delivered": payment_date + timedelta(days=3),
-        }
-
-        for idx in range(current_index + 1, target_index + 1):
-            stage = stage_order[idx]
-            field = stage_fields.get(stage)
-            if field and getattr(pipeline, field) is None:
-                setattr(pipeline, field, stage_time_map.get(stage, now))
-            pipeline.current_stage = stage
-            pipeline.updated_at = now
-            db.session.add(InvoicePipelineHistory(
-                invoice_id=invoice.invoice_id,
-                stage=stage,
-                action="status_change",
-                note=stage_labels.get(stage, stage),
-                actor_user_id=None,
-            ))
+def main():
+    parser = argparse.ArgumentParser(description="Send due task/event reminders and overdue notices and advance invoice pipelines.")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows committed per chunk")
+    parser.add_argument("--fresh", action="store_true", help="Abandon any unfinished run instead of resuming it")
+    args = parser.parse_args()
 
-            followers = InvoicePipelineFollower.query.filter_by(invoice_id=invoice.invoice_id).all()
-            for follower in followers:
-                create_notification(
-                    user_id=follower.user_id,
-                    notif_type="pipeline_update",
-                    title=f"Pipeline update: {stage_labels.get(stage, stage)}",
-                    message=f"{account.business_name} • Invoice #{invoice.invoice_id} • {stage_labels.get(stage, stage)}",
-                    link=f"/pipelines/invoice/{invoice.invoice_id}",
-                    account_id=invoice.account_id,
-                    invoice_id=invoice.invoice_id,
-                    source_type="invoice_pipeline",
-                    source_id=invoice.invoice_id,
+    with app.app_context():
+        runner = notify_overdue_tasks(chunk_size=max(args.chunk_size, 1), fresh=args.fresh)
+        metrics = runner.metrics()
+        print(f"✅ Finished {JOB_NAME} run {runner.run.run_id}{' (resumed)' if runner.resumed else ''}.")
+        for name, _phase in PHASES:
+            phase = metrics.get(name)
+            if phase:
+                print(
+                    f"  {name}: {phase['rows_scanned']} row(s) scanned, "
+                    f"{phase['notifications_written']} notification(s), {phase['wall_ms']} ms"
                 )
 
-    db.session.commit()
-
 
 if __name__ == "__main__":
-    with app.app_context():
-        notify_overdue_tasks()
+    main()
@@ -0,0 +1,32 @@
+import argparse
+from datetime import date, datetime, timedelta
+
+from app import app
+from analytics_rollups import rebuild_rollups
+
+
+def _parse_day(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill or reconcile the daily analytics rollups.")
+    parser.add_argument("--from", dest="date_from", type=_parse_day, help="First day to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=_parse_day, help="Last day to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--days", type=int, default=2, help="Rebuild the trailing N days when no range is given")
+    parser.add_argument("--all", action="store_true", help="Rebuild every day (initial backfill)")
+    args = parser.parse_args()
+
+    if args.all:
+        start_day, end_day = None, None
+    else:
+        end_day = args.date_to or date.today()
+        start_day = args.date_from or (end_day - timedelta(days=max(args.days - 1, 0)))
+
+    with app.app_context():
+        written = rebuild_rollups(start_day, end_day)
+        print(f"✅ Wrote {written} analytics rollup bucket(s).")
+
+
+if __name__ == "__main__":
+    main()
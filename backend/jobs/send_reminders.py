@@ -0,0 +1,42 @@
+import argparse
+import time
+from datetime import datetime
+
+from app import app
+from database import db
+from reminder_schedule import FIRE_BATCH_SIZE, fire_due_reminders, next_fire_at, rebuild_reminder_schedule
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send task and calendar reminders due from the scheduled_reminders queue.")
+    parser.add_argument("--batch-size", type=int, default=FIRE_BATCH_SIZE, help="Reminders popped per transaction")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the whole queue from tasks and calendar events first")
+    parser.add_argument(
+        "--watch",
+        type=float,
+        metavar="SECONDS",
+        help="Keep running: sleep until the next fire time, checking the queue at least this often",
+    )
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.rebuild:
+            queued = rebuild_reminder_schedule()
+            print(f"🔁 Rebuilt the reminder queue: {queued} entr{'y' if queued == 1 else 'ies'}.")
+
+        while True:
+            popped, written = fire_due_reminders(batch_size=max(args.batch_size, 1))
+            if popped or not args.watch:
+                print(f"✅ Popped {popped} due reminder(s); {written} notification(s) written.")
+            if not args.watch:
+                break
+            upcoming = next_fire_at()
+            db.session.rollback()
+            wait = args.watch
+            if upcoming is not None:
+                wait = min(max((upcoming - datetime.now()).total_seconds(), 0), args.watch)
+            time.sleep(wait)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import argparse
+
+from app import app
+from session_store import SWEEP_BATCH_SIZE, sweep_expired_sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete expired rows from user_sessions (SESSION_BACKEND=database).")
+    parser.add_argument("--batch-size", type=int, default=SWEEP_BATCH_SIZE, help="Rows deleted per transaction")
+    args = parser.parse_args()
+
+    with app.app_context():
+        removed = sweep_expired_sessions(batch_size=args.batch_size)
+        print(f"✅ Removed {removed} expired session(s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+CREATE TABLE IF NOT EXISTS invoice_balances (
+    invoice_id INTEGER PRIMARY KEY REFERENCES invoices(invoice_id) ON DELETE CASCADE,
+    final_cents BIGINT NOT NULL DEFAULT 0,
+    paid_cents BIGINT NOT NULL DEFAULT 0,
+    remaining_cents BIGINT NOT NULL DEFAULT 0,
+    latest_payment_at TIMESTAMPTZ,
+    paid_in_full BOOLEAN NOT NULL DEFAULT FALSE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_invoice_balances_open
+    ON invoice_balances (paid_in_full, invoice_id);
+
+CREATE INDEX IF NOT EXISTS idx_invoice_balances_unpaid
+    ON invoice_balances (invoice_id)
+    WHERE paid_in_full = FALSE;
+
+INSERT INTO invoice_balances (invoice_id, final_cents, paid_cents, remaining_cents, latest_payment_at, paid_in_full)
+SELECT totals.invoice_id,
+       totals.final_cents,
+       totals.paid_cents,
+       GREATEST(totals.final_cents - totals.paid_cents, 0),
+       totals.latest_payment_at,
+       (totals.final_cents <= 0 OR totals.paid_cents >= totals.final_cents)
+FROM (
+    SELECT invoices.invoice_id,
+           ROUND(COALESCE(invoices.final_total, 0) * 100)::BIGINT AS final_cents,
+           ROUND(COALESCE(SUM(payments.total_paid), 0) * 100)::BIGINT AS paid_cents,
+           MAX(payments.date_paid) AS latest_payment_at
+    FROM invoices
+    LEFT JOIN payments ON payments.invoice_id = invoices.invoice_id
+    GROUP BY invoices.invoice_id, invoices.final_total
+) AS totals
+ON CONFLICT (invoice_id) DO NOTHING;
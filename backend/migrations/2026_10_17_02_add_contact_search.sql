@@ -0,0 +1,42 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE TABLE IF NOT EXISTS contact_search (
+    contact_id INTEGER PRIMARY KEY REFERENCES contacts(contact_id) ON DELETE CASCADE,
+    document TEXT NOT NULL DEFAULT '',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Word/prefix matching: WHERE to_tsvector('simple'::regconfig, document) @@ to_tsquery(...)
+CREATE INDEX IF NOT EXISTS idx_contact_search_tsv
+    ON contact_search USING gin (to_tsvector('simple'::regconfig, document));
+
+-- Substring matching: WHERE document LIKE '%term%'
+CREATE INDEX IF NOT EXISTS idx_contact_search_trgm
+    ON contact_search USING gin (document gin_trgm_ops);
+
+INSERT INTO contact_search (contact_id, document)
+SELECT c.contact_id,
+       LOWER(CONCAT_WS(' ',
+           NULLIF(TRIM(c.first_name), ''),
+           NULLIF(TRIM(c.last_name), ''),
+           NULLIF(TRIM(c.title), ''),
+           NULLIF(TRIM(c.email), ''),
+           NULLIF(TRIM(c.phone), ''),
+           (
+               SELECT STRING_AGG(CONCAT_WS(' ',
+                          NULLIF(TRIM(a.business_name), ''),
+                          NULLIF(TRIM(a.address), ''),
+                          NULLIF(TRIM(a.city), ''),
+                          NULLIF(TRIM(a.state), ''),
+                          NULLIF(TRIM(a.email), ''),
+                          NULLIF(TRIM(a.phone_number), '')), ' ' ORDER BY a.account_id)
+               FROM account_contacts ac
+               JOIN accounts a ON a.account_id = ac.account_id
+               WHERE ac.contact_id = c.contact_id
+           ),
+           NULLIF(TRIM(u.first_name), ''),
+           NULLIF(TRIM(u.last_name), '')
+       ))
+FROM contacts c
+LEFT JOIN users u ON u.user_id = c.contact_owner_user_id
+ON CONFLICT (contact_id) DO NOTHING;
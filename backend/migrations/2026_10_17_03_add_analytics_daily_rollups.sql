@@ -0,0 +1,66 @@
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP;
+
+-- Best effort for tasks completed before completed_at existed.
+UPDATE tasks
+SET completed_at = COALESCE(due_date, date_created)
+WHERE is_completed = TRUE AND completed_at IS NULL;
+
+CREATE TABLE IF NOT EXISTS analytics_daily_rollups (
+    metric VARCHAR(40) NOT NULL,
+    day DATE NOT NULL,
+    user_id INTEGER NOT NULL DEFAULT 0,
+    dimension VARCHAR(50) NOT NULL DEFAULT '',
+    count BIGINT NOT NULL DEFAULT 0,
+    amount_cents BIGINT NOT NULL DEFAULT 0,
+    value_total BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (metric, day, user_id, dimension)
+);
+
+CREATE INDEX IF NOT EXISTS idx_analytics_rollups_user_day
+    ON analytics_daily_rollups (metric, user_id, day);
+
+-- Backfill. Re-runnable: `python -m jobs.rollup_analytics --all` recomputes the same buckets.
+INSERT INTO analytics_daily_rollups (metric, day, user_id, dimension, count, amount_cents)
+SELECT 'payments', DATE(date_paid), COALESCE(sales_rep_id, 0), '', COUNT(*), ROUND(COALESCE(SUM(total_paid), 0) * 100)::BIGINT
+FROM payments
+WHERE date_paid IS NOT NULL
+GROUP BY DATE(date_paid), COALESCE(sales_rep_id, 0)
+ON CONFLICT DO NOTHING;
+
+INSERT INTO analytics_daily_rollups (metric, day, user_id, dimension, count)
+SELECT 'interactions', DATE(created_at), COALESCE(user_id, 0), interaction_type, COUNT(*)
+FROM contact_interactions
+WHERE created_at IS NOT NULL
+GROUP BY DATE(created_at), COALESCE(user_id, 0), interaction_type
+ON CONFLICT DO NOTHING;
+
+INSERT INTO analytics_daily_rollups (metric, day, user_id, dimension, count)
+SELECT 'tasks_created', DATE(date_created), COALESCE(assigned_to, 0), '', COUNT(*)
+FROM tasks
+WHERE date_created IS NOT NULL
+GROUP BY DATE(date_created), COALESCE(assigned_to, 0)
+ON CONFLICT DO NOTHING;
+
+INSERT INTO analytics_daily_rollups (metric, day, user_id, dimension, count)
+SELECT 'tasks_completed', DATE(completed_at), COALESCE(assigned_to, 0), '', COUNT(*)
+FROM tasks
+WHERE is_completed = TRUE AND completed_at IS NOT NULL
+GROUP BY DATE(completed_at), COALESCE(assigned_to, 0)
+ON CONFLICT DO NOTHING;
+
+INSERT INTO analytics_daily_rollups (metric, day, user_id, dimension, count, amount_cents)
+SELECT 'invoices_opened', DATE(date_created), COALESCE(sales_rep_id, 0), '', COUNT(*), ROUND(COALESCE(SUM(final_total), 0) * 100)::BIGINT
+FROM invoices
+WHERE date_created IS NOT NULL
+GROUP BY DATE(date_created), COALESCE(sales_rep_id, 0)
+ON CONFLICT DO NOTHING;
+
+INSERT INTO analytics_daily_rollups (metric, day, user_id, dimension, count, amount_cents, value_total)
+SELECT 'invoices_closed', DATE(b.latest_payment_at), COALESCE(i.sales_rep_id, 0), '', COUNT(*),
+       COALESCE(SUM(b.final_cents), 0), COALESCE(SUM(DATE(b.latest_payment_at) - DATE(i.date_created)), 0)
+FROM invoice_balances b
+JOIN invoices i ON i.invoice_id = b.invoice_id
+WHERE b.paid_in_full = TRUE AND b.latest_payment_at IS NOT NULL AND i.date_created IS NOT NULL
+GROUP BY DATE(b.latest_payment_at), COALESCE(i.sales_rep_id, 0)
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,23 @@
+CREATE TABLE IF NOT EXISTS job_runs (
+    run_id SERIAL PRIMARY KEY,
+    job_name VARCHAR(64) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'running',
+    started_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP,
+    error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_runs_name_status
+    ON job_runs (job_name, status, started_at);
+
+CREATE TABLE IF NOT EXISTS job_run_phases (
+    run_id INTEGER NOT NULL REFERENCES job_runs(run_id) ON DELETE CASCADE,
+    phase VARCHAR(64) NOT NULL,
+    cursor BIGINT,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    rows_scanned BIGINT NOT NULL DEFAULT 0,
+    notifications_written BIGINT NOT NULL DEFAULT 0,
+    wall_ms BIGINT NOT NULL DEFAULT 0,
+    completed_at TIMESTAMP,
+    PRIMARY KEY (run_id, phase)
+);
@@ -0,0 +1,49 @@
+-- Indexes for the filters and sort orders the routes and jobs actually use.
+-- Built CONCURRENTLY so writes keep flowing; scripts.migrate runs this file
+-- outside a transaction. B-tree indexes are scanned backwards for DESC orderings.
+
+-- Invoices: list by sales rep (keyset on invoice_id), per-account listing with status filter
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_sales_rep ON invoices (sales_rep_id, invoice_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_account_status ON invoices (account_id, status);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_status ON invoices (status);
+
+-- Payments: per-invoice lookups, ledger ordered by date_paid DESC, payment_id DESC, filtered ledgers
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_invoice_id ON payments (invoice_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_date_paid ON payments (date_paid, payment_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_account_date ON payments (account_id, date_paid);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_sales_rep_date ON payments (sales_rep_id, date_paid);
+
+-- Tasks: per-assignee listing (keyset on task_id), per-account listing, open tasks by due date
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_assigned_to ON tasks (assigned_to, task_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_account_id ON tasks (account_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_open_due
+    ON tasks (due_date)
+    WHERE is_completed = false AND due_date IS NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_open_assignee_due
+    ON tasks (assigned_to, due_date)
+    WHERE is_completed = false AND due_date IS NOT NULL;
+
+-- Notifications: unread feed per user, reminder de-duplication by source
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_unread
+    ON notifications (user_id, created_at)
+    WHERE is_read = false;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_source
+    ON notifications (user_id, source_type, source_id, type);
+
+-- Audit log: entity-type and per-user feeds, newest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_logs_entity_type_created ON audit_logs (entity_type, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_logs_user_created ON audit_logs (user_id, created_at);
+
+-- Contact interactions: per-contact timeline, newest first (supersedes the single-column index)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_contact_interactions_contact_created
+    ON contact_interactions (contact_id, created_at);
+DROP INDEX CONCURRENTLY IF EXISTS idx_contact_interactions_contact;
+
+-- account_contacts needs nothing new: its primary key leads with account_id.
+
+ANALYZE invoices;
+ANALYZE payments;
+ANALYZE tasks;
+ANALYZE notifications;
+ANALYZE audit_logs;
+ANALYZE contact_interactions;
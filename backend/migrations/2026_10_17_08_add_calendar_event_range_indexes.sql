@@ -0,0 +1,7 @@
+-- Calendar range queries: events overlapping [start, end] for everyone, or
+-- for the owners in user_ids (attendee lookups use idx_calendar_event_attendees_user).
+-- Built CONCURRENTLY; scripts.migrate runs this file outside a transaction.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_calendar_events_range
+    ON calendar_events (start_date, end_date);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_calendar_events_user_range
+    ON calendar_events (user_id, start_date, end_date);
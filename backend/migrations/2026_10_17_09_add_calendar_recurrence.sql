@@ -0,0 +1,24 @@
+-- Recurring calendar events: one row per series, expanded per requested window.
+-- The index is built CONCURRENTLY, so scripts.migrate runs this file outside a
+-- transaction; every statement is safe to re-run.
+ALTER TABLE calendar_events ADD COLUMN IF NOT EXISTS recurrence_rule VARCHAR(255);
+ALTER TABLE calendar_events ADD COLUMN IF NOT EXISTS recurrence_until DATE;
+
+CREATE TABLE IF NOT EXISTS calendar_event_exceptions (
+    event_id INTEGER NOT NULL REFERENCES calendar_events(event_id) ON DELETE CASCADE,
+    occurrence_date DATE NOT NULL,
+    is_cancelled BOOLEAN NOT NULL DEFAULT FALSE,
+    event_title VARCHAR(255),
+    location VARCHAR(255),
+    start_time TIME,
+    end_time TIME,
+    start_date DATE,
+    end_date DATE,
+    notes TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (event_id, occurrence_date)
+);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_calendar_events_series
+    ON calendar_events (start_date, recurrence_until)
+    WHERE recurrence_rule IS NOT NULL;
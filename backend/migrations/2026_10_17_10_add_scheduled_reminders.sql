@@ -0,0 +1,13 @@
+-- One row per task or calendar event with a reminder still to send: its next
+-- fire time. Workers pop the earliest due rows through idx_scheduled_reminders_fire_at.
+-- Fill it for existing data with: python -m jobs.send_reminders --rebuild
+CREATE TABLE IF NOT EXISTS scheduled_reminders (
+    source_type VARCHAR(30) NOT NULL,
+    source_id INTEGER NOT NULL,
+    event_time TIMESTAMP NOT NULL,
+    fire_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (source_type, source_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_reminders_fire_at
+    ON scheduled_reminders (fire_at);
@@ -0,0 +1,20 @@
+-- Per-user unread counters for the notification feed, seeded from the current
+-- rows. The index is built CONCURRENTLY, so scripts.migrate runs this file
+-- outside a transaction; every statement is safe to re-run.
+CREATE TABLE IF NOT EXISTS notification_counters (
+    user_id INTEGER PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    read_through_id INTEGER NOT NULL DEFAULT 0,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO notification_counters (user_id, unread_count, version)
+SELECT user_id, COUNT(*) FILTER (WHERE is_read = false), 1
+FROM notifications
+GROUP BY user_id
+ON CONFLICT (user_id) DO NOTHING;
+
+-- Newest-first feed pages, "since" probes and the mark-all-read watermark lookup.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_user_id_id
+    ON notifications (user_id, notification_id);
@@ -1,3 +1,5 @@
+from sqlalchemy import DDL, event
+
 from database import db
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -83,6 +85,23 @@ class Account(db.Model):
             "updated_by_user_id": self.updated_by_user_id,
         }
 
+class AnalyticsDailyRollup(db.Model):
+    """Pre-aggregated analytics counters per day, sales rep (0 = unassigned) and metric."""
+    __tablename__ = "analytics_daily_rollups"
+    metric = db.Column(db.String(40), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True, default=0)
+    dimension = db.Column(db.String(50), primary_key=True, default="")
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+    amount_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    value_total = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    __table_args__ = (
+        db.Index("idx_analytics_rollups_user_day", "metric", "user_id", "day"),
+    )
+
+
 class Branches(db.Model):
     __tablename__ = 'branches'
     branch_id = db.Column(db.Integer, primary_key=True)
@@ -146,7 +165,51 @@ class ContactInteractions(db.Model):
     phone_number = db.Column(db.String(20))
     email_address = db.Column(db.String(100))
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
-    
+
+    __table_args__ = (
+        db.Index("idx_contact_interactions_contact_created", "contact_id", "created_at"),
+    )
+
+
+class ContactSearch(db.Model):
+    __tablename__ = "contact_search"
+    contact_id = db.Column(db.Integer, db.ForeignKey("contacts.contact_id", ondelete="CASCADE"), primary_key=True)
+    document = db.Column(db.Text, nullable=False, default="")
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    __table_args__ = (
+        db.Index(
+            "idx_contact_search_tsv",
+            db.text("to_tsvector('simple'::regconfig, document)"),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+        db.Index(
+            "idx_contact_search_trgm",
+            "document",
+            postgresql_using="gin",
+            postgresql_ops={"document": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
+# PostgreSQL serves substring matches from a trigram index; SQLite (tests and
+# local runs) gets an FTS5 shadow table keyed by contact_id instead.
+event.listen(
+    ContactSearch.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+event.listen(
+    ContactSearch.__table__,
+    "after_create",
+    DDL("CREATE VIRTUAL TABLE IF NOT EXISTS contact_search_fts USING fts5(document)").execute_if(dialect="sqlite"),
+)
+event.listen(
+    ContactSearch.__table__,
+    "after_drop",
+    DDL("DROP TABLE IF EXISTS contact_search_fts").execute_if(dialect="sqlite"),
+)
+
 
 class CalendarEvent(db.Model):
     __tablename__ = 'calendar_events'
@@ -163,6 +226,40 @@ class CalendarEvent(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("users.user_id"), nullable=False)
     contact_name = db.Column(db.String(100))
     phone_number = db.Column(db.String(20))
+    # Recurring series: start_date/end_date are the first occurrence and
+    # recurrence_until is the end date of the last one (NULL: no end).
+    recurrence_rule = db.Column(db.String(255))
+    recurrence_until = db.Column(db.Date)
+
+    __table_args__ = (
+        db.Index("idx_calendar_events_range", "start_date", "end_date"),
+        db.Index("idx_calendar_events_user_range", "user_id", "start_date", "end_date"),
+        db.Index(
+            "idx_calendar_events_series",
+            "start_date",
+            "recurrence_until",
+            postgresql_where=db.text("recurrence_rule IS NOT NULL"),
+        ),
+    )
+
+
+class CalendarEventException(db.Model):
+    """One occurrence of a recurring event that was cancelled or edited on its own."""
+
+    __tablename__ = "calendar_event_exceptions"
+    event_id = db.Column(db.Integer, db.ForeignKey("calendar_events.event_id"), primary_key=True)
+    occurrence_date = db.Column(db.Date, primary_key=True)
+    is_cancelled = db.Column(db.Boolean, nullable=False, default=False)
+    event_title = db.Column(db.String(255))
+    location = db.Column(db.String(255))
+    start_time = db.Column(db.Time)
+    end_time = db.Column(db.Time)
+    start_date = db.Column(db.Date)
+    end_date = db.Column(db.Date)
+    notes = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    event = db.relationship("CalendarEvent", backref=db.backref("exceptions", lazy="select", cascade="all, delete-orphan"))
 
 
 class CalendarEventAttendee(db.Model):
@@ -227,6 +324,12 @@ class Invoice(db.Model):
     date_updated = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     due_date = db.Column(db.Date)
 
+    __table_args__ = (
+        db.Index("idx_invoices_sales_rep", "sales_rep_id", "invoice_id"),
+        db.Index("idx_invoices_account_status", "account_id", "status"),
+        db.Index("idx_invoices_status", "status"),
+    )
+
     # Relationships
     account = db.relationship('Account', back_populates='invoices', foreign_keys=[account_id])
     commissions = db.relationship('Commissions', back_populates='invoice', foreign_keys='Commissions.invoice_id')
@@ -246,6 +349,7 @@ class Invoice(db.Model):
     payments = db.relationship('Payment', back_populates='invoice', cascade="all, delete-orphan")
     pipeline = db.relationship('InvoicePipeline', uselist=False, backref='invoice', cascade='all, delete-orphan')
     pipeline_history = db.relationship('InvoicePipelineHistory', backref='invoice', cascade='all, delete-orphan')
+    balance = db.relationship('InvoiceBalance', uselist=False, backref='invoice', cascade='all, delete-orphan')
 
 
 class InvoicePipeline(db.Model):
@@ -277,6 +381,21 @@ class InvoicePipelineHistory(db.Model):
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
 
 
+class InvoiceBalance(db.Model):
+    __tablename__ = "invoice_balances"
+    invoice_id = db.Column(db.Integer, db.ForeignKey("invoices.invoice_id", ondelete="CASCADE"), primary_key=True)
+    final_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    paid_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    remaining_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    latest_payment_at = db.Column(db.DateTime(timezone=True))
+    paid_in_full = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    __table_args__ = (
+        db.Index("idx_invoice_balances_open", "paid_in_full", "invoice_id"),
+    )
+
+
 
 class InvoiceServices(db.Model):
     __tablename__ = 'invoice_services'
@@ -336,6 +455,13 @@ class Payment(db.Model):
     total_paid = db.Column(db.Numeric, nullable=False)
     date_paid = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), nullable=False)
 
+    __table_args__ = (
+        db.Index("idx_payments_invoice_id", "invoice_id"),
+        db.Index("idx_payments_date_paid", "date_paid", "payment_id"),
+        db.Index("idx_payments_account_date", "account_id", "date_paid"),
+        db.Index("idx_payments_sales_rep_date", "sales_rep_id", "date_paid"),
+    )
+
     # Relationship fix
     invoice = db.relationship("Invoice", back_populates="payments", foreign_keys=[invoice_id])
     account = db.relationship("Account", back_populates="payments", foreign_keys=[account_id])
@@ -386,9 +512,27 @@ class Tasks(db.Model):
     is_completed = db.Column(db.Boolean)
     is_followup = db.Column(db.Boolean, default=False)
     date_created = db.Column(db.DateTime, default=db.func.current_timestamp())
+    completed_at = db.Column(db.DateTime)
     overdue_notified_at = db.Column(db.Date)
     reminder_sent_at = db.Column(db.DateTime)
 
+    __table_args__ = (
+        db.Index("idx_tasks_assigned_to", "assigned_to", "task_id"),
+        db.Index("idx_tasks_account_id", "account_id"),
+        # Open-task scans (overdue counts, the notifier) only ever touch incomplete rows.
+        db.Index(
+            "idx_tasks_open_due",
+            "due_date",
+            postgresql_where=db.text("is_completed = false AND due_date IS NOT NULL"),
+        ),
+        db.Index(
+            "idx_tasks_open_assignee_due",
+            "assigned_to",
+            "due_date",
+            postgresql_where=db.text("is_completed = false AND due_date IS NOT NULL"),
+        ),
+    )
+
 class UserRoles(db.Model):
     __tablename__ = 'user_roles'
     role_id = db.Column(db.Integer, primary_key=True)
@@ -497,6 +641,29 @@ class Notifications(db.Model):
     source_type = db.Column(db.String(50), nullable=True)
     source_id = db.Column(db.Integer, nullable=True)
 
+    __table_args__ = (
+        db.Index("idx_notifications_user_id_created_at", "user_id", "created_at"),
+        db.Index("idx_notifications_unread", "user_id", "created_at", postgresql_where=db.text("is_read = false")),
+        db.Index("idx_notifications_source", "user_id", "source_type", "source_id", "type"),
+        db.Index("idx_notifications_user_id_id", "user_id", "notification_id"),
+    )
+
+
+class NotificationCounter(db.Model):
+    """
+    Per-user unread counter behind the notification feed.
+
+    ``read_through_id`` is the mark-all-read watermark: notifications up to it
+    count as read whatever their ``is_read``. ``version`` changes whenever the
+    user's feed does and serves as its ETag.
+    """
+    __tablename__ = "notification_counters"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.user_id"), primary_key=True)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
+    read_through_id = db.Column(db.Integer, nullable=False, default=0)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
 
 class InvoicePipelineFollower(db.Model):
     __tablename__ = "invoice_pipeline_followers"
@@ -519,3 +686,85 @@ class AuditLog(db.Model):
     before_data = db.Column(db.JSON, nullable=True)
     after_data = db.Column(db.JSON, nullable=True)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    __table_args__ = (
+        db.Index("idx_audit_logs_created_at", "created_at"),
+        db.Index("idx_audit_logs_entity", "entity_type", "entity_id"),
+        db.Index("idx_audit_logs_entity_type_created", "entity_type", "created_at"),
+        db.Index("idx_audit_logs_user_created", "user_id", "created_at"),
+    )
+
+
+class JobRun(db.Model):
+    """One execution of a batch job; unfinished runs resume from their phase checkpoints."""
+    __tablename__ = "job_runs"
+    run_id = db.Column(db.Integer, primary_key=True)
+    job_name = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="running")
+    started_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime)
+    error = db.Column(db.Text)
+
+    __table_args__ = (
+        db.Index("idx_job_runs_name_status", "job_name", "status", "started_at"),
+    )
+
+
+class JobRunPhase(db.Model):
+    """Keyset cursor and counters for one phase of a job run, committed with each chunk."""
+    __tablename__ = "job_run_phases"
+    run_id = db.Column(db.Integer, db.ForeignKey("job_runs.run_id", ondelete="CASCADE"), primary_key=True)
+    phase = db.Column(db.String(64), primary_key=True)
+    cursor = db.Column(db.BigInteger)
+    chunks = db.Column(db.Integer, nullable=False, default=0)
+    rows_scanned = db.Column(db.BigInteger, nullable=False, default=0)
+    notifications_written = db.Column(db.BigInteger, nullable=False, default=0)
+    wall_ms = db.Column(db.BigInteger, nullable=False, default=0)
+    completed_at = db.Column(db.DateTime)
+
+
+class UserSession(db.Model):
+    """Server-side session for ``SESSION_BACKEND=database``; the cookie holds only the signed id."""
+    __tablename__ = "user_sessions"
+    session_id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class SchemaMigration(db.Model):
+    """One applied file from ``migrations/``; written by ``scripts.migrate``."""
+    __tablename__ = "schema_migrations"
+    version = db.Column(db.String(255), primary_key=True)
+    checksum = db.Column(db.String(64), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False)
+    duration_ms = db.Column(db.Integer, nullable=False, default=0)
+
+
+class OutboxEntry(db.Model):
+    """A side effect committed with the write that caused it; deleted once a worker applies it."""
+    __tablename__ = "outbox"
+    outbox_id = db.Column(db.BigInteger, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    error = db.Column(db.Text)
+
+    __table_args__ = (
+        db.Index("idx_outbox_pending", "available_at", "outbox_id", postgresql_where=db.text("status = 'pending'")),
+    )
+
+
+class ScheduledReminder(db.Model):
+    """The next reminder due for a task or calendar event; ``fire_at`` orders the due queue."""
+    __tablename__ = "scheduled_reminders"
+    source_type = db.Column(db.String(30), primary_key=True)
+    source_id = db.Column(db.Integer, primary_key=True)
+    event_time = db.Column(db.DateTime, nullable=False)
+    fire_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index("idx_scheduled_reminders_fire_at", "fire_at"),
+    )
@@ -0,0 +1,183 @@
+from collections import Counter
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import db
+from models import NotificationCounter, Notifications
+from outbox import enqueue, register
+
+
+READ_THROUGH_KIND = "notifications_read_through"
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def _insert(table):
+    """INSERT with the dialect's ON CONFLICT support (SQLite for the test setup, Postgres otherwise)."""
+    return sqlite_insert(table) if _dialect() == "sqlite" else postgresql_insert(table)
+
+
+def _greatest(*values):
+    # SQLite spells GREATEST as the multi-argument max().
+    return func.max(*values) if _dialect() == "sqlite" else func.greatest(*values)
+
+
+class CounterState:
+    def __init__(self, unread_count=0, read_through_id=0, version=0):
+        self.unread_count = unread_count
+        self.read_through_id = read_through_id
+        self.version = version
+
+
+def counter_state(user_id):
+    """The user's counter in one primary-key lookup; zeros before their first notification."""
+    row = (
+        db.session.query(
+            NotificationCounter.unread_count,
+            NotificationCounter.read_through_id,
+            NotificationCounter.version,
+        )
+        .filter(NotificationCounter.user_id == user_id)
+        .first()
+    )
+    if row is None:
+        return CounterState()
+    return CounterState(row.unread_count, row.read_through_id, row.version)
+
+
+def add_unread(user_ids):
+    """
+    Count one new unread notification per entry of ``user_ids`` with a single upsert.
+
+    Rows are written in user order, so concurrent writers lock counters in
+    the same order and cannot deadlock.
+    """
+    counts = Counter(int(user_id) for user_id in user_ids if user_id)
+    if not counts:
+        return
+    statement = _insert(NotificationCounter).values([
+        {"user_id": user_id, "unread_count": count, "version": 1}
+        for user_id, count in sorted(counts.items())
+    ])
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[NotificationCounter.user_id],
+        set_={
+            "unread_count": NotificationCounter.unread_count + statement.excluded.unread_count,
+            "version": NotificationCounter.version + 1,
+            "updated_at": func.now(),
+        },
+    ))
+
+
+def mark_read(notification):
+    """Mark one notification read; the counter drops only if it still counted it as unread."""
+    if notification.is_read:
+        return
+    notification.is_read = True
+    db.session.execute(
+        update(NotificationCounter)
+        .where(
+            NotificationCounter.user_id == notification.user_id,
+            NotificationCounter.read_through_id < notification.notification_id,
+        )
+        .values(
+            unread_count=_greatest(NotificationCounter.unread_count - 1, 0),
+            version=NotificationCounter.version + 1,
+            updated_at=func.now(),
+        )
+    )
+
+
+def mark_all_read(user_id):
+    """
+    Mark everything the user has read in O(1): zero the counter and move the watermark.
+
+    The watermark is the user's newest notification id (an index probe).
+    Flipping ``is_read`` on the rows themselves is queued on the outbox,
+    so a user with thousands of unread rows doesn't hold the request.
+    """
+    latest = (
+        select(func.coalesce(func.max(Notifications.notification_id), 0))
+        .where(Notifications.user_id == user_id)
+        .scalar_subquery()
+    )
+    statement = _insert(NotificationCounter).values(user_id=user_id, unread_count=0, read_through_id=latest, version=1)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[NotificationCounter.user_id],
+        set_={
+            "unread_count": 0,
+            "read_through_id": _greatest(NotificationCounter.read_through_id, statement.excluded.read_through_id),
+            "version": NotificationCounter.version + 1,
+            "updated_at": func.now(),
+        },
+    ))
+    enqueue(READ_THROUGH_KIND, {"user_id": user_id})
+
+
+@register(READ_THROUGH_KIND)
+def _apply_read_through(payloads):
+    """Set ``is_read`` on rows at or below each user's watermark, in one UPDATE ... FROM."""
+    user_ids = {payload["user_id"] for payload in payloads}
+    db.session.execute(
+        update(Notifications)
+        .where(
+            Notifications.user_id == NotificationCounter.user_id,
+            NotificationCounter.user_id.in_(user_ids),
+            Notifications.notification_id <= NotificationCounter.read_through_id,
+            Notifications.is_read == False,
+        )
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _counted_unread():
+    rows = (
+        db.session.query(Notifications.user_id, func.count(Notifications.notification_id))
+        .outerjoin(NotificationCounter, NotificationCounter.user_id == Notifications.user_id)
+        .filter(
+            Notifications.is_read == False,
+            Notifications.notification_id > func.coalesce(NotificationCounter.read_through_id, 0),
+        )
+        .group_by(Notifications.user_id)
+    )
+    return dict(rows.all())
+
+
+def verify_notification_counters():
+    """Users whose stored unread count disagrees with their notifications."""
+    expected = _counted_unread()
+    stored = dict(db.session.query(NotificationCounter.user_id, NotificationCounter.unread_count).all())
+    mismatches = []
+    for user_id in sorted(set(expected) | set(stored)):
+        if expected.get(user_id, 0) != stored.get(user_id, 0):
+            mismatches.append({
+                "user_id": user_id,
+                "stored": stored.get(user_id, 0),
+                "expected": expected.get(user_id, 0),
+            })
+    return mismatches
+
+
+def rebuild_notification_counters():
+    """Rewrite drifted unread counts from the notifications table; returns how many changed."""
+    mismatches = verify_notification_counters()
+    if mismatches:
+        statement = _insert(NotificationCounter).values([
+            {"user_id": mismatch["user_id"], "unread_count": mismatch["expected"], "version": 1}
+            for mismatch in mismatches
+        ])
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[NotificationCounter.user_id],
+            set_={
+                "unread_count": statement.excluded.unread_count,
+                "version": NotificationCounter.version + 1,
+                "updated_at": func.now(),
+            },
+        ))
+    db.session.commit()
+    return len(mismatches)
@@ -0,0 +1,124 @@
+from collections import defaultdict
+from datetime import datetime
+
+from database import db
+from models import ContactFollowers, InvoicePipelineFollower
+from notifications import bulk_create_notifications, notification_values
+from outbox import enqueue, register
+from pipeline_stages import STAGE_LABELS
+
+
+FANOUT_KIND = "follower_fanout"
+
+# Follower tables by the kind of record being followed.
+FOLLOWERS = {
+    "invoice": (InvoicePipelineFollower.invoice_id, InvoicePipelineFollower.user_id),
+    "contact": (ContactFollowers.contact_id, ContactFollowers.user_id),
+}
+
+
+def followers_by_target(kind, target_ids):
+    """{target_id: [user_id, ...]} for every followed ``kind`` record in ``target_ids``, in one query."""
+    followers = defaultdict(list)
+    target_ids = list(target_ids)
+    if not target_ids:
+        return followers
+    target_column, user_column = FOLLOWERS[kind]
+    for target_id, user_id in db.session.query(target_column, user_column).filter(target_column.in_(target_ids)):
+        followers[target_id].append(user_id)
+    return followers
+
+
+def follower_rows(user_ids, values, exclude_user_id=None):
+    """One ``values`` row per follower, skipping the user who caused the update."""
+    return [
+        dict(values, user_id=user_id)
+        for user_id in user_ids
+        if not (exclude_user_id and user_id == exclude_user_id)
+    ]
+
+
+def pipeline_update_values(invoice_id, account_id, business_name, stage, action_required=False):
+    """Notification columns (minus ``user_id``) for a pipeline stage change on one invoice."""
+    step_label = STAGE_LABELS.get(stage, stage)
+    message = f"{business_name} • Invoice #{invoice_id} • {step_label}"
+    if action_required:
+        message = f"{message} • Action required"
+    return notification_values(
+        user_id=None,
+        notif_type="pipeline_update",
+        title=f"Pipeline update: {step_label}",
+        message=message,
+        link=f"/pipelines/invoice/{invoice_id}",
+        account_id=account_id,
+        invoice_id=invoice_id,
+        source_type="invoice_pipeline",
+        source_id=invoice_id,
+    )
+
+
+def _json_values(values):
+    if values.get("event_time"):
+        return dict(values, event_time=values["event_time"].isoformat())
+    return values
+
+
+def deliver(kind, target_id, values, exclude_user_id=None):
+    """Insert ``values`` for every follower of one record with bulk INSERTs; returns rows written."""
+    user_ids = followers_by_target(kind, [target_id]).get(target_id, [])
+    return bulk_create_notifications(follower_rows(user_ids, values, exclude_user_id))
+
+
+def fan_out(kind, target_id, values, exclude_user_id=None, defer=True):
+    """
+    Notify every follower of a record.
+
+    Deferred (the default), the fan-out is an outbox entry committed with the
+    caller's change and delivered by the outbox workers, so the request never
+    waits on large follower lists. ``defer=False`` runs the follower query and
+    bulk INSERT inside the caller's transaction.
+    """
+    if not defer:
+        return deliver(kind, target_id, values, exclude_user_id)
+    enqueue(FANOUT_KIND, {
+        "kind": kind,
+        "target_id": target_id,
+        "values": _json_values(values),
+        "exclude_user_id": exclude_user_id,
+    })
+    return 0
+
+
+@register(FANOUT_KIND)
+def _deliver_fanouts(payloads):
+    """Apply queued fan-outs: one follower query per kind for the whole batch, then bulk INSERTs."""
+    rows = []
+    for kind in {payload["kind"] for payload in payloads}:
+        batch = [payload for payload in payloads if payload["kind"] == kind]
+        followers = followers_by_target(kind, {payload["target_id"] for payload in batch})
+        for payload in batch:
+            values = dict(payload["values"])
+            if values.get("event_time"):
+                values["event_time"] = datetime.fromisoformat(values["event_time"])
+            rows.extend(follower_rows(followers.get(payload["target_id"], []), values, payload["exclude_user_id"]))
+    bulk_create_notifications(rows)
+
+
+def notify_pipeline_followers(invoice, business_name, stage, actor_user_id=None, action_required=False, defer=True):
+    values = pipeline_update_values(invoice.invoice_id, invoice.account_id, business_name, stage, action_required)
+    return fan_out("invoice", invoice.invoice_id, values, exclude_user_id=actor_user_id, defer=defer)
+
+
+def notify_contact_followers(contact_id, actor_user_id, title, message, link, defer=True):
+    if not contact_id:
+        return 0
+    values = notification_values(
+        user_id=None,
+        notif_type="contact_activity",
+        title=title,
+        message=message,
+        link=link,
+        source_type="contact",
+        source_id=contact_id,
+    )
+    return fan_out("contact", contact_id, values, exclude_user_id=actor_user_id, defer=defer)
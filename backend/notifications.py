@@ -1,5 +1,55 @@
+from sqlalchemy import insert
+
 from models import Notifications
 from database import db
+from event_stream import publish_notifications
+from notification_counters import add_unread
+
+
+INSERT_BATCH_SIZE = 1000
+# Returned by bulk inserts so new rows can be pushed without reading them back.
+STREAM_COLUMNS = (
+    Notifications.notification_id,
+    Notifications.user_id,
+    Notifications.type,
+    Notifications.title,
+    Notifications.message,
+    Notifications.link,
+    Notifications.account_id,
+    Notifications.invoice_id,
+    Notifications.source_type,
+    Notifications.source_id,
+    Notifications.event_time,
+    Notifications.created_at,
+)
+
+
+def notification_values(
+    user_id,
+    notif_type,
+    title,
+    message=None,
+    link=None,
+    account_id=None,
+    invoice_id=None,
+    source_type=None,
+    source_id=None,
+    event_time=None,
+):
+    """Column values for one unread notification row."""
+    return {
+        "user_id": user_id,
+        "type": notif_type,
+        "title": title,
+        "message": message,
+        "link": link,
+        "account_id": account_id,
+        "invoice_id": invoice_id,
+        "source_type": source_type,
+        "source_id": source_id,
+        "event_time": event_time,
+        "is_read": False,
+    }
 
 
 def create_notification(
@@ -14,10 +64,10 @@ def create_notification(
     source_id=None,
     event_time=None,
 ):
-    notification = Notifications(
-        user_id=user_id,
-        type=notif_type,
-        title=title,
+    notification = Notifications(**notification_values(
+        user_id,
+        notif_type,
+        title,
         message=message,
         link=link,
         account_id=account_id,
@@ -25,7 +75,46 @@ def create_notification(
         source_type=source_type,
         source_id=source_id,
         event_time=event_time,
-        is_read=False,
-    )
+    ))
     db.session.add(notification)
+    add_unread([user_id])
     return notification
+
+
+def dedupe_notifications(rows):
+    """
+    Drop repeats of (user_id, source_type, source_id, type), keeping the first.
+
+    Rows without a source are all kept; nothing identifies them as repeats.
+    """
+    seen = set()
+    unique = []
+    for row in rows:
+        if row.get("source_type") is not None:
+            key = (row["user_id"], row["source_type"], row.get("source_id"), row["type"])
+            if key in seen:
+                continue
+            seen.add(key)
+        unique.append(row)
+    return unique
+
+
+def bulk_create_notifications(rows, batch_size=INSERT_BATCH_SIZE):
+    """
+    Insert ``notification_values`` rows with multi-row INSERT statements.
+
+    Rows bypass the unit of work, so nothing is returned but the count of rows
+    written. Repeats within the call are dropped (``dedupe_notifications``), so
+    a user who is both a recipient and a follower is notified once. Batches
+    keep each statement well under the driver's bind-parameter limit; the
+    unread counters of every recipient move in one more statement. The
+    RETURNING rows are pushed to the recipients' open streams on commit.
+    """
+    rows = dedupe_notifications(rows)
+    for start in range(0, len(rows), batch_size):
+        inserted = db.session.execute(
+            insert(Notifications).values(rows[start:start + batch_size]).returning(*STREAM_COLUMNS)
+        )
+        publish_notifications(inserted.all())
+    add_unread(row["user_id"] for row in rows)
+    return len(rows)
@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, event
+from sqlalchemy.orm import Session
+
+from database import db
+from models import OutboxEntry
+
+
+DRAIN_BATCH_SIZE = 200
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_SECONDS = 30
+DEFAULT_WORKERS = 2
+DEFAULT_POLL_SECONDS = 5
+
+# kind -> handler(list_of_payloads); handlers run inside the drain transaction.
+HANDLERS = {}
+
+
+def register(kind):
+    """Register the batch handler for ``kind``; it receives every claimed payload of that kind at once."""
+    def decorator(handler):
+        HANDLERS[kind] = handler
+        return handler
+    return decorator
+
+
+def _setting(name, default):
+    value = current_app.config.get(name)
+    if value is None:
+        value = os.environ.get(name, default)
+    return value
+
+
+def outbox_mode():
+    """``async`` (default): enqueue and let workers apply; ``inline``: apply inside the caller's transaction."""
+    if not has_app_context():
+        return "async"
+    return str(_setting("OUTBOX_MODE", "async")).strip().lower()
+
+
+def enqueue(kind, payload):
+    """
+    Record a side effect to apply after the caller's transaction commits.
+
+    The outbox row is written in the same transaction as the change that
+    caused it, so a crash can neither lose it nor apply it for a rolled-back
+    change. ``payload`` must be JSON-serializable.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"No outbox handler registered for {kind!r}")
+    if outbox_mode() == "inline":
+        HANDLERS[kind]([payload])
+        return None
+    entry = OutboxEntry(kind=kind, payload=payload, available_at=datetime.utcnow())
+    db.session.add(entry)
+    db.session().info["outbox_enqueued"] = True
+    return entry
+
+
+def _claim(batch_size):
+    return (
+        OutboxEntry.query
+        .filter(OutboxEntry.status == "pending", OutboxEntry.available_at <= datetime.utcnow())
+        .order_by(OutboxEntry.outbox_id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+
+def _apply(entries):
+    by_kind = OrderedDict()
+    for entry in entries:
+        by_kind.setdefault(entry.kind, []).append(entry)
+    for kind, kind_entries in by_kind.items():
+        handler = HANDLERS.get(kind)
+        if handler is None:
+            raise LookupError(f"No outbox handler registered for {kind!r}")
+        handler([entry.payload for entry in kind_entries])
+    db.session.execute(
+        delete(OutboxEntry).where(OutboxEntry.outbox_id.in_([entry.outbox_id for entry in entries]))
+    )
+
+
+def _retry_one_by_one(outbox_ids):
+    """After a failed batch, apply entries singly so one bad payload doesn't block the rest."""
+    applied = 0
+    for outbox_id in outbox_ids:
+        entry = OutboxEntry.query.filter_by(outbox_id=outbox_id).with_for_update(skip_locked=True).first()
+        if entry is None or entry.status != "pending":
+            db.session.rollback()
+            continue
+        try:
+            _apply([entry])
+            db.session.commit()
+            applied += 1
+        except Exception as exc:
+            db.session.rollback()
+            entry = OutboxEntry.query.get(outbox_id)
+            entry.attempts = (entry.attempts or 0) + 1
+            entry.error = str(exc)[:2000]
+            if entry.attempts >= MAX_ATTEMPTS:
+                entry.status = "failed"
+                print(f"❌ Outbox entry {outbox_id} ({entry.kind}) failed permanently: {exc}")
+            else:
+                entry.available_at = datetime.utcnow() + timedelta(seconds=RETRY_BACKOFF_SECONDS * entry.attempts)
+            db.session.commit()
+    return applied
+
+
+def drain_outbox(batch_size=DRAIN_BATCH_SIZE, max_batches=None):
+    """
+    Apply pending side effects in batches until none are due; returns how many were applied.
+
+    Each batch is claimed with ``FOR UPDATE SKIP LOCKED``, so several workers
+    (threads or processes) can drain concurrently. Also the synchronous test
+    harness: with ``OUTBOX_WORKERS=0`` nothing runs in the background and a
+    test calls this after the request to apply everything it queued.
+    """
+    applied = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        entries = _claim(batch_size)
+        if not entries:
+            db.session.rollback()
+            break
+        batches += 1
+        outbox_ids = [entry.outbox_id for entry in entries]
+        try:
+            _apply(entries)
+            db.session.commit()
+            applied += len(entries)
+        except Exception:
+            db.session.rollback()
+            applied += _retry_one_by_one(outbox_ids)
+    return applied
+
+
+class OutboxWorkers:
+    """
+    Per-process pool of daemon threads draining the outbox.
+
+    Workers wake when a transaction that enqueued something commits, and poll
+    every ``poll_seconds`` to pick up entries from other processes, jobs, or
+    a process that died before applying them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._threads = []
+        self._pending_wakeups = 0
+        self._pid = None
+
+    def start(self, app, workers, poll_seconds):
+        with self._lock:
+            # Threads don't survive a fork; start afresh in each worker process.
+            if self._pid == os.getpid() or workers <= 0:
+                return
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self._run, args=(app, poll_seconds), name=f"outbox-{idx}", daemon=True)
+                for idx in range(workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def wake(self):
+        with self._wakeup:
+            self._pending_wakeups += 1
+            self._wakeup.notify()
+
+    def _run(self, app, poll_seconds):
+        while True:
+            with self._wakeup:
+                if not self._pending_wakeups:
+                    self._wakeup.wait(timeout=poll_seconds)
+                self._pending_wakeups = max(self._pending_wakeups - 1, 0)
+            try:
+                with app.app_context():
+                    drain_outbox()
+            except Exception as exc:
+                print(f"❌ Outbox worker error: {exc}")
+                time.sleep(poll_seconds)
+
+
+outbox_workers = OutboxWorkers()
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_workers(session):
+    if session.info.pop("outbox_enqueued", False):
+        outbox_workers.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_enqueued(session):
+    session.info.pop("outbox_enqueued", None)
+
+
+def init_outbox(app):
+    """
+    Start the worker threads lazily, on the first request of each process.
+
+    ``OUTBOX_WORKERS`` (default 2; 0 disables background draining) and
+    ``OUTBOX_POLL_SECONDS`` come from app config or the environment.
+    """
+    with app.app_context():
+        workers = int(_setting("OUTBOX_WORKERS", DEFAULT_WORKERS))
+        poll_seconds = float(_setting("OUTBOX_POLL_SECONDS", DEFAULT_POLL_SECONDS))
+
+    @app.before_request
+    def _start_outbox_workers():
+        outbox_workers.start(app, workers, poll_seconds)
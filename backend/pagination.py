@@ -0,0 +1,173 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import date, datetime
+
+from flask import abort, jsonify, make_response, request
+from sqlalchemy import Date, DateTime, and_, false, or_
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# column: SQL expression to sort on; descending: sort direction;
+# nullable: sort NULLs last
+SortKey = namedtuple("SortKey", ["column", "descending", "nullable"], defaults=(False, False))
+PageRequest = namedtuple("PageRequest", ["limit", "cursor", "include_total"])
+Page = namedtuple("Page", ["rows", "next_cursor", "total"])
+
+
+def _bad_request(message):
+    abort(make_response(jsonify({"error": message}), 400))
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"cursor value {value!r} is not JSON serializable")
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(",", ":"), default=_json_default).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    padded = token + "=" * (-len(token) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    if not isinstance(values, list):
+        raise ValueError("cursor must encode a list")
+    return values
+
+
+def page_request(limit_param="limit"):
+    """
+    Parse ``limit``, ``cursor`` and ``include_total`` from the query string.
+
+    Returns None when the caller did not ask for a page, so list endpoints keep
+    their legacy full-array response for existing clients. Endpoints whose
+    legacy response already took a ``limit`` read the page size from another
+    parameter (``limit_param``).
+    """
+    limit = request.args.get(limit_param, type=int)
+    token = request.args.get("cursor")
+    if limit is None and not token:
+        return None
+
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    elif limit < 1:
+        _bad_request(f"{limit_param} must be a positive integer")
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    cursor = None
+    if token:
+        try:
+            cursor = decode_cursor(token)
+        except Exception:
+            _bad_request("Invalid cursor")
+
+    include_total = request.args.get("include_total", "false").lower() == "true"
+    return PageRequest(limit=limit, cursor=cursor, include_total=include_total)
+
+
+def _cursor_value(key, value):
+    """Turn ISO strings from a decoded cursor back into dates for date/time keys."""
+    if not isinstance(value, str):
+        return value
+    column_type = getattr(key.column, "type", None)
+    try:
+        if isinstance(column_type, DateTime):
+            return datetime.fromisoformat(value)
+        if isinstance(column_type, Date):
+            return date.fromisoformat(value)
+    except ValueError:
+        _bad_request("Invalid cursor")
+    return value
+
+
+def _after(key, value):
+    value = _cursor_value(key, value)
+    if key.descending:
+        if key.nullable:
+            if value is None:
+                return false()
+            return or_(key.column < value, key.column.is_(None))
+        return key.column < value
+    if key.nullable:
+        if value is None:
+            return false()
+        return or_(key.column > value, key.column.is_(None))
+    return key.column > value
+
+
+def _equal(key, value):
+    value = _cursor_value(key, value)
+    if value is None:
+        return key.column.is_(None)
+    return key.column == value
+
+
+def _keyset_filter(keys, cursor):
+    if len(cursor) != len(keys):
+        _bad_request("Invalid cursor")
+    clauses = []
+    for idx, key in enumerate(keys):
+        prefix = [_equal(keys[pos], cursor[pos]) for pos in range(idx)]
+        clauses.append(and_(*prefix, _after(key, cursor[idx])))
+    return or_(*clauses)
+
+
+def _order_by(keys):
+    ordering = []
+    for key in keys:
+        if key.descending:
+            ordering.append(key.column.desc().nullslast() if key.nullable else key.column.desc())
+        elif key.nullable:
+            ordering.append(key.column.asc().nullslast())
+        else:
+            ordering.append(key.column.asc())
+    return ordering
+
+
+def paginate(query, keys, cursor_of, page, row_filter=None):
+    """
+    Fetch one keyset page of ``query`` ordered by ``keys``.
+
+    ``cursor_of`` maps a result row to its sort-key values. When ``row_filter``
+    is given, rows failing it are skipped and more rows are scanned until the
+    page is full; ``total`` is not reported in that case.
+    """
+    total = None
+    if page.include_total and row_filter is None:
+        total = query.order_by(None).count()
+
+    ordered = query.order_by(*_order_by(keys))
+    cursor = page.cursor
+    rows = []
+    while len(rows) <= page.limit:
+        batch_query = ordered.filter(_keyset_filter(keys, cursor)) if cursor else ordered
+        batch = batch_query.limit(page.limit + 1).all()
+        for row in batch:
+            if row_filter is None or row_filter(row):
+                rows.append(row)
+        if len(batch) <= page.limit:
+            break
+        cursor = list(cursor_of(batch[-1]))
+
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        next_cursor = encode_cursor(cursor_of(rows[-1]))
+    return Page(rows=rows, next_cursor=next_cursor, total=total)
+
+
+def page_payload(page, items):
+    payload = {
+        "items": items,
+        "next_cursor": page.next_cursor,
+        "has_more": page.next_cursor is not None,
+    }
+    if page.total is not None:
+        payload["total"] = page.total
+    return payload
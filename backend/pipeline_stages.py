@@ -0,0 +1,169 @@
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import func, insert
+
+from database import db
+from models import Invoice, InvoicePipeline, InvoicePipelineHistory, Payment
+from event_stream import publish_pipeline_history
+from outbox import enqueue, register
+
+
+STAGE_ORDER = {
+    "contact_customer": 0,
+    "order_placed": 1,
+    "payment_not_received": 2,
+    "payment_received": 3,
+    "order_packaged": 4,
+    "order_shipped": 5,
+    "order_delivered": 6,
+}
+
+STAGE_LABELS = {
+    "contact_customer": "Contact customer",
+    "order_placed": "Order placed",
+    "payment_not_received": "Payment not received",
+    "payment_received": "Payment received",
+    "order_packaged": "Order packaged",
+    "order_shipped": "Order shipped",
+    "order_delivered": "Order delivered",
+}
+
+
+def _to_decimal(value):
+    try:
+        return Decimal(str(value))
+    except Exception:
+        return Decimal("0")
+
+
+def _to_cents(value):
+    return int((_to_decimal(value).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)) * 100)
+
+
+def payment_totals_subquery():
+    """One grouped aggregate of paid total and latest payment per invoice."""
+    return (
+        db.session.query(
+            Payment.invoice_id.label("invoice_id"),
+            func.coalesce(func.sum(Payment.total_paid), 0).label("total_paid"),
+            func.max(Payment.date_paid).label("latest_paid"),
+        )
+        .group_by(Payment.invoice_id)
+        .subquery()
+    )
+
+
+def stage_query(*entities):
+    """
+    Query InvoicePipeline joined to Invoice and the payment aggregate.
+
+    Every row carries the requested entities followed by ``total_paid`` and
+    ``latest_paid`` so stages can be resolved without further round trips.
+    """
+    totals = payment_totals_subquery()
+    return (
+        db.session.query(*entities, totals.c.total_paid, totals.c.latest_paid)
+        .select_from(InvoicePipeline)
+        .join(Invoice, Invoice.invoice_id == InvoicePipeline.invoice_id)
+        .outerjoin(totals, totals.c.invoice_id == Invoice.invoice_id)
+    )
+
+
+def is_paid_in_full(final_total, total_paid):
+    final_cents = _to_cents(final_total or 0)
+    paid_cents = _to_cents(total_paid or 0)
+    return final_cents <= 0 or paid_cents >= final_cents
+
+
+def resolve_stage(
+    current_stage,
+    final_total,
+    total_paid,
+    latest_payment,
+    payment_not_received_at=None,
+    payment_issue_notified_at=None,
+    payment_received_at=None,
+    today=None,
+):
+    """Compute the effective pipeline stage from pre-aggregated payment data."""
+    if not is_paid_in_full(final_total, total_paid):
+        if current_stage == "payment_not_received" or payment_not_received_at or payment_issue_notified_at:
+            return "payment_not_received"
+        if current_stage in ("contact_customer", "order_placed"):
+            return current_stage
+        return "order_placed"
+
+    payment_date = payment_received_at or latest_payment
+    if not payment_date:
+        return current_stage or "payment_received"
+
+    today = today or datetime.utcnow().date()
+    days_since = (today - payment_date.date()).days
+    if days_since >= 3:
+        computed = "order_delivered"
+    elif days_since >= 2:
+        computed = "order_shipped"
+    elif days_since >= 1:
+        computed = "order_packaged"
+    else:
+        computed = "payment_received"
+
+    current = current_stage or computed
+    if STAGE_ORDER.get(current, 0) > STAGE_ORDER.get(computed, 0):
+        return current
+    return computed
+
+
+def resolve_row_stage(row, today=None):
+    """
+    Resolve the stage of a ``stage_query`` row.
+
+    The row must expose ``current_stage``, ``final_total``,
+    ``payment_not_received_at``, ``payment_issue_notified_at`` and
+    ``payment_received_at`` either as columns or through ``InvoicePipeline``
+    and ``Invoice`` entities.
+    """
+    pipeline = getattr(row, "InvoicePipeline", row)
+    invoice = getattr(row, "Invoice", row)
+    return resolve_stage(
+        pipeline.current_stage,
+        invoice.final_total,
+        row.total_paid,
+        row.latest_paid,
+        payment_not_received_at=pipeline.payment_not_received_at,
+        payment_issue_notified_at=pipeline.payment_issue_notified_at,
+        payment_received_at=pipeline.payment_received_at,
+        today=today,
+    )
+
+
+def invoice_payment_stats(invoice_id):
+    """Paid total and latest payment date for a single invoice in one query."""
+    total_paid, latest_payment = db.session.query(
+        func.coalesce(func.sum(Payment.total_paid), 0),
+        func.max(Payment.date_paid),
+    ).filter(Payment.invoice_id == invoice_id).one()
+    return _to_decimal(total_paid or 0), latest_payment
+
+
+PIPELINE_HISTORY_KIND = "pipeline_history"
+
+
+def record_pipeline_history(invoice_id, stage, action, note, actor_user_id=None):
+    """Queue a pipeline timeline row through the outbox, stamped with the time of the change."""
+    return enqueue(PIPELINE_HISTORY_KIND, {
+        "invoice_id": invoice_id,
+        "stage": stage,
+        "action": action,
+        "note": note,
+        "actor_user_id": actor_user_id,
+        "created_at": datetime.now().isoformat(sep=" "),
+    })
+
+
+@register(PIPELINE_HISTORY_KIND)
+def _write_pipeline_history(payloads):
+    rows = [dict(payload, created_at=datetime.fromisoformat(payload["created_at"])) for payload in payloads]
+    db.session.execute(insert(InvoicePipelineHistory).values(rows))
+    publish_pipeline_history(rows)
@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from sqlalchemy import inspect
+
+from cache import cache
+from models import Branches, Departments, Industry, PaymentMethods, Region, Service, TaxRates, UserRoles
+
+
+# Small, rarely changing lookup tables served from process memory.
+REFERENCE_MODELS = (Industry, Region, PaymentMethods, Service, Branches, Departments, UserRoles, TaxRates)
+
+MAX_ENTRIES = 4096
+# Invalidations are published as cache tags on the shared tier; each process
+# polls a table's tag at most this often before trusting its local copy.
+SHARED_CHECK_SECONDS = 5
+# Safety net in case an invalidation is lost (e.g. the shared tier restarts).
+TTL_SECONDS = 300
+
+_ALL = "__all__"
+_MISSING = object()
+
+
+def _shared_tag(table):
+    return f"reference:{table}"
+
+
+def _snapshot(row):
+    """Detached, read-only-by-convention copy of a row; safe to share across requests."""
+    if row is None:
+        return None
+    columns = inspect(type(row)).columns
+    return SimpleNamespace(**{column.key: getattr(row, column.key) for column in columns})
+
+
+class ReferenceCache:
+    """
+    Bounded LRU of lookup rows keyed by (table, primary key).
+
+    Every table has a version number; ``invalidate`` bumps it, and entries
+    stored under an older version are treated as misses. Invalidations from
+    other processes arrive through the shared cache tag of the table, which is
+    checked every ``SHARED_CHECK_SECONDS``. Entries also expire after ``ttl``
+    seconds.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._shared = {}
+
+    def _sync(self, table):
+        now = time.monotonic()
+        with self._lock:
+            checked = self._shared.get(table)
+            if checked and checked[0] > now:
+                return
+        tag = _shared_tag(table)
+        token = cache.tag_tokens([tag])[tag]
+        with self._lock:
+            previous = self._shared.get(table)
+            if previous and previous[1] != token:
+                self._versions[table] = self._versions.get(table, 0) + 1
+            self._shared[table] = (now + SHARED_CHECK_SECONDS, token)
+
+    def _lookup(self, cache_key, table):
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return _MISSING
+            version, expires_at, value = entry
+            if version != self._versions.get(table, 0) or expires_at < time.monotonic():
+                del self._entries[cache_key]
+                return _MISSING
+            self._entries.move_to_end(cache_key)
+            return value
+
+    def _store(self, cache_key, table, version, value):
+        with self._lock:
+            if version != self._versions.get(table, 0):
+                # Invalidated while loading; don't cache what may already be stale.
+                return
+            self._entries[cache_key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, table, key, loader):
+        self._sync(table)
+        cache_key = (table, key)
+        value = self._lookup(cache_key, table)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            version = self._versions.get(table, 0)
+        value = loader()
+        self._store(cache_key, table, version, value)
+        return value
+
+    def invalidate(self, table):
+        with self._lock:
+            self._versions[table] = self._versions.get(table, 0) + 1
+        cache.invalidate_tags(_shared_tag(table))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._shared.clear()
+
+
+reference_cache = ReferenceCache()
+
+
+def _table(model):
+    if model not in REFERENCE_MODELS:
+        raise ValueError(f"{model.__name__} is not a cached reference table")
+    return model.__tablename__
+
+
+def get_reference(model, key):
+    """Cached ``model.query.get(key)`` as a detached snapshot (or None)."""
+    if key is None:
+        return None
+    return reference_cache.get_or_load(_table(model), key, lambda: _snapshot(model.query.get(key)))
+
+
+def all_references(model):
+    """Cached snapshot of every row of a reference table, in primary-key order."""
+    primary_key = inspect(model).primary_key[0]
+    return reference_cache.get_or_load(
+        _table(model),
+        _ALL,
+        lambda: [_snapshot(row) for row in model.query.order_by(primary_key).all()],
+    )
+
+
+def invalidate_reference(model):
+    """Drop cached rows for ``model`` in every process; call after committing a change to it."""
+    reference_cache.invalidate(_table(model))
@@ -0,0 +1,338 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import noload
+
+from calendar_recurrence import expand_events, in_window
+from database import db
+from models import Account, CalendarEvent, Notifications, ScheduledReminder, Tasks
+from notifications import bulk_create_notifications, notification_values
+
+
+TASK = "task"
+CALENDAR_EVENT = "calendar_event"
+REMINDER_TYPES = {TASK: "task_reminder", CALENDAR_EVENT: "event_reminder"}
+
+TASK_REMINDER_MINUTES = 15
+FIRE_BATCH_SIZE = 500
+REBUILD_CHUNK_SIZE = 1000
+# A series' next occurrence is searched one window at a time, up to the horizon.
+SERIES_SEARCH_DAYS = 62
+SERIES_HORIZON_DAYS = 2 * 366
+
+
+def _insert(table):
+    """INSERT with the dialect's ON CONFLICT support (SQLite for the test setup, Postgres otherwise)."""
+    if db.session.get_bind().dialect.name == "sqlite":
+        return sqlite_insert(table)
+    return postgresql_insert(table)
+
+
+def event_start_datetime(event):
+    start_time = event.start_time
+    try:
+        time_part = start_time.time()
+    except AttributeError:
+        time_part = start_time
+    return datetime.combine(event.start_date, time_part)
+
+
+def unschedule(source_type, source_ids):
+    source_ids = [source_id for source_id in source_ids if source_id]
+    if source_ids:
+        db.session.execute(delete(ScheduledReminder).where(
+            ScheduledReminder.source_type == source_type,
+            ScheduledReminder.source_id.in_(source_ids),
+        ))
+
+
+def _upsert(rows):
+    if not rows:
+        return
+    statement = _insert(ScheduledReminder).values(rows)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[ScheduledReminder.source_type, ScheduledReminder.source_id],
+        set_={"event_time": statement.excluded.event_time, "fire_at": statement.excluded.fire_at},
+    ))
+
+
+def schedule_task_reminders(task_ids=None, now=None):
+    """
+    Recompute the queued reminder of each task in ``task_ids`` (every task when None).
+
+    Computed in the database with one INSERT ... SELECT: open tasks due after
+    ``now`` whose reminder hasn't gone out are queued ``TASK_REMINDER_MINUTES``
+    before the due date, and every other task loses its entry.
+    """
+    now = now or datetime.now()
+    db.session.flush()
+    if task_ids is None:
+        db.session.execute(delete(ScheduledReminder).where(ScheduledReminder.source_type == TASK))
+    else:
+        task_ids = [task_id for task_id in task_ids if task_id]
+        if not task_ids:
+            return
+        unschedule(TASK, task_ids)
+
+    due = select(
+        literal(TASK),
+        Tasks.task_id,
+        Tasks.due_date,
+        Tasks.due_date - timedelta(minutes=TASK_REMINDER_MINUTES),
+    ).where(
+        Tasks.is_completed == False,
+        Tasks.due_date > now,
+        Tasks.reminder_sent_at.is_(None),
+    )
+    if task_ids is not None:
+        due = due.where(Tasks.task_id.in_(task_ids))
+    db.session.execute(
+        _insert(ScheduledReminder)
+        .from_select(["source_type", "source_id", "event_time", "fire_at"], due)
+        .on_conflict_do_nothing()
+    )
+
+
+def next_event_reminder(event, after):
+    """(event_time, fire_at) for the first occurrence of ``event`` starting after ``after``, or None."""
+    if event.reminder_minutes is None:
+        return None
+    lead = timedelta(minutes=event.reminder_minutes)
+    if not event.recurrence_rule:
+        start = event_start_datetime(event)
+        return (start, start - lead) if start > after else None
+
+    window_start = after.date()
+    horizon = window_start + timedelta(days=SERIES_HORIZON_DAYS)
+    if event.recurrence_until:
+        horizon = min(horizon, event.recurrence_until)
+    while window_start <= horizon:
+        window_end = min(window_start + timedelta(days=SERIES_SEARCH_DAYS), horizon)
+        for occurrence in expand_events([event], window_start, window_end):
+            start = event_start_datetime(occurrence)
+            if start > after:
+                return start, start - lead
+        window_start = window_end + timedelta(days=1)
+    return None
+
+
+def schedule_event_reminders(events, now=None):
+    """Queue the next reminder of each calendar event (the next occurrence, for a series)."""
+    now = now or datetime.now()
+    rows, done = [], []
+    for event in events:
+        upcoming = next_event_reminder(event, now)
+        if upcoming is None:
+            done.append(event.event_id)
+            continue
+        event_time, fire_at = upcoming
+        rows.append({"source_type": CALENDAR_EVENT, "source_id": event.event_id, "event_time": event_time, "fire_at": fire_at})
+    unschedule(CALENDAR_EVENT, done)
+    _upsert(rows)
+
+
+def _claim_due(now, batch_size):
+    """Pop the earliest due entries; SKIP LOCKED lets several workers share the queue."""
+    return (
+        ScheduledReminder.query
+        .filter(ScheduledReminder.fire_at <= now)
+        .order_by(ScheduledReminder.fire_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+
+def _already_sent(source_type, entries):
+    """(source_id, event_time) pairs that already have a reminder, e.g. after an edit re-queued one."""
+    if not entries:
+        return set()
+    rows = db.session.query(Notifications.source_id, Notifications.event_time).filter(
+        Notifications.type == REMINDER_TYPES[source_type],
+        Notifications.source_type == source_type,
+        Notifications.source_id.in_({entry.source_id for entry in entries}),
+        Notifications.event_time.in_({entry.event_time for entry in entries}),
+    )
+    return {(source_id, event_time) for source_id, event_time in rows}
+
+
+def _fire_task_reminders(entries, now):
+    rows = []
+    if not entries:
+        return rows
+    sent = _already_sent(TASK, entries)
+    tasks = {
+        task.task_id: task
+        for task in db.session.query(
+            Tasks.task_id,
+            Tasks.user_id,
+            Tasks.assigned_to,
+            Tasks.task_description,
+            Tasks.due_date,
+            Tasks.is_completed,
+            Account.business_name,
+        )
+        .outerjoin(Account, Account.account_id == Tasks.account_id)
+        .filter(Tasks.task_id.in_([entry.source_id for entry in entries]))
+    }
+    handled, moved = [], []
+    for entry in entries:
+        task = tasks.get(entry.source_id)
+        if task is None or task.is_completed:
+            continue
+        if task.due_date != entry.event_time:
+            moved.append(entry.source_id)
+            continue
+        handled.append(task.task_id)
+        if entry.event_time < now or (entry.source_id, entry.event_time) in sent:
+            continue
+        recipients = []
+        if task.assigned_to:
+            recipients.append(task.assigned_to)
+        if task.user_id and task.user_id != task.assigned_to:
+            recipients.append(task.user_id)
+        for user_id in recipients:
+            rows.append(notification_values(
+                user_id=user_id,
+                notif_type=REMINDER_TYPES[TASK],
+                title="Task reminder",
+                message=task.business_name or task.task_description,
+                link=f"/tasks/{task.task_id}",
+                source_type=TASK,
+                source_id=task.task_id,
+                event_time=task.due_date,
+            ))
+
+    # Task reminders fire once: the entry goes and reminder_sent_at records it.
+    if handled:
+        db.session.execute(
+            update(Tasks)
+            .where(Tasks.task_id.in_(handled))
+            .values(reminder_sent_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    unschedule(TASK, [entry.source_id for entry in entries])
+    if moved:
+        schedule_task_reminders(moved, now=now)
+    return rows
+
+
+def _fire_event_reminders(entries, now):
+    rows = []
+    if not entries:
+        return rows
+    sent = _already_sent(CALENDAR_EVENT, entries)
+    events = {
+        event.event_id: event
+        for event in CalendarEvent.query.options(noload(CalendarEvent.attendees))
+        .filter(CalendarEvent.event_id.in_([entry.source_id for entry in entries]))
+    }
+    # One expansion (and one exceptions query) covers every due occurrence in the batch.
+    series = [event for event in events.values() if event.recurrence_rule]
+    occurrences = {}
+    if series:
+        first_day = min(entry.event_time.date() for entry in entries)
+        last_day = max(entry.event_time.date() for entry in entries)
+        for occurrence in expand_events(series, first_day, last_day):
+            occurrences[(occurrence.event_id, event_start_datetime(occurrence))] = occurrence
+
+    for entry in entries:
+        event = events.get(entry.source_id)
+        if event is None:
+            continue
+        instance = occurrences.get((event.event_id, entry.event_time)) if event.recurrence_rule else event
+        if instance is None or event_start_datetime(instance) != entry.event_time:
+            continue
+        if entry.event_time < now or (entry.source_id, entry.event_time) in sent:
+            continue
+        rows.append(notification_values(
+            user_id=event.user_id,
+            notif_type=REMINDER_TYPES[CALENDAR_EVENT],
+            title=f"Upcoming event: {instance.event_title}",
+            message=f"Starts at {entry.event_time.strftime('%I:%M %p').lstrip('0')}",
+            link=f"/calendar?date={instance.start_date.strftime('%Y-%m-%d')}",
+            source_type=CALENDAR_EVENT,
+            source_id=event.event_id,
+            event_time=entry.event_time,
+        ))
+
+    # Series move on to their next occurrence; single events drop out of the queue.
+    upcoming, done = [], [entry.source_id for entry in entries if entry.source_id not in events]
+    for entry in entries:
+        event = events.get(entry.source_id)
+        if event is None:
+            continue
+        following = next_event_reminder(event, max(entry.event_time, now))
+        if following is None:
+            done.append(event.event_id)
+        else:
+            upcoming.append({
+                "source_type": CALENDAR_EVENT,
+                "source_id": event.event_id,
+                "event_time": following[0],
+                "fire_at": following[1],
+            })
+    unschedule(CALENDAR_EVENT, done)
+    _upsert(upcoming)
+    return rows
+
+
+def fire_due_reminders(now=None, batch_size=FIRE_BATCH_SIZE, max_batches=None, on_batch=None):
+    """
+    Send every reminder due by ``now`` in bulk, one committed batch at a time.
+
+    Entries are popped in ``fire_at`` order from the indexed queue, so the
+    cost depends on what is due, not on how many tasks and events exist.
+    Reminders whose event has already started are dropped, as before.
+    ``on_batch(entries, written)`` runs just before each commit. Returns
+    (entries popped, notifications written).
+    """
+    now = now or datetime.now()
+    popped = written = batches = 0
+    while max_batches is None or batches < max_batches:
+        entries = _claim_due(now, batch_size)
+        if not entries:
+            db.session.rollback()
+            break
+        batches += 1
+        rows = _fire_task_reminders([entry for entry in entries if entry.source_type == TASK], now)
+        rows += _fire_event_reminders([entry for entry in entries if entry.source_type == CALENDAR_EVENT], now)
+        count = bulk_create_notifications(rows)
+        if on_batch:
+            on_batch(entries, count)
+        db.session.commit()
+        popped += len(entries)
+        written += count
+    return popped, written
+
+
+def next_fire_at():
+    """Earliest queued fire time (the top of the heap), or None when nothing is queued."""
+    return db.session.query(func.min(ScheduledReminder.fire_at)).scalar()
+
+
+def rebuild_reminder_schedule(now=None, chunk_size=REBUILD_CHUNK_SIZE):
+    """Recompute the whole queue from the tasks and calendar_events tables; returns entries queued."""
+    now = now or datetime.now()
+    schedule_task_reminders(now=now)
+    db.session.execute(delete(ScheduledReminder).where(ScheduledReminder.source_type == CALENDAR_EVENT))
+
+    query = (
+        CalendarEvent.query.options(noload(CalendarEvent.attendees))
+        .filter(CalendarEvent.reminder_minutes.isnot(None), in_window(window_start=now.date()))
+        .order_by(CalendarEvent.event_id)
+    )
+    last_id = None
+    while True:
+        chunk_query = query if last_id is None else query.filter(CalendarEvent.event_id > last_id)
+        events = chunk_query.limit(chunk_size).all()
+        if not events:
+            break
+        schedule_event_reminders(events, now=now)
+        last_id = events[-1].event_id
+        if len(events) < chunk_size:
+            break
+    db.session.commit()
+    return db.session.query(func.count()).select_from(ScheduledReminder).scalar()
@@ -4,6 +4,10 @@ from sqlalchemy import func
 from database import db
 from notifications import create_notification
 from audit import create_audit_log
+from contact_search import contact_ids_for_account, refresh_contact_search
+from pagination import SortKey, page_payload, page_request, paginate
+from serializers import account_load_options
+from reference_cache import get_reference
 
 
 # Create Blueprint
@@ -49,7 +53,7 @@ def get_assigned_accounts():
     if not sales_rep_id:
         return jsonify({"error": "User ID is required"}), 400
 
-    accounts = Account.query.filter_by(sales_rep_id=sales_rep_id).all()
+    accounts = Account.query.options(*account_load_options()).filter_by(sales_rep_id=sales_rep_id).all()
     return jsonify([account.to_dict() for account in accounts]), 200
 
 # Get Account Details API (with Sales Rep and Branch Info) - MUST COME BEFORE /<int:account_id>
@@ -60,7 +64,7 @@ def get_account_details(account_id):
     # Fetch Industry Name
     industry_name = None
     if account.industry_id:
-        industry = Industry.query.get(account.industry_id)
+        industry = get_reference(Industry, account.industry_id)
         industry_name = industry.industry_name if industry else None
     region_name = account.region_rel.region_name if account.region_rel else account.region
 
@@ -82,7 +86,7 @@ def get_account_details(account_id):
             }
             # Fetch Branch Details
             if sales_rep.branch_id:
-                branch = Branches.query.get(sales_rep.branch_id)
+                branch = get_reference(Branches, sales_rep.branch_id)
                 if branch:
                     branch_info = {
                         "branch_name": branch.branch_name,
@@ -227,8 +231,22 @@ def get_account_metrics():
 # Get All Accounts API
 @account_bp.route("/", methods=["GET"])
 def get_accounts():
-    accounts = Account.query.all()
-    primary_links = AccountContacts.query.order_by(
+    page = page_request()
+    if page:
+        page = paginate(
+            Account.query.options(*account_load_options()),
+            [SortKey(Account.account_id)],
+            lambda acc: (acc.account_id,),
+            page,
+        )
+        accounts = page.rows
+        primary_links = AccountContacts.query.filter(
+            AccountContacts.account_id.in_([acc.account_id for acc in accounts])
+        )
+    else:
+        accounts = Account.query.options(*account_load_options()).all()
+        primary_links = AccountContacts.query
+    primary_links = primary_links.order_by(
         AccountContacts.is_primary.desc(),
         AccountContacts.created_at.asc(),
     ).all()
@@ -270,6 +288,8 @@ def get_accounts():
         }
         for acc in accounts
     ]
+    if page:
+        return jsonify(page_payload(page, account_list)), 200
     return jsonify(account_list), 200
 
 # Get Account By ID API
@@ -346,7 +366,7 @@ def update_account(account_id):
         if "region" in data and "region_id" not in data:
             account.region = _coerce_empty(data.get("region"))
         if "branch_id" in data and "region_id" not in data:
-            branch = Branches.query.get(account.branch_id) if account.branch_id else None
+            branch = get_reference(Branches, account.branch_id) if account.branch_id else None
             if branch and branch.branch_name:
                 region = Region.query.filter_by(region_name=branch.branch_name).first()
                 if region:
@@ -392,6 +412,7 @@ def update_account(account_id):
             after_data=account.to_dict(),
             account_id=account.account_id,
         )
+        refresh_contact_search(contact_ids_for_account(account.account_id))
         db.session.commit()
 
         # Log after updating
@@ -484,6 +505,7 @@ def delete_account(account_id):
         return jsonify({"error": "Account not found"}), 404
 
     before_data = account.to_dict()
+    linked_contact_ids = contact_ids_for_account(account_id)
     db.session.delete(account)
     create_audit_log(
         entity_type="account",
@@ -495,5 +517,6 @@ def delete_account(account_id):
         after_data=None,
         account_id=account_id,
     )
+    refresh_contact_search(linked_contact_ids)
     db.session.commit()
     return jsonify({"message": "Account deleted successfully"}), 200
@@ -1,5 +1,5 @@
-from datetime import datetime, timedelta, date
-from decimal import Decimal, ROUND_HALF_UP
+from datetime import datetime, timedelta
+from decimal import Decimal
 
 import pytz
 from flask import Blueprint, jsonify, request
@@ -8,20 +8,29 @@ from sqlalchemy import func
 from database import db
 from models import (
     Account,
+    AnalyticsDailyRollup,
     Contact,
     ContactInteractions,
     Invoice,
+    InvoiceBalance,
     InvoicePipeline,
-    Payment,
     Tasks,
     Users,
 )
-from routes.pipeline_routes import _effective_stage
+from analytics_buckets import bucket_index, build_buckets, fill_buckets
+from analytics_rollups import rollup_query, rollup_totals
+from cache import ANALYTICS_TAG, cache
+from invoice_balances import cents_to_decimal
+from pipeline_stages import resolve_row_stage, stage_query
 
 
 analytics_bp = Blueprint("analytics", __name__)
 central = pytz.timezone("America/Chicago")
 
+# Writes to the underlying tables invalidate the overview through ANALYTICS_TAG;
+# the TTL only bounds time-relative figures such as overdue task counts.
+OVERVIEW_CACHE_TTL = 60
+
 
 def _to_decimal(value):
     try:
@@ -30,10 +39,6 @@ def _to_decimal(value):
         return Decimal("0")
 
 
-def _to_cents(value):
-    return int((_to_decimal(value).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)) * 100)
-
-
 def _parse_date(value):
     if not value:
         return None
@@ -47,54 +52,6 @@ def _resolve_scope(user_id, sales_rep_id):
     return sales_rep_id or user_id
 
 
-def _bucket_granularity(start_date, end_date):
-    span = (end_date - start_date).days
-    if span <= 31:
-        return "day"
-    if span <= 120:
-        return "week"
-    return "month"
-
-
-def _build_buckets(start_date, end_date):
-    gran = _bucket_granularity(start_date, end_date)
-    if gran == "day":
-        count = (end_date - start_date).days + 1
-        labels = [
-            (start_date + timedelta(days=idx)).strftime("%m/%d")
-            for idx in range(count)
-        ]
-        return gran, labels
-    if gran == "week":
-        count = ((end_date - start_date).days // 7) + 1
-        labels = [
-            (start_date + timedelta(days=idx * 7)).strftime("%m/%d")
-            for idx in range(count)
-        ]
-        return gran, labels
-
-    # month
-    month_count = (end_date.year - start_date.year) * 12 + (end_date.month - start_date.month) + 1
-    labels = []
-    year = start_date.year
-    month = start_date.month
-    for _ in range(month_count):
-        labels.append(date(year, month, 1).strftime("%b %Y"))
-        month += 1
-        if month > 12:
-            month = 1
-            year += 1
-    return gran, labels
-
-
-def _bucket_index(gran, start_date, row_date):
-    if gran == "day":
-        return (row_date - start_date).days
-    if gran == "week":
-        return (row_date - start_date).days // 7
-    return (row_date.year - start_date.year) * 12 + (row_date.month - start_date.month)
-
-
 @analytics_bp.route("/overview", methods=["GET"])
 def analytics_overview():
     user_id = request.args.get("user_id", type=int)
@@ -107,16 +64,25 @@ def analytics_overview():
     today = datetime.now(central).date()
     start_date = date_from or (today - timedelta(days=29))
     end_date = date_to or today
+    explicit_range = bool(date_from or date_to)
+
+    cache_key = f"analytics:overview:{scope_id or 'all'}:{start_date}:{end_date}:{int(explicit_range)}:{today}"
+    response = cache.cached(
+        cache_key,
+        lambda: _overview_payload(scope_id, start_date, end_date, explicit_range, today),
+        ttl=OVERVIEW_CACHE_TTL,
+        tags=(ANALYTICS_TAG,),
+    )
+    return jsonify(response), 200
 
+
+def _overview_payload(scope_id, start_date, end_date, explicit_range, today):
     start_dt = datetime.combine(start_date, datetime.min.time())
     end_dt = datetime.combine(end_date, datetime.max.time())
 
     # Payments (revenue)
-    payments_query = db.session.query(func.coalesce(func.sum(Payment.total_paid), 0))
-    if scope_id:
-        payments_query = payments_query.filter(Payment.sales_rep_id == scope_id)
-    payments_query = payments_query.filter(Payment.date_paid >= start_dt, Payment.date_paid <= end_dt)
-    revenue_total = float(payments_query.scalar() or 0)
+    _payment_count, revenue_cents, _ = rollup_totals("payments", start_date, end_date, scope_id)
+    revenue_total = float(cents_to_decimal(revenue_cents))
 
     # Accounts
     accounts_query = Account.query
@@ -124,64 +90,47 @@ def analytics_overview():
         accounts_query = accounts_query.filter(Account.sales_rep_id == scope_id)
     active_accounts = accounts_query.count()
 
-    # Invoices with payment totals and latest payment date
-    payment_totals = (
+    # Open AR and past-due from the materialized invoice balances
+    open_query = (
         db.session.query(
-            Payment.invoice_id.label("invoice_id"),
-            func.coalesce(func.sum(Payment.total_paid), 0).label("total_paid"),
-            func.max(Payment.date_paid).label("latest_paid"),
+            func.count(InvoiceBalance.invoice_id),
+            func.coalesce(func.sum(InvoiceBalance.remaining_cents), 0),
         )
-        .group_by(Payment.invoice_id)
-        .subquery()
-    )
-    invoice_query = (
-        db.session.query(Invoice, payment_totals.c.total_paid, payment_totals.c.latest_paid)
-        .outerjoin(payment_totals, Invoice.invoice_id == payment_totals.c.invoice_id)
+        .join(Invoice, Invoice.invoice_id == InvoiceBalance.invoice_id)
+        .filter(InvoiceBalance.paid_in_full == False)
     )
     if scope_id:
-        invoice_query = invoice_query.filter(Invoice.sales_rep_id == scope_id)
-
-    open_invoice_amount = Decimal("0")
-    past_due_amount = Decimal("0")
-    open_invoice_count = 0
-    paid_days = []
-
-    for invoice, total_paid, latest_paid in invoice_query.all():
-        final_total = _to_decimal(invoice.final_total or 0)
-        total_paid = _to_decimal(total_paid or 0)
-        final_cents = _to_cents(final_total)
-        paid_cents = _to_cents(total_paid)
-        remaining_cents = max(final_cents - paid_cents, 0)
-
-        if final_cents <= 0 or paid_cents >= final_cents:
-            if latest_paid and invoice.date_created:
-                latest_paid_date = latest_paid.date()
-                if start_date <= latest_paid_date <= end_date:
-                    paid_days.append((latest_paid_date - invoice.date_created.date()).days)
-        else:
-            open_invoice_count += 1
-            open_invoice_amount += Decimal(remaining_cents) / Decimal(100)
-            if invoice.due_date and invoice.due_date < today:
-                past_due_amount += Decimal(remaining_cents) / Decimal(100)
+        open_query = open_query.filter(Invoice.sales_rep_id == scope_id)
+    open_invoice_count, open_remaining_cents = open_query.one()
+    _past_due_count, past_due_cents = open_query.filter(Invoice.due_date < today).one()
+    open_invoice_count = int(open_invoice_count or 0)
+    open_invoice_amount = cents_to_decimal(open_remaining_cents)
+    past_due_amount = cents_to_decimal(past_due_cents)
 
-    avg_days_to_pay = round(sum(paid_days) / len(paid_days), 2) if paid_days else 0
+    invoices_opened, _, _ = rollup_totals("invoices_opened", start_date, end_date, scope_id)
+    invoices_closed, _, days_to_pay_total = rollup_totals("invoices_closed", start_date, end_date, scope_id)
+    avg_days_to_pay = round(days_to_pay_total / invoices_closed, 2) if invoices_closed else 0
 
     # Pipeline stage counts and totals
-    pipeline_query = (
-        db.session.query(InvoicePipeline, Invoice)
-        .join(Invoice, Invoice.invoice_id == InvoicePipeline.invoice_id)
+    pipeline_query = stage_query(
+        Invoice.final_total,
+        InvoicePipeline.current_stage,
+        InvoicePipeline.payment_not_received_at,
+        InvoicePipeline.payment_issue_notified_at,
+        InvoicePipeline.payment_received_at,
     )
     if scope_id:
         pipeline_query = pipeline_query.filter(Invoice.sales_rep_id == scope_id)
-    if date_from or date_to:
+    if explicit_range:
         pipeline_query = pipeline_query.filter(Invoice.date_created >= start_dt, Invoice.date_created <= end_dt)
 
+    stage_today = datetime.utcnow().date()
     stage_counts = {}
     stage_amounts = {}
-    for pipeline, invoice in pipeline_query.all():
-        stage = _effective_stage(invoice, pipeline)
+    for row in pipeline_query.all():
+        stage = resolve_row_stage(row, stage_today)
         stage_counts[stage] = stage_counts.get(stage, 0) + 1
-        stage_amounts[stage] = stage_amounts.get(stage, Decimal("0")) + _to_decimal(invoice.final_total or 0)
+        stage_amounts[stage] = stage_amounts.get(stage, Decimal("0")) + _to_decimal(row.final_total or 0)
 
     pipeline_summary = [
         {
@@ -192,58 +141,49 @@ def analytics_overview():
         for stage in stage_counts
     ]
 
-    # Payment trend buckets
-    gran, labels = _build_buckets(start_date, end_date)
-    payments_trend = [0 for _ in labels]
-    payments_rows = (
-        db.session.query(Payment.date_paid, Payment.total_paid)
-        .filter(Payment.date_paid >= start_dt, Payment.date_paid <= end_dt)
+    # Payment and interaction trend buckets, summed per bucket in SQL
+    gran, labels = build_buckets(start_date, end_date)
+    bucket = bucket_index(AnalyticsDailyRollup.day, gran, start_date)
+    bucket_rows = (
+        rollup_query(("payments", "interactions"), start_date, end_date, scope_id)
+        .with_entities(
+            AnalyticsDailyRollup.metric,
+            bucket.label("bucket"),
+            func.sum(AnalyticsDailyRollup.count),
+            func.sum(AnalyticsDailyRollup.amount_cents),
+        )
+        .group_by(AnalyticsDailyRollup.metric, bucket)
+        .all()
     )
-    if scope_id:
-        payments_rows = payments_rows.filter(Payment.sales_rep_id == scope_id)
-    for paid_at, total_paid in payments_rows.all():
-        if not paid_at:
-            continue
-        idx = _bucket_index(gran, start_date, paid_at.date())
-        if 0 <= idx < len(payments_trend):
-            payments_trend[idx] += float(total_paid or 0)
+    payment_totals = {}
+    interaction_totals = {}
+    for metric, idx, count, amount_cents in bucket_rows:
+        if metric == "payments":
+            payment_totals[idx] = float(cents_to_decimal(amount_cents))
+        else:
+            interaction_totals[idx] = int(count or 0)
+    payments_trend = fill_buckets(labels, payment_totals)
+    interactions_trend = fill_buckets(labels, interaction_totals)
 
     payments_series = [
         {"label": label, "value": round(payments_trend[idx], 2)}
         for idx, label in enumerate(labels)
     ]
-
-    # Interactions trend + types
-    interactions_query = ContactInteractions.query.filter(
-        ContactInteractions.created_at >= start_dt,
-        ContactInteractions.created_at <= end_dt,
-    )
-    if scope_id:
-        interactions_query = interactions_query.filter(ContactInteractions.user_id == scope_id)
-
-    interactions_trend = [0 for _ in labels]
-    for interaction in interactions_query.all():
-        if not interaction.created_at:
-            continue
-        idx = _bucket_index(gran, start_date, interaction.created_at.date())
-        if 0 <= idx < len(interactions_trend):
-            interactions_trend[idx] += 1
-
     interactions_series = [
         {"label": label, "value": interactions_trend[idx]}
         for idx, label in enumerate(labels)
     ]
 
     interaction_types = (
-        db.session.query(ContactInteractions.interaction_type, func.count(ContactInteractions.interaction_id))
-        .filter(ContactInteractions.created_at >= start_dt, ContactInteractions.created_at <= end_dt)
+        rollup_query("interactions", start_date, end_date, scope_id)
+        .with_entities(AnalyticsDailyRollup.dimension, func.sum(AnalyticsDailyRollup.count))
+        .group_by(AnalyticsDailyRollup.dimension)
+        .all()
     )
-    if scope_id:
-        interaction_types = interaction_types.filter(ContactInteractions.user_id == scope_id)
-    interaction_types = interaction_types.group_by(ContactInteractions.interaction_type).all()
 
     interaction_types_series = [
-        {"type": interaction_type, "count": int(count)}
+        # Rollups store a missing type as "" (the dimension is part of the key).
+        {"type": interaction_type or None, "count": int(count)}
         for interaction_type, count in interaction_types
     ]
 
@@ -288,8 +228,9 @@ def analytics_overview():
     tasks_query = Tasks.query
     if scope_id:
         tasks_query = tasks_query.filter(Tasks.assigned_to == scope_id)
-    tasks_created = tasks_query.filter(Tasks.date_created >= start_dt, Tasks.date_created <= end_dt).count()
+    tasks_created, _, _ = rollup_totals("tasks_created", start_date, end_date, scope_id)
     tasks_completed = tasks_query.filter(Tasks.is_completed == True).count()
+    tasks_completed_in_range, _, _ = rollup_totals("tasks_completed", start_date, end_date, scope_id)
     tasks_overdue = tasks_query.filter(
         Tasks.is_completed == False,
         Tasks.due_date.isnot(None),
@@ -341,8 +282,13 @@ def analytics_overview():
         "tasks": {
             "created": tasks_created,
             "completed": tasks_completed,
+            "completed_in_range": tasks_completed_in_range,
             "overdue": tasks_overdue,
         },
+        "invoices": {
+            "opened": invoices_opened,
+            "closed": invoices_closed,
+        },
         "overdue_by_rep": overdue_by_rep,
         "bucket": gran,
         "date_range": {
@@ -350,5 +296,4 @@ def analytics_overview():
             "to": end_date.isoformat(),
         },
     }
-
-    return jsonify(response), 200
+    return response
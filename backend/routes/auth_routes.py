@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify, session
-from models import Users, Departments, UserRoles
+from models import Users
 from database import db
 from werkzeug.security import check_password_hash
+from session_profiles import get_session_profile
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -44,33 +45,11 @@ def get_session():
     if not user_id:
         return jsonify({"error": "Not logged in"}), 401
 
-    user = Users.query.get(user_id)
-    if not user:
+    profile = get_session_profile(user_id)
+    if profile is None:
         return jsonify({"error": "User not found"}), 404
 
-    # Fetch department and role
-    department = Departments.query.get(user.department_id)
-    role = UserRoles.query.get(user.role_id)
-
-    return jsonify({
-        "user_id": user.user_id,
-        "username": user.username,
-        "first_name": user.first_name,
-        "last_name": user.last_name,
-        "email": user.email,
-        "phone_number": user.phone_number,
-        "extension": user.extension,
-        "department_id": user.department_id,
-        "department_name": department.department_name if department else None,
-        "role_id": user.role_id,
-        "role_name": role.role_name if role else None,
-        "role_description": role.description if role else None,
-        "is_department_lead": role.is_lead if role else False,
-        "branch_id": user.branch_id,
-        "receives_commission": user.receives_commission,
-        "commission_rate": float(user.commission_rate) if user.commission_rate else None,
-        "salary": float(user.salary) if user.salary else None,
-    }), 200
+    return jsonify(profile), 200
 
     
 # Debugger 
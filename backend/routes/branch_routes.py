@@ -1,13 +1,14 @@
 from flask import Blueprint, jsonify, request
 from models import Branches
 from database import db
+from reference_cache import all_references, get_reference
 
 branch_bp = Blueprint("branches", __name__)
 
 # Get All Branches
 @branch_bp.route("/", methods=["GET"])
 def get_branches():
-    branches = Branches.query.all()
+    branches = all_references(Branches)
     return jsonify([
         {
             "branch_id": branch.branch_id,
@@ -24,7 +25,7 @@ def get_branches():
 #  Get Branch by ID
 @branch_bp.route("/<int:branch_id>", methods=["GET"])
 def get_branch_by_id(branch_id):
-    branch = Branches.query.get(branch_id)
+    branch = get_reference(Branches, branch_id)
     if not branch:
         return jsonify({"error": "Branch not found"}), 404
 
@@ -1,9 +1,22 @@
+from collections import defaultdict
 from flask import Blueprint, request, jsonify
-from models import CalendarEvent, Account, CalendarEventAttendee, Users
+from sqlalchemy import or_, select
+from sqlalchemy.orm import noload
+from models import CalendarEvent, Account, CalendarEventAttendee, CalendarEventException, Users
 from database import db
 from datetime import datetime
+from calendar_recurrence import (
+    MAX_WINDOW_DAYS,
+    OVERRIDE_FIELDS,
+    expand_events,
+    in_window,
+    normalize_rule,
+    occurrence_dates,
+    series_until,
+)
 from notifications import create_notification
 from audit import create_audit_log
+from reminder_schedule import CALENDAR_EVENT, schedule_event_reminders, unschedule
 
 calendar_bp = Blueprint("calendar", __name__)
 
@@ -19,24 +32,49 @@ def _parse_time(value):
     raise ValueError(f"Invalid time format: {value}")
 
 
-def _serialize_event(event, viewer_id=None):
-    attendees = CalendarEventAttendee.query.filter_by(event_id=event.event_id).all()
-    attendee_list = []
-    for attendee in attendees:
-        user = Users.query.get(attendee.user_id)
-        attendee_list.append({
-            "user_id": attendee.user_id,
-            "status": attendee.status,
-            "user_name": f"{user.first_name} {user.last_name}".strip() if user else None,
+def _parse_day(value):
+    return datetime.strptime(value, "%Y-%m-%d").date() if value else None
+
+
+def _attendees_by_event(event_ids):
+    """Attendees of every event in ``event_ids`` with their user names, in one query."""
+    attendees = defaultdict(list)
+    event_ids = list(event_ids)
+    if not event_ids:
+        return attendees
+    rows = (
+        db.session.query(
+            CalendarEventAttendee.event_id,
+            CalendarEventAttendee.user_id,
+            CalendarEventAttendee.status,
+            Users.first_name,
+            Users.last_name,
+        )
+        .outerjoin(Users, Users.user_id == CalendarEventAttendee.user_id)
+        .filter(CalendarEventAttendee.event_id.in_(event_ids))
+        .order_by(CalendarEventAttendee.event_id, CalendarEventAttendee.created_at)
+    )
+    for row in rows:
+        has_user = row.first_name is not None or row.last_name is not None
+        attendees[row.event_id].append({
+            "user_id": row.user_id,
+            "status": row.status,
+            "user_name": f"{row.first_name or ''} {row.last_name or ''}".strip() if has_user else None,
         })
+    return attendees
+
+
+def _serialize_event(event, viewer_id=None, attendee_list=None):
+    if attendee_list is None:
+        attendee_list = _attendees_by_event([event.event_id]).get(event.event_id, [])
 
     viewer_status = None
     if viewer_id:
         if event.user_id == viewer_id:
             viewer_status = "owner"
         else:
-            match = next((a for a in attendees if a.user_id == viewer_id), None)
-            viewer_status = match.status if match else None
+            match = next((a for a in attendee_list if a["user_id"] == viewer_id), None)
+            viewer_status = match["status"] if match else None
 
     return {
         "event_id": event.event_id,
@@ -54,22 +92,60 @@ def _serialize_event(event, viewer_id=None):
         "user_id": event.user_id,
         "attendees": attendee_list,
         "viewer_status": viewer_status,
+        "recurrence_rule": event.recurrence_rule,
+        "occurrence_date": event.occurrence_date.strftime("%Y-%m-%d") if getattr(event, "occurrence_date", None) else None,
+        "is_override": getattr(event, "is_override", False),
     }
 
 
+def _set_recurrence(event, rule):
+    """Store ``rule`` (normalized) on ``event`` with the end date of its last occurrence."""
+    event.recurrence_rule = normalize_rule(rule)
+    event.recurrence_until = None
+    if event.recurrence_rule:
+        last_start = series_until(event.recurrence_rule, event.start_date)
+        if last_start:
+            event.recurrence_until = last_start + (event.end_date - event.start_date)
+
+
+def _visible_to(user_ids):
+    """Events owned by, or attended by, any of ``user_ids`` (no join, so no DISTINCT needed)."""
+    attended = select(CalendarEventAttendee.event_id).where(CalendarEventAttendee.user_id.in_(user_ids))
+    return or_(CalendarEvent.user_id.in_(user_ids), CalendarEvent.event_id.in_(attended))
+
+
 # READ
 @calendar_bp.route("/events", methods=["GET"])
 def get_calendar_events():
+    """
+    Events for one user (``user_id``), a team (``user_ids=1,2,3``) or everyone (``all=true``).
+
+    ``start``/``end`` (YYYY-MM-DD, inclusive) limit the result to events
+    overlapping that window. Attendees are loaded for all returned events in
+    one extra query, so a month view costs two queries however many events it
+    shows.
+
+    With both ``start`` and ``end``, recurring series are expanded into their
+    occurrences in the window (one more query for exceptions). Otherwise each
+    series is returned once, as its first occurrence with ``recurrence_rule``.
+    """
     user_id = request.args.get("user_id", type=int)
     user_ids_param = request.args.get("user_ids")
     include_all = request.args.get("all", "false").lower() == "true"
-        
-    if not user_id:
-        user_id = request.args.get("user_id", type=int) 
+
     if not user_id and not user_ids_param and not include_all:
         return jsonify({"message": "User ID is required"}), 400
 
-    query = CalendarEvent.query
+    try:
+        window_start = _parse_day(request.args.get("start"))
+        window_end = _parse_day(request.args.get("end"))
+    except ValueError:
+        return jsonify({"message": "start and end must be YYYY-MM-DD"}), 400
+    if window_start and window_end and (window_end - window_start).days > MAX_WINDOW_DAYS:
+        return jsonify({"message": f"Date range is limited to {MAX_WINDOW_DAYS} days"}), 400
+
+    # Attendees are hydrated in bulk below; skip the relationship's joined eager load.
+    query = CalendarEvent.query.options(noload(CalendarEvent.attendees))
     viewer_id = None
     if user_ids_param:
         try:
@@ -77,29 +153,26 @@ def get_calendar_events():
         except ValueError:
             return jsonify({"message": "Invalid user_ids"}), 400
         if user_ids:
-            query = query.outerjoin(
-                CalendarEventAttendee,
-                CalendarEventAttendee.event_id == CalendarEvent.event_id,
-            ).filter(
-                (CalendarEvent.user_id.in_(user_ids))
-                | (CalendarEventAttendee.user_id.in_(user_ids))
-            ).distinct()
+            query = query.filter(_visible_to(user_ids))
     elif user_id:
         viewer_id = user_id
-        query = query.outerjoin(
-            CalendarEventAttendee,
-            CalendarEventAttendee.event_id == CalendarEvent.event_id,
-        ).filter(
-            (CalendarEvent.user_id == user_id)
-            | (CalendarEventAttendee.user_id == user_id)
-        ).distinct()
+        query = query.filter(_visible_to([user_id]))
+
+    if window_start or window_end:
+        query = query.filter(in_window(window_start, window_end))
 
-    events = query.all()
+    events = query.order_by(CalendarEvent.start_date, CalendarEvent.start_time, CalendarEvent.event_id).all()
+    if window_start and window_end:
+        events = expand_events(events, window_start, window_end)
 
     if not events:
         return jsonify([])
 
-    return jsonify([_serialize_event(event, viewer_id) for event in events])
+    attendees = _attendees_by_event(event.event_id for event in events)
+    return jsonify([
+        _serialize_event(event, viewer_id, attendees.get(event.event_id, []))
+        for event in events
+    ])
 
 #  Create a New Calendar Event
 @calendar_bp.route("/events", methods=["POST"])
@@ -140,6 +213,7 @@ def create_calendar_event():
             contact_name=data.get("contact_name"),
             phone_number=data.get("phone_number"),
         )
+        _set_recurrence(new_event, data.get("recurrence_rule"))
 
         db.session.add(new_event)
         db.session.flush()
@@ -151,6 +225,7 @@ def create_calendar_event():
         invitee_ids = [val for val in invitee_ids if val != user_id]
 
         if invitee_ids:
+            creator = Users.query.get(user_id)
             for invitee_id in invitee_ids:
                 db.session.add(
                     CalendarEventAttendee(
@@ -159,8 +234,6 @@ def create_calendar_event():
                         status="pending",
                     )
                 )
-                invitee = Users.query.get(invitee_id)
-                creator = Users.query.get(user_id)
                 create_notification(
                     user_id=invitee_id,
                     notif_type="event_invite",
@@ -198,10 +271,12 @@ def create_calendar_event():
                 "reminder_minutes": new_event.reminder_minutes,
                 "account_id": new_event.account_id,
                 "user_id": new_event.user_id,
+                "recurrence_rule": new_event.recurrence_rule,
                 "invitee_ids": invitee_ids,
             },
             account_id=new_event.account_id,
         )
+        schedule_event_reminders([new_event])
         db.session.commit()
         return jsonify(_serialize_event(new_event, viewer_id=user_id)), 201
 
@@ -234,10 +309,16 @@ def update_calendar_event(event_id):
         "reminder_minutes": event.reminder_minutes,
         "account_id": event.account_id,
         "user_id": event.user_id,
+        "recurrence_rule": event.recurrence_rule,
     }
 
     print(f"📝 Received data: {data}")
 
+    try:
+        recurrence_rule = normalize_rule(data["recurrence_rule"]) if "recurrence_rule" in data else event.recurrence_rule
+    except ValueError as e:
+        return jsonify({"error": f"Invalid recurrence rule: {str(e)}"}), 400
+
     try:
         # Update event fields safely
         event.event_title = data.get("event_title", event.event_title)
@@ -255,6 +336,8 @@ def update_calendar_event(event_id):
             event.reminder_minutes = int(reminder_minutes) if reminder_minutes not in (None, "") else None
         event.contact_name = data.get("contact_name", event.contact_name)
         event.phone_number = data.get("phone_number", event.phone_number)
+        # Recomputed whenever the dates move, not only when the rule changes.
+        _set_recurrence(event, recurrence_rule)
         if "invitee_ids" in data:
             invitee_ids = data.get("invitee_ids") or []
             try:
@@ -272,6 +355,7 @@ def update_calendar_event(event_id):
                     CalendarEventAttendee.event_id == event.event_id,
                     CalendarEventAttendee.user_id.in_(list(to_remove)),
                 ).delete(synchronize_session=False)
+            creator = Users.query.get(event.user_id) if to_add else None
             for invitee_id in to_add:
                 db.session.add(
                     CalendarEventAttendee(
@@ -280,8 +364,6 @@ def update_calendar_event(event_id):
                         status="pending",
                     )
                 )
-                invitee = Users.query.get(invitee_id)
-                creator = Users.query.get(event.user_id)
                 create_notification(
                     user_id=invitee_id,
                     notif_type="event_invite",
@@ -331,9 +413,11 @@ def update_calendar_event(event_id):
                 "reminder_minutes": event.reminder_minutes,
                 "account_id": event.account_id,
                 "user_id": event.user_id,
+                "recurrence_rule": event.recurrence_rule,
             },
             account_id=event.account_id,
         )
+        schedule_event_reminders([event])
         db.session.commit()
         print(f"✅ Event {event_id} successfully updated in database")
         return jsonify({"message": "Event updated successfully"}), 200
@@ -367,6 +451,7 @@ def delete_calendar_event(event_id):
     }
 
     db.session.delete(event)
+    unschedule(CALENDAR_EVENT, [event_id])
     create_audit_log(
         entity_type="calendar_event",
         entity_id=event_id,
@@ -426,3 +511,99 @@ def rsvp_calendar_event(event_id):
 
     db.session.commit()
     return jsonify({"message": "RSVP updated", "status": status}), 200
+
+
+def _series_occurrence(event_id, occurrence_day):
+    """The series and the validated occurrence date, or an error response."""
+    event = CalendarEvent.query.get(event_id)
+    if not event:
+        return None, None, (jsonify({"error": "Event not found"}), 404)
+    if not event.recurrence_rule:
+        return None, None, (jsonify({"error": "Event does not repeat"}), 400)
+    try:
+        occurrence_date = _parse_day(occurrence_day)
+    except ValueError:
+        return None, None, (jsonify({"error": "Occurrence date must be YYYY-MM-DD"}), 400)
+    if not occurrence_dates(event.recurrence_rule, event.start_date, occurrence_date, occurrence_date):
+        return None, None, (jsonify({"error": "No occurrence on that date"}), 404)
+    return event, occurrence_date, None
+
+
+# Edit (or restore) one occurrence of a recurring event
+@calendar_bp.route("/events/<int:event_id>/occurrences/<occurrence_day>", methods=["PUT"])
+def update_event_occurrence(event_id, occurrence_day):
+    event, occurrence_date, error = _series_occurrence(event_id, occurrence_day)
+    if error:
+        return error
+    data = request.json or {}
+
+    exception = CalendarEventException.query.get((event_id, occurrence_date))
+    if exception is None:
+        exception = CalendarEventException(event_id=event_id, occurrence_date=occurrence_date)
+        db.session.add(exception)
+
+    try:
+        for field in OVERRIDE_FIELDS:
+            if field in data:
+                value = data.get(field)
+                if field in ("start_time", "end_time"):
+                    value = _parse_time(value)
+                setattr(exception, field, value or None)
+        if "start_date" in data:
+            exception.start_date = _parse_day(data.get("start_date"))
+        if "end_date" in data:
+            exception.end_date = _parse_day(data.get("end_date"))
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": f"Invalid data format: {str(e)}"}), 400
+    exception.is_cancelled = bool(data.get("is_cancelled", False))
+
+    create_audit_log(
+        entity_type="calendar_event",
+        entity_id=event.event_id,
+        action="update_occurrence",
+        user_id=data.get("actor_user_id") or event.user_id,
+        user_email=data.get("actor_email"),
+        after_data={
+            "event_id": event.event_id,
+            "occurrence_date": occurrence_date.strftime("%Y-%m-%d"),
+            "is_cancelled": exception.is_cancelled,
+            "changes": {key: data[key] for key in (*OVERRIDE_FIELDS, "start_date", "end_date") if key in data},
+        },
+        account_id=event.account_id,
+    )
+    db.session.flush()
+    schedule_event_reminders([event])
+    db.session.commit()
+    return jsonify({"message": "Occurrence updated"}), 200
+
+
+# Cancel one occurrence of a recurring event
+@calendar_bp.route("/events/<int:event_id>/occurrences/<occurrence_day>", methods=["DELETE"])
+def cancel_event_occurrence(event_id, occurrence_day):
+    event, occurrence_date, error = _series_occurrence(event_id, occurrence_day)
+    if error:
+        return error
+
+    exception = CalendarEventException.query.get((event_id, occurrence_date))
+    if exception is None:
+        exception = CalendarEventException(event_id=event_id, occurrence_date=occurrence_date)
+        db.session.add(exception)
+    exception.is_cancelled = True
+
+    create_audit_log(
+        entity_type="calendar_event",
+        entity_id=event.event_id,
+        action="cancel_occurrence",
+        user_id=request.args.get("actor_user_id", type=int) or event.user_id,
+        user_email=request.args.get("actor_email"),
+        after_data={
+            "event_id": event.event_id,
+            "occurrence_date": occurrence_date.strftime("%Y-%m-%d"),
+        },
+        account_id=event.account_id,
+    )
+    db.session.flush()
+    schedule_event_reminders([event])
+    db.session.commit()
+    return jsonify({"message": "Occurrence cancelled"}), 200
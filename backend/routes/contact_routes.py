@@ -1,10 +1,15 @@
 from flask import Blueprint, jsonify, request
-from sqlalchemy import or_, func
+from sqlalchemy import or_
 from datetime import datetime, timedelta
-from models import Contact, Account, AccountContacts, ContactFollowers, ContactInteractions, Tasks, Users
+from models import Contact, Account, AccountContacts, ContactFollowers, ContactInteractions, Tasks
 from database import db
 from audit import create_audit_log
+from analytics_rollups import refresh_rollups, rollup_keys
+from notification_fanout import notify_contact_followers
 from notifications import create_notification
+from contact_search import apply_contact_search, refresh_contact_search
+from pagination import SortKey, page_payload, page_request, paginate
+from serializers import contact_load_options, serialize_contact
 
 contact_bp = Blueprint("contacts", __name__)
 
@@ -19,61 +24,6 @@ def _split_contact_name(name):
     return parts[0], " ".join(parts[1:])
 
 
-def _serialize_contact(contact, include_accounts=False):
-    owner = Users.query.get(contact.contact_owner_user_id) if contact.contact_owner_user_id else None
-    payload = {
-        "contact_id": contact.contact_id,
-        "first_name": contact.first_name,
-        "last_name": contact.last_name,
-        "title": contact.title,
-        "phone": contact.phone,
-        "email": contact.email,
-        "status": contact.status,
-        "do_not_call": contact.do_not_call,
-        "do_not_call_date": contact.do_not_call_date.isoformat() if contact.do_not_call_date else None,
-        "email_opt_out": contact.email_opt_out,
-        "email_opt_out_date": contact.email_opt_out_date.isoformat() if contact.email_opt_out_date else None,
-        "contact_owner_user_id": contact.contact_owner_user_id,
-        "contact_owner_name": f"{owner.first_name} {owner.last_name}".strip() if owner else None,
-        "created_at": contact.created_at.isoformat() if contact.created_at else None,
-        "updated_at": contact.updated_at.isoformat() if contact.updated_at else None,
-    }
-
-    if include_accounts:
-        payload["accounts"] = [
-            {
-                "account_id": account.account_id,
-                "business_name": account.business_name,
-                "phone_number": account.phone_number,
-                "email": account.email,
-                "address": account.address,
-                "city": account.city,
-                "state": account.state,
-                "zip_code": account.zip_code,
-                "sales_rep_id": account.sales_rep_id,
-            }
-            for account in contact.accounts
-        ]
-
-    return payload
-
-
-def _notify_contact_followers(contact_id, actor_user_id, title, message, link):
-    follower_rows = ContactFollowers.query.filter_by(contact_id=contact_id).all()
-    for row in follower_rows:
-        if actor_user_id and row.user_id == actor_user_id:
-            continue
-        create_notification(
-            user_id=row.user_id,
-            notif_type="contact_activity",
-            title=title,
-            message=message,
-            link=link,
-            source_type="contact",
-            source_id=contact_id,
-        )
-
-
 def _serialize_interaction(interaction):
     return {
         "interaction_id": interaction.interaction_id,
@@ -107,7 +57,7 @@ def _backfill_contacts_from_accounts(actor_user_id=None, actor_email=None):
         account_query = account_query.filter(~Account.account_id.in_(existing_links))
 
     accounts = account_query.all()
-    created = 0
+    created_ids = []
 
     for account in accounts:
         first_name = account.contact_first_name
@@ -146,11 +96,12 @@ def _backfill_contacts_from_accounts(actor_user_id=None, actor_email=None):
             contact_id=contact.contact_id,
         )
 
-        created += 1
+        created_ids.append(contact.contact_id)
 
-    if created:
+    if created_ids:
+        refresh_contact_search(created_ids)
         db.session.commit()
-    return created
+    return len(created_ids)
 
 
 @contact_bp.route("", methods=["GET"])
@@ -165,7 +116,7 @@ def get_contacts():
         if Contact.query.count() == 0:
             _backfill_contacts_from_accounts()
 
-    query = Contact.query
+    query = Contact.query.options(*contact_load_options(include_accounts=True))
 
     if status:
         query = query.filter(Contact.status == status)
@@ -177,33 +128,42 @@ def get_contacts():
         query = query.join(AccountContacts).filter(AccountContacts.account_id == account_id)
 
     if search:
-        like = f"%{search}%"
-        query = (
-            query.outerjoin(AccountContacts)
-            .outerjoin(Account, Account.account_id == AccountContacts.account_id)
-            .outerjoin(Users, Users.user_id == Contact.contact_owner_user_id)
-            .filter(
-                or_(
-                    func.lower(Contact.first_name).like(like),
-                    func.lower(Contact.last_name).like(like),
-                    func.lower(Contact.title).like(like),
-                    func.lower(Contact.email).like(like),
-                    func.lower(Contact.phone).like(like),
-                    func.lower(Account.business_name).like(like),
-                    func.lower(Account.address).like(like),
-                    func.lower(Account.city).like(like),
-                    func.lower(Account.state).like(like),
-                    func.lower(Account.email).like(like),
-                    func.lower(Account.phone_number).like(like),
-                    func.lower(Users.first_name).like(like),
-                    func.lower(Users.last_name).like(like),
-                )
+        query, rank = apply_contact_search(query, search)
+        query = query.add_columns(rank.label("search_rank"))
+        page = page_request()
+        if page:
+            page = paginate(
+                query,
+                [SortKey(rank, descending=True), SortKey(Contact.contact_id)],
+                lambda row: (row.search_rank, row.Contact.contact_id),
+                page,
             )
-            .distinct()
+            return jsonify(page_payload(page, [serialize_contact(row.Contact, include_accounts=True) for row in page.rows])), 200
+
+        rows = query.order_by(
+            rank.desc(),
+            Contact.last_name.asc().nullslast(),
+            Contact.first_name.asc().nullslast(),
+            Contact.contact_id.asc(),
+        ).all()
+        return jsonify([serialize_contact(row.Contact, include_accounts=True) for row in rows]), 200
+
+    page = page_request()
+    if page:
+        page = paginate(
+            query,
+            [
+                SortKey(Contact.last_name, nullable=True),
+                SortKey(Contact.first_name, nullable=True),
+                SortKey(Contact.contact_id),
+            ],
+            lambda contact: (contact.last_name, contact.first_name, contact.contact_id),
+            page,
         )
+        return jsonify(page_payload(page, [serialize_contact(contact, include_accounts=True) for contact in page.rows])), 200
 
     contacts = query.order_by(Contact.last_name.asc().nullslast(), Contact.first_name.asc().nullslast()).all()
-    return jsonify([_serialize_contact(contact, include_accounts=True) for contact in contacts]), 200
+    return jsonify([serialize_contact(contact, include_accounts=True) for contact in contacts]), 200
 
 
 @contact_bp.route("/backfill", methods=["POST"])
@@ -228,7 +188,7 @@ def get_contact(contact_id):
     tasks = Tasks.query.filter_by(contact_id=contact_id).order_by(Tasks.date_created.desc()).all()
 
     return jsonify({
-        **_serialize_contact(contact, include_accounts=True),
+        **serialize_contact(contact, include_accounts=True),
         "is_following": is_following,
         "interactions": [
             {
@@ -320,9 +280,10 @@ def create_contact():
         contact_id=contact.contact_id,
     )
 
+    refresh_contact_search([contact.contact_id])
     db.session.commit()
 
-    return jsonify(_serialize_contact(contact, include_accounts=True)), 201
+    return jsonify(serialize_contact(contact, include_accounts=True)), 201
 
 
 @contact_bp.route("/<int:contact_id>", methods=["PUT"])
@@ -387,17 +348,18 @@ def update_contact(contact_id):
         contact_id=contact.contact_id,
     )
 
-    db.session.commit()
+    refresh_contact_search([contact.contact_id])
 
-    _notify_contact_followers(
+    notify_contact_followers(
         contact.contact_id,
         actor_user_id,
         "Contact updated",
         f"{contact.first_name or ''} {contact.last_name or ''}".strip() or "Contact",
         f"/contacts/{contact.contact_id}",
     )
+    db.session.commit()
 
-    return jsonify(_serialize_contact(contact, include_accounts=True)), 200
+    return jsonify(serialize_contact(contact, include_accounts=True)), 200
 
 
 @contact_bp.route("/<int:contact_id>/accounts", methods=["PUT"])
@@ -432,17 +394,18 @@ def update_contact_accounts(contact_id):
         contact_id=contact.contact_id,
     )
 
-    db.session.commit()
+    refresh_contact_search([contact.contact_id])
 
-    _notify_contact_followers(
+    notify_contact_followers(
         contact.contact_id,
         actor_user_id,
         "Contact accounts updated",
         f"Updated accounts for {contact.first_name or ''} {contact.last_name or ''}".strip(),
         f"/contacts/{contact.contact_id}",
     )
+    db.session.commit()
 
-    return jsonify(_serialize_contact(contact, include_accounts=True)), 200
+    return jsonify(serialize_contact(contact, include_accounts=True)), 200
 
 
 @contact_bp.route("/<int:contact_id>/primary", methods=["POST"])
@@ -483,6 +446,7 @@ def set_primary_contact(contact_id):
         contact_id=contact.contact_id,
     )
 
+    refresh_contact_search([contact.contact_id])
     db.session.commit()
 
     return jsonify({"primary_contact_id": contact.contact_id}), 200
@@ -598,15 +562,16 @@ def create_contact_interaction(contact_id):
         account_id=interaction.account_id,
     )
 
-    db.session.commit()
+    refresh_rollups(rollup_keys(interaction))
 
-    _notify_contact_followers(
+    notify_contact_followers(
         contact_id,
         actor_user_id,
         "Contact interaction logged",
         interaction.subject or interaction.interaction_type,
         f"/contacts/{contact_id}",
     )
+    db.session.commit()
 
     return jsonify(_serialize_interaction(interaction)), 201
 
@@ -624,6 +589,7 @@ def update_contact_interaction(contact_id, interaction_id):
     actor_email = data.get("actor_email")
 
     before_data = _serialize_interaction(interaction)
+    rollup_before = rollup_keys(interaction)
 
     if "interaction_type" in data:
         interaction.interaction_type = data.get("interaction_type")
@@ -650,15 +616,16 @@ def update_contact_interaction(contact_id, interaction_id):
         account_id=interaction.account_id,
     )
 
-    db.session.commit()
+    refresh_rollups(rollup_before | rollup_keys(interaction))
 
-    _notify_contact_followers(
+    notify_contact_followers(
         contact_id,
         actor_user_id,
         "Contact interaction updated",
         interaction.subject or interaction.interaction_type,
         f"/contacts/{contact_id}",
     )
+    db.session.commit()
 
     return jsonify(_serialize_interaction(interaction)), 200
 
@@ -676,6 +643,7 @@ def delete_contact_interaction(contact_id, interaction_id):
     actor_email = data.get("actor_email") or request.args.get("actor_email")
 
     before_data = _serialize_interaction(interaction)
+    rollup_before = rollup_keys(interaction)
     db.session.delete(interaction)
 
     create_audit_log(
@@ -690,14 +658,15 @@ def delete_contact_interaction(contact_id, interaction_id):
         account_id=before_data.get("account_id"),
     )
 
-    db.session.commit()
+    refresh_rollups(rollup_before)
 
-    _notify_contact_followers(
+    notify_contact_followers(
         contact_id,
         actor_user_id,
         "Contact interaction deleted",
         before_data.get("subject") or before_data.get("interaction_type"),
         f"/contacts/{contact_id}",
     )
+    db.session.commit()
 
     return jsonify({"message": "Interaction deleted"}), 200
@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify, request
 from models import Departments
 from database import db
+from reference_cache import all_references
 
 department_bp = Blueprint("departments", __name__)
 
@@ -8,7 +9,7 @@ department_bp = Blueprint("departments", __name__)
 @department_bp.route("/", methods=["GET"])
 def get_departments():
     """ Fetch all departments (No filtering by branch_id)"""
-    departments = Departments.query.all()
+    departments = all_references(Departments)
     
     return jsonify([{
         "department_id": dept.department_id,
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from models import Industry
 from database import db
+from reference_cache import all_references, invalidate_reference
 
 # Create Blueprint
 industry_bp = Blueprint("industries", __name__)
@@ -9,7 +10,7 @@ industry_bp = Blueprint("industries", __name__)
 @industry_bp.route("/", methods=["GET"])
 def get_industries():
     """Fetch all industries"""
-    industries = Industry.query.all()
+    industries = all_references(Industry)
     return jsonify([{
         "industry_id": industry.industry_id,
         "industry_name": industry.industry_name
@@ -28,6 +29,7 @@ def add_industry():
     new_industry = Industry(industry_name=industry_name)
     db.session.add(new_industry)
     db.session.commit()
+    invalidate_reference(Industry)
 
     return jsonify({
         "message": "Industry added successfully",
@@ -51,5 +53,6 @@ def update_industry(industry_id):
 
     industry.industry_name = new_name
     db.session.commit()
+    invalidate_reference(Industry)
 
     return jsonify({"message": "Industry updated successfully"}), 200
@@ -1,13 +1,21 @@
 from flask import Blueprint, request, jsonify
-from models import Invoice, Account, PaymentMethods, InvoiceServices, Service, Payment, Commissions, Users, TaxRates, AccountContacts, Contact, InvoicePipeline, InvoicePipelineHistory, InvoicePipelineFollower
+from models import Invoice, Account, PaymentMethods, InvoiceServices, Payment, Commissions, Users, TaxRates, InvoicePipeline, InvoicePipelineHistory, InvoiceBalance
 from database import db
+from event_stream import publish_pipeline_history
 from datetime import datetime
 import pytz
 from pytz import timezone
 from decimal import Decimal, ROUND_HALF_UP
 from sqlalchemy.sql import func
+from notification_fanout import notify_pipeline_followers
 from notifications import create_notification
 from audit import create_audit_log
+from analytics_rollups import refresh_rollups, rollup_keys
+from invoice_balances import invoice_status, refresh_invoice_balance
+from invoice_details import load_invoice_detail
+from pipeline_stages import record_pipeline_history
+from reference_cache import all_references, get_reference, invalidate_reference
+from pagination import SortKey, page_payload, page_request, paginate
 
 
 invoice_bp = Blueprint("invoice", __name__, url_prefix="/invoices")
@@ -55,39 +63,6 @@ def _serialize_invoice(invoice):
     }
 
 
-def _notify_pipeline_followers(invoice, account, stage, actor_user_id=None, action_required=False):
-    followers = InvoicePipelineFollower.query.filter_by(invoice_id=invoice.invoice_id).all()
-    if not followers:
-        return
-    stage_labels = {
-        "contact_customer": "Contact customer",
-        "order_placed": "Order placed",
-        "payment_not_received": "Payment not received",
-        "payment_received": "Payment received",
-        "order_packaged": "Order packaged",
-        "order_shipped": "Order shipped",
-        "order_delivered": "Order delivered",
-    }
-    step_label = stage_labels.get(stage, stage)
-    title = f"Pipeline update: {step_label}"
-    message = f"{account.business_name} • Invoice #{invoice.invoice_id} • {step_label}"
-    if action_required:
-        message = f"{message} • Action required"
-    for follower in followers:
-        if actor_user_id and follower.user_id == actor_user_id:
-            continue
-        create_notification(
-            user_id=follower.user_id,
-            notif_type="pipeline_update",
-            title=title,
-            message=message,
-            link=f"/pipelines/invoice/{invoice.invoice_id}",
-            account_id=invoice.account_id,
-            invoice_id=invoice.invoice_id,
-            source_type="invoice_pipeline",
-            source_id=invoice.invoice_id,
-        )
-
 # Update Invoice Status (Pending to Paid, Past Due, etc.)
 @invoice_bp.route("/invoices/<int:invoice_id>/update_status", methods=["PUT"])
 def update_invoice_status(invoice_id):
@@ -125,63 +100,64 @@ def update_invoice_status(invoice_id):
 
 
 def get_tax_rate(zip_code):
-    from models import TaxRates
-    tax = TaxRates.query.filter_by(zip_code=zip_code).first()
+    tax = get_reference(TaxRates, zip_code)
     return float(tax.rate) if tax else 0.0
 
 # Invoices (PLURAL) API
 @invoice_bp.route("/", methods=["GET"])
 def get_invoices():
     sales_rep_id = request.args.get("sales_rep_id", type=int)
-    invoices = Invoice.query.filter_by(sales_rep_id=sales_rep_id).all() if sales_rep_id else Invoice.query.all()
+    query = db.session.query(Invoice, InvoiceBalance).outerjoin(
+        InvoiceBalance, InvoiceBalance.invoice_id == Invoice.invoice_id
+    )
+    if sales_rep_id:
+        query = query.filter(Invoice.sales_rep_id == sales_rep_id)
+
+    page = page_request()
+    if page:
+        page = paginate(
+            query,
+            [SortKey(Invoice.invoice_id, descending=True)],
+            lambda row: (row.Invoice.invoice_id,),
+            page,
+        )
+        rows = page.rows
+    else:
+        rows = query.all()
 
-    return jsonify([
+    invoice_list = [
         {
             "invoice_id": inv.invoice_id,
             "account_id": inv.account_id,
             "final_total": float(inv.final_total or 0),
-            "status": get_invoice_status(inv),
+            "status": get_invoice_status(inv, balance),
             "sales_rep_id": inv.sales_rep_id,
             "due_date": inv.due_date.strftime('%Y-%m-%d') if inv.due_date else None
-        } for inv in invoices
-    ]), 200
+        } for inv, balance in rows
+    ]
+    if page:
+        return jsonify(page_payload(page, invoice_list)), 200
+    return jsonify(invoice_list), 200
 
 # Fetch Invoice by ID (Include Services)
 @invoice_bp.route("/invoice/<int:invoice_id>", methods=["GET"])
 def get_invoice_by_id(invoice_id):
     try:
-        invoice = Invoice.query.get_or_404(invoice_id)
+        detail = load_invoice_detail(invoice_id)
+        if detail is None:
+            return jsonify({"error": "Invoice not found"}), 404
+
+        header = detail.header
+        invoice = header.Invoice
+        account = header.Account
+        sales_rep = header.sales_rep
+        payments = [row.Payment for row in detail.payments]
 
         # Payments and dynamic status
-        payments = Payment.query.filter_by(invoice_id=invoice.invoice_id).all()
         paid_total_decimal = sum((Decimal(str(p.total_paid or 0)) for p in payments), Decimal("0"))
-        today = datetime.now(central).date()
-        due = invoice.due_date if invoice.due_date else None
-        final_total = invoice.final_total or 0
-
-        paid_cents = _to_cents(paid_total_decimal)
-        final_cents = _to_cents(final_total)
-        if final_cents <= 0 or paid_cents >= final_cents:
-            current_status = "Paid"
-        elif paid_total_decimal == 0:
-            current_status = "Past Due" if due and today > due else "Pending"
-        elif due and today > due:
-            current_status = "Past Due"
-        else:
-            current_status = "Partial"
-
-        account = Account.query.get(invoice.account_id)
-        sales_rep = Users.query.get(invoice.sales_rep_id)
-        commission = db.session.query(func.sum(Commissions.commission_amount)).filter(Commissions.invoice_id == invoice_id).scalar()
-        tax_rate = get_tax_rate(account.zip_code)
-        # user = Users.query.filter_by(username=p.logged_by).first()
-
-        services = (
-            db.session.query(InvoiceServices, Service)
-            .join(Service, InvoiceServices.service_id == Service.service_id)
-            .filter(InvoiceServices.invoice_id == invoice_id)
-            .all()
-        )
+        current_status = get_invoice_status(invoice, header.InvoiceBalance)
+        commission = header.commission_total
+        tax_rate = float(header.tax_rate) if header.tax_rate is not None else 0.0
 
         service_list = [
             {
@@ -191,40 +167,31 @@ def get_invoice_by_id(invoice_id):
                 "price_per_unit": float(i.price_per_unit),
                 "total_price": float(i.total_price)
             }
-            for i, s in services
+            for i, s in detail.services
         ]
 
         payment_list = []
-        for p in payments:
-            user = Users.query.filter_by(username=p.logged_by).first()
+        for row in detail.payments:
+            p = row.Payment
             payment_list.append({
                 "payment_id": p.payment_id,
                 "payment_method": p.payment_method,
-                "method_name": PaymentMethods.query.get(p.payment_method).method_name if p.payment_method else None,
+                "method_name": row.method_name if p.payment_method else None,
                 "logged_by": p.logged_by,
-                "logged_by_username": user.username if user else None,
-                "logged_by_first_name": user.first_name if user else None,
-                "logged_by_last_name": user.last_name if user else None,
+                "logged_by_username": row.logged_by_username,
+                "logged_by_first_name": row.logged_by_first_name,
+                "logged_by_last_name": row.logged_by_last_name,
                 "last_four_payment_method": p.last_four_payment_method,
                 "total_paid": float(p.total_paid),
                 "date_paid": p.date_paid.strftime("%Y-%m-%d %H:%M:%S")
             })
 
-        
-
-
-        primary_contact_id = None
+        primary_contact_id = header.primary_contact_id
         primary_contact_name = None
-        if account:
-            primary_link = AccountContacts.query.filter_by(account_id=account.account_id).order_by(
-                AccountContacts.is_primary.desc(),
-                AccountContacts.created_at.asc(),
-            ).first()
-            if primary_link:
-                contact = Contact.query.get(primary_link.contact_id)
-                if contact:
-                    primary_contact_id = contact.contact_id
-                    primary_contact_name = f"{contact.first_name or ''} {contact.last_name or ''}".strip() or None
+        if primary_contact_id:
+            primary_contact_name = (
+                f"{header.primary_contact_first_name or ''} {header.primary_contact_last_name or ''}".strip() or None
+            )
 
         return jsonify({
             "invoice_id": invoice.invoice_id,
@@ -273,12 +240,16 @@ def get_invoice_by_id(invoice_id):
         return jsonify({"error": "Failed to fetch invoice", "details": str(e)}), 500
 
 # Helper: Determine Invoice Status
-def get_invoice_status(invoice):
+def get_invoice_status(invoice, balance=None):
+    today = datetime.now(central).date()
+    due = invoice.due_date if invoice.due_date else None
+    balance = balance or invoice.balance
+    if balance:
+        return invoice_status(balance, due, today)
+
     payments = Payment.query.filter_by(invoice_id=invoice.invoice_id).all()
     paid_total = sum((Decimal(str(p.total_paid or 0)) for p in payments), Decimal("0"))
     final_total = invoice.final_total or 0
-    today = datetime.now(central).date()
-    due = invoice.due_date if invoice.due_date else None
 
     paid_cents = _to_cents(paid_total)
     final_cents = _to_cents(final_total)
@@ -417,6 +388,7 @@ def update_invoice(invoice_id):
     data = request.get_json()
     invoice = Invoice.query.get_or_404(invoice_id)
     before_data = _serialize_invoice(invoice)
+    rollup_before = rollup_keys(invoice)
 
     invoice.tax_rate = data.get("tax_rate", invoice.tax_rate)
     invoice.discount_percent = data.get("discount_percent", invoice.discount_percent)
@@ -487,17 +459,14 @@ def update_invoice(invoice_id):
     invoice.tax_amount = tax_amount
     invoice.final_total = final_total
 
-    # Recalculate status using payment records
-    payments = Payment.query.filter_by(invoice_id=invoice.invoice_id).all()
-    paid_total = sum((Decimal(str(p.total_paid)) for p in payments), Decimal("0"))
+    # Recalculate status using the stored balance
+    balance = refresh_invoice_balance(invoice)
     today = datetime.now(central).date()
     due = invoice.due_date if invoice.due_date else None
 
-    paid_cents = _to_cents(paid_total)
-    final_cents = _to_cents(final_total)
-    if final_cents <= 0 or paid_cents >= final_cents:
+    if balance.paid_in_full:
         invoice.status = "Paid"
-    elif paid_total == 0:
+    elif not balance.paid_cents:
         invoice.status = "Pending"
     elif due and today > due:
         invoice.status = "Past Due"
@@ -524,6 +493,7 @@ def update_invoice(invoice_id):
         account_id=invoice.account_id,
         invoice_id=invoice.invoice_id,
     )
+    refresh_rollups(rollup_before | rollup_keys(invoice))
     db.session.commit()
     return jsonify({
         "message": "Invoice updated successfully",
@@ -555,6 +525,7 @@ def delete_invoice(invoice_id):
         return jsonify({"error": "Invoice not found"}), 404
 
     before_data = _serialize_invoice(invoice)
+    rollup_before = rollup_keys(invoice, *invoice.payments)
     db.session.delete(invoice)
     create_audit_log(
         entity_type="invoice",
@@ -567,6 +538,7 @@ def delete_invoice(invoice_id):
         account_id=invoice.account_id,
         invoice_id=invoice_id,
     )
+    refresh_rollups(rollup_before)
     db.session.commit()
     return jsonify({"message": "Invoice deleted successfully"}), 200
 
@@ -605,13 +577,15 @@ def create_invoice():
     db.session.flush()
 
     actor_user_id = data.get("actor_user_id") or data.get("created_by") or data.get("user_id") or new_invoice.sales_rep_id
-    db.session.add(InvoicePipelineHistory(
-        invoice_id=new_invoice.invoice_id,
-        stage="order_placed",
-        action="status_change",
-        note="Order placed",
-        actor_user_id=actor_user_id,
-    ))
+    history = {
+        "invoice_id": new_invoice.invoice_id,
+        "stage": "order_placed",
+        "action": "status_change",
+        "note": "Order placed",
+        "actor_user_id": actor_user_id,
+    }
+    db.session.add(InvoicePipelineHistory(**history))
+    publish_pipeline_history([dict(history, created_at=datetime.now())])
 
     # Totals we’ll calculate from services
     subtotal = Decimal("0.00")
@@ -653,6 +627,7 @@ def create_invoice():
     new_invoice.discount_amount = round(invoice_discount_amount, 2)
     new_invoice.final_total = round(final_total, 2)
     new_invoice.status = status
+    refresh_invoice_balance(new_invoice)
 
     create_notification(
         user_id=new_invoice.sales_rep_id,
@@ -673,6 +648,7 @@ def create_invoice():
         account_id=new_invoice.account_id,
         invoice_id=new_invoice.invoice_id,
     )
+    refresh_rollups(rollup_keys(new_invoice))
     db.session.commit()
 
     return jsonify({"success": True, "invoice_id": new_invoice.invoice_id}), 201
@@ -682,7 +658,7 @@ def create_invoice():
 # Get Payment Methods
 @invoice_bp.route("/payment_methods", methods=["GET"])
 def get_payment_methods():
-    methods = PaymentMethods.query.all()
+    methods = all_references(PaymentMethods)
     result = [
         {"method_id": method.method_id, "method_name": method.method_name}
         for method in methods
@@ -706,6 +682,7 @@ def create_payment_method():
     new_method = PaymentMethods(method_name=method_name)
     db.session.add(new_method)
     db.session.commit()
+    invalidate_reference(PaymentMethods)
 
     return jsonify({
         "message": f"Payment method '{method_name}' added successfully.",
@@ -771,22 +748,17 @@ def log_payment(invoice_id):
         invoice = Invoice.query.get(invoice_id)
         account = Account.query.get(invoice.account_id) if invoice else None
         before_invoice = _serialize_invoice(invoice) if invoice else None
-        payments = Payment.query.filter_by(invoice_id=invoice_id).all()
-
-        # Convert all total_paid to Decimal before summing
-        total_paid = sum((Decimal(str(p.total_paid)) for p in payments), Decimal("0"))
-        final_total = Decimal(str(invoice.final_total or 0))
+        rollup_before = rollup_keys(invoice)
+        balance = refresh_invoice_balance(invoice)
 
         today = datetime.now(central).date()
         due = invoice.due_date if invoice.due_date else None
 
-        paid_cents = _to_cents(total_paid)
-        final_cents = _to_cents(final_total)
-        paid_in_full = final_cents <= 0 or paid_cents >= final_cents
+        paid_in_full = balance.paid_in_full
 
         if paid_in_full:
             invoice.status = "Paid"
-        elif total_paid == 0:
+        elif not balance.paid_cents:
             invoice.status = "Pending"
         elif due and today > due:
             invoice.status = "Past Due"
@@ -801,24 +773,24 @@ def log_payment(invoice_id):
                     pipeline.current_stage = "payment_received"
                 pipeline.payment_received_at = payment_timestamp
                 pipeline.updated_at = datetime.now(central)
-                db.session.add(InvoicePipelineHistory(
+                record_pipeline_history(
                     invoice_id=invoice_id,
                     stage="payment_received",
                     action="status_change",
                     note="Payment received",
                     actor_user_id=actor_user_id,
-                ))
-                db.session.add(InvoicePipelineHistory(
+                )
+                record_pipeline_history(
                     invoice_id=invoice_id,
                     stage="payment_received",
                     action="email",
                     note="Email sent to contact: payment received update.",
                     actor_user_id=actor_user_id,
-                ))
+                )
                 if account:
-                    _notify_pipeline_followers(
+                    notify_pipeline_followers(
                         invoice,
-                        account,
+                        account.business_name,
                         "payment_received",
                         actor_user_id=actor_user_id,
                     )
@@ -832,17 +804,17 @@ def log_payment(invoice_id):
                 )
                 db.session.add(pipeline)
                 db.session.flush()
-                db.session.add(InvoicePipelineHistory(
+                record_pipeline_history(
                     invoice_id=invoice_id,
                     stage="payment_received",
                     action="status_change",
                     note="Payment received",
                     actor_user_id=actor_user_id,
-                ))
+                )
                 if account:
-                    _notify_pipeline_followers(
+                    notify_pipeline_followers(
                         invoice,
-                        account,
+                        account.business_name,
                         "payment_received",
                         actor_user_id=actor_user_id,
                     )
@@ -886,6 +858,7 @@ def log_payment(invoice_id):
                 invoice_id=invoice.invoice_id,
             )
 
+        refresh_rollups(rollup_before | rollup_keys(invoice, payment))
         db.session.commit()
 
         user = Users.query.filter_by(username=payment.logged_by).first()
@@ -0,0 +1,33 @@
+from flask import Blueprint, jsonify, session
+
+from instrumentation import route_metrics
+from models import Users
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+def _is_admin_session():
+    user_id = session.get("user_id")
+    if not user_id:
+        return False
+    user = Users.query.get(user_id)
+    return bool(user and user.role and "admin" in user.role.role_name.lower())
+
+
+@metrics_bp.route("/routes", methods=["GET"])
+def get_route_metrics():
+    """Rolling per-route latency, SQL count and response size (admins only)."""
+    if not _is_admin_session():
+        return jsonify({"error": "Admin access required"}), 403
+    return jsonify({
+        "window": route_metrics.window,
+        "routes": route_metrics.snapshot(),
+    }), 200
+
+
+@metrics_bp.route("/routes", methods=["DELETE"])
+def reset_route_metrics():
+    if not _is_admin_session():
+        return jsonify({"error": "Admin access required"}), 403
+    route_metrics.reset()
+    return jsonify({"message": "Route metrics reset"}), 200
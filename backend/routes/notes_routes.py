@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from models import Notes, Users, TaskNotes, Tasks
 from database import db
 from audit import create_audit_log
+from pagination import SortKey, page_payload, page_request, paginate
 
 notes_bp = Blueprint("note", __name__)
 
@@ -12,24 +13,30 @@ notes_bp = Blueprint("note", __name__)
 def get_notes():
     account_id = request.args.get("account_id")
 
+    query = Notes.query
     if account_id:
-        notes = Notes.query.filter_by(account_id=account_id).all()
-    else:
-        notes = Notes.query.all()
+        query = query.filter_by(account_id=account_id)
 
-    if not notes:
-        return jsonify([])  #  Ensure empty list instead of error
+    page = page_request()
+    if page:
+        page = paginate(query, [SortKey(Notes.note_id, descending=True)], lambda note: (note.note_id,), page)
+        notes = page.rows
+    else:
+        notes = query.all()
 
-    return jsonify([
+    note_list = [
         {
             "id": note.note_id,
             "account_id": note.account_id,
             "invoice_id": note.invoice_id,
             "note_text": note.note_text,
-            "completed": note.completed,
-            "date_created": note.date_created.strftime('%Y-%m-%d %H:%M:%S')
+            "completed": getattr(note, "completed", False),
+            "date_created": note.date_created.strftime('%Y-%m-%d %H:%M:%S') if note.date_created else None
         } for note in notes
-    ])
+    ]
+    if page:
+        return jsonify(page_payload(page, note_list))
+    return jsonify(note_list)
 
 #Create Notes API
 @notes_bp.route("/", methods=["POST"])
@@ -1,52 +1,40 @@
-from flask import Blueprint, jsonify, request
-from datetime import datetime, timedelta
-from models import Notifications, CalendarEvent
+from flask import Blueprint, Response, jsonify, make_response, request
+from models import Notifications
 from database import db
+from event_stream import TooManyStreams, hub, stream
+from notification_counters import counter_state, mark_all_read as mark_all_notifications_read, mark_read
 from notifications import create_notification
 
 notification_bp = Blueprint("notifications", __name__)
 
 
-def _event_start_datetime(event):
-    start_time = event.start_time
-    try:
-        time_part = start_time.time()
-    except AttributeError:
-        time_part = start_time
-    return datetime.combine(event.start_date, time_part)
-
-
-def _generate_event_reminders(user_id):
-    now = datetime.now()
-    events = CalendarEvent.query.filter_by(user_id=user_id).all()
-    for event in events:
-        if event.reminder_minutes is None:
-            continue
-        try:
-            event_start = _event_start_datetime(event)
-        except Exception:
-            continue
-
-        reminder_time = event_start - timedelta(minutes=event.reminder_minutes)
-        if reminder_time <= now <= event_start:
-            exists = Notifications.query.filter_by(
-                user_id=user_id,
-                type="event_reminder",
-                source_type="calendar_event",
-                source_id=event.event_id,
-            ).first()
-            if not exists:
-                create_notification(
-                    user_id=user_id,
-                    notif_type="event_reminder",
-                    title=f"Upcoming event: {event.event_title}",
-                    message=f"Starts at {event_start.strftime('%I:%M %p').lstrip('0')}",
-                    link=f"/calendar?date={event.start_date.strftime('%Y-%m-%d')}",
-                    source_type="calendar_event",
-                    source_id=event.event_id,
-                    event_time=event_start,
-                )
-    db.session.commit()
+FEED_LIMIT = 50
+FEED_MAX_LIMIT = 200
+
+
+def _serialize_notification(n, read_through_id=0):
+    return {
+        "notification_id": n.notification_id,
+        "user_id": n.user_id,
+        "type": n.type,
+        "title": n.title,
+        "message": n.message,
+        "link": n.link,
+        "account_id": n.account_id,
+        "invoice_id": n.invoice_id,
+        # Rows under the mark-all-read watermark are read even before the outbox flips is_read.
+        "is_read": bool(n.is_read) or n.notification_id <= read_through_id,
+        "created_at": n.created_at.strftime("%Y-%m-%d %H:%M:%S") if n.created_at else None,
+        "event_time": n.event_time.strftime("%Y-%m-%d %H:%M:%S") if n.event_time else None,
+        "source_type": n.source_type,
+        "source_id": n.source_id,
+    }
+
+
+def _not_modified(etag):
+    response = make_response("", 304)
+    response.set_etag(etag, weak=True)
+    return response
 
 
 @notification_bp.route("", methods=["GET"])
@@ -59,31 +47,101 @@ def get_notifications():
     if not user_id:
         return jsonify({"error": "User ID is required"}), 400
 
-    _generate_event_reminders(user_id)
-
+    counter = counter_state(user_id)
     query = Notifications.query.filter_by(user_id=user_id)
     if unread_only:
-        query = query.filter_by(is_read=False)
+        query = query.filter(
+            Notifications.is_read == False,
+            Notifications.notification_id > counter.read_through_id,
+        )
 
     notifications = query.order_by(Notifications.created_at.desc()).limit(limit).all()
-    return jsonify([
-        {
-            "notification_id": n.notification_id,
-            "user_id": n.user_id,
-            "type": n.type,
-            "title": n.title,
-            "message": n.message,
-            "link": n.link,
-            "account_id": n.account_id,
-            "invoice_id": n.invoice_id,
-            "is_read": n.is_read,
-            "created_at": n.created_at.strftime("%Y-%m-%d %H:%M:%S") if n.created_at else None,
-            "event_time": n.event_time.strftime("%Y-%m-%d %H:%M:%S") if n.event_time else None,
-            "source_type": n.source_type,
-            "source_id": n.source_id,
-        }
-        for n in notifications
-    ]), 200
+    return jsonify([_serialize_notification(n, counter.read_through_id) for n in notifications]), 200
+
+
+@notification_bp.route("/unread_count", methods=["GET"])
+def get_unread_count():
+    """The user's unread count from their counter row; 304 while ``If-None-Match`` is current."""
+    user_id = request.args.get("user_id", type=int)
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    counter = counter_state(user_id)
+    etag = f"{user_id}-{counter.version}"
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+    response = jsonify({"unread_count": counter.unread_count, "version": counter.version})
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@notification_bp.route("/feed", methods=["GET"])
+def get_notification_feed():
+    """
+    Polling endpoint: unread count plus the newest notifications.
+
+    Answers 304 without touching ``notifications`` when ``If-None-Match``
+    carries the current counter version. Without an ETag, ``since`` and
+    ``version`` (the ``latest_id`` and ``version`` of the previous response)
+    get a 304 from one indexed probe when nothing newer exists and the
+    counter hasn't moved; a changed counter answers 200 with the new count.
+    Items are newest first, ``limit`` at a time (default 50, at most 200).
+    """
+    user_id = request.args.get("user_id", type=int)
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+    since = request.args.get("since", type=int)
+    version = request.args.get("version", type=int)
+    limit = min(request.args.get("limit", type=int) or FEED_LIMIT, FEED_MAX_LIMIT)
+
+    counter = counter_state(user_id)
+    etag = f"{user_id}-{counter.version}-{since or 0}-{limit}"
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+
+    query = Notifications.query.filter(Notifications.user_id == user_id)
+    if since:
+        query = query.filter(Notifications.notification_id > since)
+    notifications = query.order_by(Notifications.notification_id.desc()).limit(limit).all()
+    if since and not notifications and not request.if_none_match and version == counter.version:
+        return _not_modified(etag)
+
+    response = jsonify({
+        "unread_count": counter.unread_count,
+        "version": counter.version,
+        "latest_id": notifications[0].notification_id if notifications else since,
+        "items": [_serialize_notification(n, counter.read_through_id) for n in notifications],
+    })
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@notification_bp.route("/stream", methods=["GET"])
+def notification_stream():
+    """
+    Server-sent events for the user: a ``sync`` event with the unread count,
+    then ``notification`` and ``pipeline`` events as changes commit, and
+    ``resync`` when the client fell too far behind and should reload the feed.
+    """
+    user_id = request.args.get("user_id", type=int)
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    counter = counter_state(user_id)
+    greeting = {"unread_count": counter.unread_count, "version": counter.version}
+    # The stream can stay open for minutes; don't hold a pooled connection for it.
+    db.session.remove()
+    try:
+        subscription = hub.subscribe(user_id)
+    except TooManyStreams:
+        return jsonify({"error": "Too many open streams for this user"}), 429
+
+    response = Response(stream(subscription, greeting), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 
 @notification_bp.route("", methods=["POST"])
@@ -118,7 +176,7 @@ def mark_notification_read(notification_id):
     if not notification:
         return jsonify({"error": "Notification not found"}), 404
 
-    notification.is_read = True
+    mark_read(notification)
     db.session.commit()
     return jsonify({"message": "Notification marked as read"}), 200
 
@@ -129,6 +187,6 @@ def mark_all_read():
     if not user_id:
         return jsonify({"error": "User ID is required"}), 400
 
-    Notifications.query.filter_by(user_id=user_id, is_read=False).update({"is_read": True})
+    mark_all_notifications_read(user_id)
     db.session.commit()
     return jsonify({"message": "All notifications marked as read"}), 200
@@ -1,51 +1,123 @@
-from flask import Blueprint, request, jsonify
+import csv
+import io
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from database import db
 from models import Payment, Users, Account, Invoice, PaymentMethods
 from datetime import datetime
 from audit import create_audit_log
+from analytics_rollups import refresh_rollups, rollup_keys
+from invoice_balances import refresh_invoice_balance
+from pagination import SortKey, page_payload, page_request, paginate
 
 payment_bp = Blueprint("payment", __name__, url_prefix="/payment")
 
-# List payments (admin/overview)
-@payment_bp.route("", methods=["GET"])
-@payment_bp.route("/", methods=["GET"])
-def get_payments():
+CSV_EXPORT_BATCH_SIZE = 1000
+PAYMENT_CSV_COLUMNS = [
+    "payment_id",
+    "date_paid",
+    "invoice_id",
+    "invoice_status",
+    "account_id",
+    "account_name",
+    "sales_rep_id",
+    "logged_by",
+    "payment_method",
+    "payment_method_name",
+    "last_four_payment_method",
+    "total_paid",
+]
+
+def _payment_listing_query():
+    """Payments with account name, invoice status and method name joined in, filtered by the request args."""
     account_id = request.args.get("account_id", type=int)
     invoice_id = request.args.get("invoice_id", type=int)
     sales_rep_id = request.args.get("sales_rep_id", type=int)
-    limit = request.args.get("limit", type=int) or 200
 
-    query = Payment.query
+    query = (
+        db.session.query(
+            Payment,
+            Account.business_name.label("account_name"),
+            Invoice.status.label("invoice_status"),
+            PaymentMethods.method_name.label("payment_method_name"),
+        )
+        .outerjoin(Account, Account.account_id == Payment.account_id)
+        .outerjoin(Invoice, Invoice.invoice_id == Payment.invoice_id)
+        .outerjoin(PaymentMethods, PaymentMethods.method_id == Payment.payment_method)
+    )
     if account_id:
         query = query.filter(Payment.account_id == account_id)
     if invoice_id:
         query = query.filter(Payment.invoice_id == invoice_id)
     if sales_rep_id:
         query = query.filter(Payment.sales_rep_id == sales_rep_id)
+    return query
+
+
+def _serialize_payment_row(row):
+    payment = row.Payment
+    return {
+        "payment_id": payment.payment_id,
+        "invoice_id": payment.invoice_id,
+        "account_id": payment.account_id,
+        "account_name": row.account_name,
+        "invoice_status": row.invoice_status,
+        "sales_rep_id": payment.sales_rep_id,
+        "logged_by": payment.logged_by,
+        "payment_method": payment.payment_method,
+        "payment_method_name": row.payment_method_name,
+        "last_four_payment_method": payment.last_four_payment_method,
+        "total_paid": float(payment.total_paid or 0),
+        "date_paid": payment.date_paid.isoformat() if payment.date_paid else None,
+    }
 
-    payments = query.order_by(Payment.date_paid.desc()).limit(limit).all()
 
-    results = []
-    for payment in payments:
-        account = Account.query.get(payment.account_id) if payment.account_id else None
-        invoice = Invoice.query.get(payment.invoice_id) if payment.invoice_id else None
-        method = PaymentMethods.query.get(payment.payment_method) if payment.payment_method else None
-        results.append({
-            "payment_id": payment.payment_id,
-            "invoice_id": payment.invoice_id,
-            "account_id": payment.account_id,
-            "account_name": account.business_name if account else None,
-            "invoice_status": invoice.status if invoice else None,
-            "sales_rep_id": payment.sales_rep_id,
-            "logged_by": payment.logged_by,
-            "payment_method": payment.payment_method,
-            "payment_method_name": method.method_name if method else None,
-            "last_four_payment_method": payment.last_four_payment_method,
-            "total_paid": float(payment.total_paid or 0),
-            "date_paid": payment.date_paid.isoformat() if payment.date_paid else None,
-        })
+# List payments (admin/overview)
+@payment_bp.route("", methods=["GET"])
+@payment_bp.route("/", methods=["GET"])
+def get_payments():
+    query = _payment_listing_query()
+
+    # ``limit`` predates paging and still caps the plain array; pages are sized by ``page_size``.
+    page = page_request(limit_param="page_size")
+    if page:
+        page = paginate(
+            query,
+            [SortKey(Payment.date_paid, descending=True), SortKey(Payment.payment_id, descending=True)],
+            lambda row: (row.Payment.date_paid, row.Payment.payment_id),
+            page,
+        )
+        return jsonify(page_payload(page, [_serialize_payment_row(row) for row in page.rows])), 200
 
-    return jsonify(results), 200
+    limit = request.args.get("limit", type=int) or 200
+    rows = query.order_by(Payment.date_paid.desc(), Payment.payment_id.desc()).limit(limit).all()
+    return jsonify([_serialize_payment_row(row) for row in rows]), 200
+
+
+# Export the payment ledger as CSV (streamed, same filters as the listing)
+@payment_bp.route("/export.csv", methods=["GET"])
+def export_payments_csv():
+    query = _payment_listing_query().order_by(Payment.date_paid.desc(), Payment.payment_id.desc())
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(PAYMENT_CSV_COLUMNS)
+        for row in query.yield_per(CSV_EXPORT_BATCH_SIZE):
+            item = _serialize_payment_row(row)
+            writer.writerow([item[column] for column in PAYMENT_CSV_COLUMNS])
+            if buffer.tell() >= 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        yield buffer.getvalue()
+
+    filename = f"payments_{datetime.now().strftime('%Y%m%d')}.csv"
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
 
 # Update a payment
 @payment_bp.route("/<int:payment_id>", methods=["PUT"])
@@ -65,6 +137,7 @@ def update_payment(payment_id):
             "total_paid": float(payment.total_paid or 0),
             "date_paid": payment.date_paid.isoformat() if payment.date_paid else None,
         }
+        rollup_before = rollup_keys(payment, payment.invoice)
         payment.payment_method = data.get("payment_method", payment.payment_method)
         payment.last_four_payment_method = data.get("last_four_payment_method", payment.last_four_payment_method)
         payment.total_paid = float(data.get("total_paid", payment.total_paid))
@@ -82,6 +155,8 @@ def update_payment(payment_id):
                     return jsonify({"error": f"Invalid date format: {date_str}"}), 400
 
         payment.logged_by = data.get("logged_by", payment.logged_by)
+        refresh_invoice_balance(payment.invoice)
+        refresh_rollups(rollup_before | rollup_keys(payment, payment.invoice))
 
         create_audit_log(
             entity_type="payment",
@@ -140,7 +215,11 @@ def delete_payment(payment_id):
             "total_paid": float(payment.total_paid or 0),
             "date_paid": payment.date_paid.isoformat() if payment.date_paid else None,
         }
+        invoice = payment.invoice
+        rollup_before = rollup_keys(payment, invoice)
         db.session.delete(payment)
+        refresh_invoice_balance(invoice)
+        refresh_rollups(rollup_before | rollup_keys(invoice))
         create_audit_log(
             entity_type="payment",
             entity_id=payment.payment_id,
@@ -1,11 +1,13 @@
 from datetime import datetime, timedelta
 from decimal import Decimal, ROUND_HALF_UP
+from urllib.parse import urlencode
 
 from flask import Blueprint, jsonify, request
-from sqlalchemy import func
 
 from audit import create_audit_log
+from cache import PIPELINES_TAG, cache
 from database import db
+from event_stream import publish_pipeline_history
 from models import (
     Account,
     AccountContacts,
@@ -13,14 +15,18 @@ from models import (
     Invoice,
     InvoicePipeline,
     InvoicePipelineHistory,
-    Payment,
     InvoicePipelineFollower,
     Users,
 )
+from notification_fanout import notify_pipeline_followers
 from notifications import create_notification
+from pagination import SortKey, page_payload, page_request, paginate
+from pipeline_stages import STAGE_LABELS, invoice_payment_stats, record_pipeline_history, resolve_row_stage, resolve_stage, stage_query
 
 pipeline_bp = Blueprint("pipelines", __name__)
 
+SUMMARY_CACHE_TTL = 60
+
 PIPELINE_STAGES = [
     "contact_customer",
     "order_placed",
@@ -31,17 +37,6 @@ PIPELINE_STAGES = [
     "order_delivered",
 ]
 
-STAGE_LABELS = {
-    "contact_customer": "Contact customer",
-    "order_placed": "Order placed",
-    "payment_not_received": "Payment not received",
-    "payment_received": "Payment received",
-    "order_packaged": "Order packaged",
-    "order_shipped": "Order shipped",
-    "order_delivered": "Order delivered",
-}
-
-
 def _to_decimal(value):
     try:
         return Decimal(str(value))
@@ -103,81 +98,21 @@ def _serialize_pipeline(pipeline):
 
 
 def _payment_stats(invoice_id):
-    total_paid = db.session.query(func.coalesce(func.sum(Payment.total_paid), 0)).filter(
-        Payment.invoice_id == invoice_id
-    ).scalar() or 0
-    latest_payment = db.session.query(func.max(Payment.date_paid)).filter(
-        Payment.invoice_id == invoice_id
-    ).scalar()
-    return _to_decimal(total_paid), latest_payment
-
-
-def _effective_stage(invoice, pipeline):
-    total_paid, latest_payment = _payment_stats(invoice.invoice_id)
-    final_total = _to_decimal(invoice.final_total or 0)
-    paid_cents = _to_cents(total_paid)
-    final_cents = _to_cents(final_total)
-    paid_in_full = final_cents <= 0 or paid_cents >= final_cents
-
-    if not paid_in_full:
-        if pipeline.current_stage == "payment_not_received" or pipeline.payment_not_received_at or pipeline.payment_issue_notified_at:
-            return "payment_not_received"
-        if pipeline.current_stage in ("contact_customer", "order_placed"):
-            return pipeline.current_stage
-        return "order_placed"
-
-    payment_date = pipeline.payment_received_at or latest_payment
-    if not payment_date:
-        return pipeline.current_stage or "payment_received"
-
-    days_since = (datetime.utcnow().date() - payment_date.date()).days
-    if days_since >= 3:
-        computed = "order_delivered"
-    elif days_since >= 2:
-        computed = "order_shipped"
-    elif days_since >= 1:
-        computed = "order_packaged"
-    else:
-        computed = "payment_received"
-
-    stage_order = {
-        "contact_customer": 0,
-        "order_placed": 1,
-        "payment_not_received": 2,
-        "payment_received": 3,
-        "order_packaged": 4,
-        "order_shipped": 5,
-        "order_delivered": 6,
-    }
-    current = pipeline.current_stage or computed
-    if stage_order.get(current, 0) > stage_order.get(computed, 0):
-        return current
-    return computed
-
-
-def _notify_pipeline_followers(invoice, account, stage, actor_user_id=None, action_required=False):
-    followers = InvoicePipelineFollower.query.filter_by(invoice_id=invoice.invoice_id).all()
-    if not followers:
-        return
-    step_label = STAGE_LABELS.get(stage, stage)
-    title = f"Pipeline update: {step_label}"
-    message = f"{account.business_name} • Invoice #{invoice.invoice_id} • {step_label}"
-    if action_required:
-        message = f"{message} • Action required"
-    for follower in followers:
-        if actor_user_id and follower.user_id == actor_user_id:
-            continue
-        create_notification(
-            user_id=follower.user_id,
-            notif_type="pipeline_update",
-            title=title,
-            message=message,
-            link=f"/pipelines/invoice/{invoice.invoice_id}",
-            account_id=invoice.account_id,
-            invoice_id=invoice.invoice_id,
-            source_type="invoice_pipeline",
-            source_id=invoice.invoice_id,
-        )
+    return invoice_payment_stats(invoice_id)
+
+
+def _effective_stage(invoice, pipeline, total_paid=None, latest_payment=None):
+    if total_paid is None:
+        total_paid, latest_payment = _payment_stats(invoice.invoice_id)
+    return resolve_stage(
+        pipeline.current_stage,
+        invoice.final_total,
+        total_paid,
+        latest_payment,
+        payment_not_received_at=pipeline.payment_not_received_at,
+        payment_issue_notified_at=pipeline.payment_issue_notified_at,
+        payment_received_at=pipeline.payment_received_at,
+    )
 
 
 def _get_primary_contact(account_id):
@@ -193,6 +128,22 @@ def _get_primary_contact(account_id):
     return None
 
 
+def _primary_contacts_by_account(account_ids):
+    if not account_ids:
+        return {}
+    links = (
+        db.session.query(AccountContacts.account_id, Contact)
+        .join(Contact, Contact.contact_id == AccountContacts.contact_id)
+        .filter(AccountContacts.account_id.in_(list(account_ids)), AccountContacts.is_primary == True)
+        .order_by(AccountContacts.created_at.desc())
+        .all()
+    )
+    contacts = {}
+    for account_id, contact in links:
+        contacts.setdefault(account_id, contact)
+    return contacts
+
+
 def _ensure_pipeline(invoice):
     pipeline = InvoicePipeline.query.get(invoice.invoice_id)
     if pipeline:
@@ -225,8 +176,7 @@ def _suggested_dates(start_date, payment_date=None):
     return suggested
 
 
-@pipeline_bp.route("/summary", methods=["GET"])
-def pipeline_summary():
+def _apply_pipeline_filters(query):
     user_id = request.args.get("user_id", type=int)
     sales_rep_id = request.args.get("sales_rep_id", type=int)
     account_id = request.args.get("account_id", type=int)
@@ -235,11 +185,6 @@ def pipeline_summary():
     date_from = request.args.get("date_from")
     date_to = request.args.get("date_to")
     date_field = request.args.get("date_field", "created")
-    query = (
-        db.session.query(InvoicePipeline, Invoice, Account)
-        .join(Invoice, Invoice.invoice_id == InvoicePipeline.invoice_id)
-        .join(Account, Account.account_id == Invoice.account_id)
-    )
     if user_id:
         query = query.filter(Invoice.sales_rep_id == user_id)
     if sales_rep_id:
@@ -258,65 +203,83 @@ def pipeline_summary():
             query = query.filter(field >= start_dt)
         if end_dt:
             query = query.filter(field < (end_dt + timedelta(days=1)))
+    return query
 
-    stage_counts = {}
-    stage_accounts = {}
-    for pipeline, invoice, _account in query.all():
-        stage = _effective_stage(invoice, pipeline)
-        stage_counts[stage] = stage_counts.get(stage, 0) + 1
-        stage_accounts.setdefault(stage, set()).add(invoice.account_id)
 
-    return jsonify([
-        {
-            "stage": stage,
-            "invoice_count": int(stage_counts.get(stage, 0)),
-            "account_count": len(stage_accounts.get(stage, set())),
-        }
-        for stage in stage_counts
-    ]), 200
+@pipeline_bp.route("/summary", methods=["GET"])
+def pipeline_summary():
+    query = stage_query(
+        Invoice.account_id,
+        Invoice.final_total,
+        InvoicePipeline.current_stage,
+        InvoicePipeline.payment_not_received_at,
+        InvoicePipeline.payment_issue_notified_at,
+        InvoicePipeline.payment_received_at,
+    ).join(Account, Account.account_id == Invoice.account_id)
+    query = _apply_pipeline_filters(query)
+
+    today = datetime.utcnow().date()
+
+    def build_summary():
+        stage_counts = {}
+        stage_accounts = {}
+        for row in query.all():
+            stage = resolve_row_stage(row, today)
+            stage_counts[stage] = stage_counts.get(stage, 0) + 1
+            stage_accounts.setdefault(stage, set()).add(row.account_id)
+        return [
+            {
+                "stage": stage,
+                "invoice_count": int(stage_counts.get(stage, 0)),
+                "account_count": len(stage_accounts.get(stage, set())),
+            }
+            for stage in stage_counts
+        ]
+
+    filters = urlencode(sorted(request.args.items(multi=True)))
+    summary = cache.cached(
+        f"pipelines:summary:{today}:{filters}",
+        build_summary,
+        ttl=SUMMARY_CACHE_TTL,
+        tags=(PIPELINES_TAG,),
+    )
+    return jsonify(summary), 200
 
 
 @pipeline_bp.route("", methods=["GET"])
 def pipeline_list():
     stage = request.args.get("stage")
-    user_id = request.args.get("user_id", type=int)
-    sales_rep_id = request.args.get("sales_rep_id", type=int)
-    account_id = request.args.get("account_id", type=int)
-    invoice_id = request.args.get("invoice_id", type=int)
-    account_search = request.args.get("account_search")
-    date_from = request.args.get("date_from")
-    date_to = request.args.get("date_to")
-    date_field = request.args.get("date_field", "created")
-    query = (
-        db.session.query(InvoicePipeline, Invoice, Account)
-        .join(Invoice, Invoice.invoice_id == InvoicePipeline.invoice_id)
-        .join(Account, Account.account_id == Invoice.account_id)
+    query = stage_query(InvoicePipeline, Invoice, Account).join(
+        Account, Account.account_id == Invoice.account_id
     )
-    if user_id:
-        query = query.filter(Invoice.sales_rep_id == user_id)
-    if sales_rep_id:
-        query = query.filter(Invoice.sales_rep_id == sales_rep_id)
-    if account_id:
-        query = query.filter(Invoice.account_id == account_id)
-    if invoice_id:
-        query = query.filter(Invoice.invoice_id == invoice_id)
-    if account_search:
-        query = query.filter(Account.business_name.ilike(f"%{account_search}%"))
-    if date_from or date_to:
-        field = Invoice.date_created if date_field == "created" else InvoicePipeline.updated_at
-        start_dt = _parse_date(date_from) if date_from else None
-        end_dt = _parse_date(date_to) if date_to else None
-        if start_dt:
-            query = query.filter(field >= start_dt)
-        if end_dt:
-            query = query.filter(field < (end_dt + timedelta(days=1)))
+    query = _apply_pipeline_filters(query)
+
+    today = datetime.utcnow().date()
+    page = page_request()
+    if page:
+        page = paginate(
+            query,
+            [SortKey(Invoice.date_created, descending=True, nullable=True), SortKey(Invoice.invoice_id, descending=True)],
+            lambda row: (row.Invoice.date_created, row.Invoice.invoice_id),
+            page,
+            row_filter=(lambda row: resolve_row_stage(row, today) == stage) if stage else None,
+        )
+        rows = page.rows
+    else:
+        # Same order as the pages, so a client sees one list either way.
+        rows = query.order_by(Invoice.date_created.desc().nullslast(), Invoice.invoice_id.desc()).all()
 
-    results = []
-    for pipeline, invoice, account in query.order_by(Invoice.date_created.desc()).all():
-        effective_stage = _effective_stage(invoice, pipeline)
+    matches = []
+    for row in rows:
+        effective_stage = resolve_row_stage(row, today)
         if stage and effective_stage != stage:
             continue
-        contact = _get_primary_contact(account.account_id)
+        matches.append((row.InvoicePipeline, row.Invoice, row.Account, effective_stage))
+
+    contacts = _primary_contacts_by_account({account.account_id for _p, _i, account, _s in matches})
+    results = []
+    for pipeline, invoice, account, effective_stage in matches:
+        contact = contacts.get(account.account_id)
         results.append({
             "invoice_id": invoice.invoice_id,
             "account_id": account.account_id,
@@ -332,6 +295,8 @@ def pipeline_list():
             "sales_rep_id": invoice.sales_rep_id,
         })
 
+    if page:
+        return jsonify(page_payload(page, results)), 200
     return jsonify(results), 200
 
 
@@ -463,21 +428,21 @@ def update_pipeline_status(invoice_id):
         if prior_field and getattr(pipeline, prior_field) is None:
             setattr(pipeline, prior_field, now)
 
-    db.session.add(InvoicePipelineHistory(
+    record_pipeline_history(
         invoice_id=invoice_id,
         stage=stage,
         action="status_change",
         note=note or STAGE_LABELS.get(stage, stage),
         actor_user_id=actor_user_id,
-    ))
+    )
 
-    db.session.add(InvoicePipelineHistory(
+    record_pipeline_history(
         invoice_id=invoice_id,
         stage=stage,
         action="email",
         note=f"Email sent to contact: {STAGE_LABELS.get(stage, stage)} update.",
         actor_user_id=actor_user_id,
-    ))
+    )
 
     create_audit_log(
         entity_type="invoice_pipeline_email",
@@ -495,13 +460,13 @@ def update_pipeline_status(invoice_id):
 
     if stage == "payment_not_received":
         pipeline.payment_issue_notified_at = pipeline.payment_issue_notified_at or now
-        db.session.add(InvoicePipelineHistory(
+        record_pipeline_history(
             invoice_id=invoice_id,
             stage=stage,
             action="email",
             note="Payment issue email sent to contact. Please contact support to continue order.",
             actor_user_id=actor_user_id,
-        ))
+        )
 
         create_audit_log(
             entity_type="invoice_pipeline_email",
@@ -529,17 +494,17 @@ def update_pipeline_status(invoice_id):
             source_id=invoice.invoice_id,
         )
 
-        _notify_pipeline_followers(
+        notify_pipeline_followers(
             invoice,
-            account,
+            account.business_name,
             stage,
             actor_user_id=actor_user_id,
             action_required=True,
         )
     else:
-        _notify_pipeline_followers(
+        notify_pipeline_followers(
             invoice,
-            account,
+            account.business_name,
             stage,
             actor_user_id=actor_user_id,
         )
@@ -589,13 +554,15 @@ def add_pipeline_note(invoice_id):
         return jsonify({"error": "Invoice not found"}), 404
 
     _ensure_pipeline(invoice)
-    db.session.add(InvoicePipelineHistory(
-        invoice_id=invoice_id,
-        stage=stage,
-        action="note",
-        note=note,
-        actor_user_id=actor_user_id,
-    ))
+    history = {
+        "invoice_id": invoice_id,
+        "stage": stage,
+        "action": "note",
+        "note": note,
+        "actor_user_id": actor_user_id,
+    }
+    db.session.add(InvoicePipelineHistory(**history))
+    publish_pipeline_history([dict(history, created_at=datetime.now())])
 
     create_audit_log(
         entity_type="invoice_pipeline",
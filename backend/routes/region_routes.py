@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from models import Region
 from database import db
+from reference_cache import invalidate_reference
 
 region_bp = Blueprint("regions", __name__)
 
@@ -26,6 +27,7 @@ def add_region():
     region = Region(region_name=region_name)
     db.session.add(region)
     db.session.commit()
+    invalidate_reference(Region)
     return jsonify({"region_id": region.region_id, "region_name": region.region_name}), 201
 
 @region_bp.route("/<int:region_id>", methods=["PUT"])
@@ -41,4 +43,5 @@ def update_region(region_id):
 
     region.region_name = new_name
     db.session.commit()
+    invalidate_reference(Region)
     return jsonify({"message": "Region updated"}), 200
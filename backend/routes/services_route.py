@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from models import Service
 from database import db
+from reference_cache import all_references, invalidate_reference
 
 service_bp = Blueprint("service", __name__)
 
@@ -16,6 +17,7 @@ def update_service_status(service_id):
     invoice = Service.query.get_or_404(service_id)
     invoice.status = new_status
     db.session.commit()
+    invalidate_reference(Service)
 
     return jsonify({"message": f"Service {service_id} status updated to {new_status}"}), 200
 
@@ -30,12 +32,13 @@ def create_service():
     )
     db.session.add(new_service)
     db.session.commit()
+    invalidate_reference(Service)
     return jsonify({"message": "Service created", "service_id": new_service.service_id}), 201
 
 # Get all services
 @service_bp.route("/", methods=["GET"])
 def get_services():
-    services = Service.query.all()
+    services = all_references(Service)
     return jsonify([
         {
             "service_id": s.service_id,
@@ -54,6 +57,7 @@ def update_service(service_id):
     service.price_per_unit = data.get("price_per_unit", service.price_per_unit)
 
     db.session.commit()
+    invalidate_reference(Service)
     return jsonify({"message": "Service updated successfully"}), 200
 
 # Delete a service by ID
@@ -62,4 +66,5 @@ def delete_service(service_id):
     service = Service.query.get_or_404(service_id)
     db.session.delete(service)
     db.session.commit()
+    invalidate_reference(Service)
     return jsonify({"message": "Service deleted"}), 200
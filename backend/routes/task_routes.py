@@ -1,31 +1,18 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
-from models import Tasks, TaskNotes, Users, Account, ContactFollowers
+from models import Tasks, TaskNotes, Users, Account
 from database import db
+from notification_fanout import notify_contact_followers
 from notifications import create_notification
 from audit import create_audit_log
+from analytics_rollups import refresh_rollups, rollup_keys
+from reminder_schedule import TASK, schedule_task_reminders, unschedule
+from pagination import SortKey, page_payload, page_request, paginate
+from serializers import serialize_task_row, with_task_columns
 
 task_bp = Blueprint("tasks", __name__)
 
 
-def _notify_contact_followers(contact_id, actor_user_id, title, message, link):
-    if not contact_id:
-        return
-    follower_rows = ContactFollowers.query.filter_by(contact_id=contact_id).all()
-    for row in follower_rows:
-        if actor_user_id and row.user_id == actor_user_id:
-            continue
-        create_notification(
-            user_id=row.user_id,
-            notif_type="contact_activity",
-            title=title,
-            message=message,
-            link=link,
-            source_type="contact",
-            source_id=contact_id,
-        )
-
-
 #  Fetch Tasks Assigned to User
 @task_bp.route("/", methods=["GET"])
 def get_tasks():
@@ -38,7 +25,7 @@ def get_tasks():
     if not user_id and not include_all:
         return jsonify({"message": "User ID required"}), 400
 
-    query = Tasks.query
+    query = with_task_columns(Tasks.query)
     if user_id:
         query = query.filter(Tasks.assigned_to == user_id)
     if account_id:
@@ -46,49 +33,24 @@ def get_tasks():
     if contact_id:
         query = query.filter(Tasks.contact_id == contact_id)
 
-    tasks = query.all()
-
+    page = page_request()
+    if page:
+        page = paginate(query, [SortKey(Tasks.task_id)], lambda row: (row.Tasks.task_id,), page)
+        rows = page.rows
+    else:
+        rows = query.all()
 
-    return jsonify([{
-        "task_id": task.task_id,
-        "user_id": task.user_id,  # Creator of the task
-        "assigned_to": task.assigned_to,  # Who the task is assigned to
-        "task_description": task.task_description,
-        "due_date": task.due_date,
-        "is_completed": task.is_completed,
-        "is_followup": task.is_followup,
-        "account_id": task.account_id, # If task is associated with an account
-        "invoice_id": task.invoice_id,
-        "contact_id": task.contact_id,
-        "account_name": Account.query.get(task.account_id).business_name if task.account_id else "No Account", # Name of associated account
-        "created_by": Users.query.get(task.user_id).username if task.user_id else "Unknown",  #  Show creator's username
-        "date_created": task.date_created.strftime("%Y-%m-%d %H:%M:%S") if task.date_created else None,
-    } for task in tasks])
+    task_list = [serialize_task_row(row) for row in rows]
+    if page:
+        return jsonify(page_payload(page, task_list))
+    return jsonify(task_list)
 
 # Fetch Tasks By Account ID
 @task_bp.route("/accounts/<int:account_id>/tasks", methods=["GET"])
 def get_tasks_by_account(account_id):
     """Fetch all tasks associated with a specific account"""
-    tasks = Tasks.query.filter_by(account_id=account_id).all()
-
-    if not tasks:
-        return jsonify([]), 200  # Return empty list if no tasks found
-
-    return jsonify([{
-        "task_id": task.task_id,
-        "user_id": task.user_id,  # Creator of the task
-        "assigned_to": task.assigned_to,  # Who the task is assigned to
-        "task_description": task.task_description,
-        "due_date": task.due_date,
-        "is_completed": task.is_completed,
-        "is_followup": task.is_followup,
-        "account_id": task.account_id,  # If task is associated with an account
-        "invoice_id": task.invoice_id,
-        "contact_id": task.contact_id,
-        "account_name": Account.query.get(task.account_id).business_name if task.account_id else "No Account",
-        "created_by": Users.query.get(task.user_id).username if task.user_id else "Unknown",
-        "date_created": task.date_created.strftime("%Y-%m-%d %H:%M:%S") if task.date_created else None,
-    } for task in tasks])
+    rows = with_task_columns(Tasks.query).filter(Tasks.account_id == account_id).all()
+    return jsonify([serialize_task_row(row) for row in rows])
 
 
 # Fetch Task By ID
@@ -193,24 +155,8 @@ def create_task_note(task_id):
 # Fetch Tasks By Invoice ID
 @task_bp.route("/invoice/<int:invoice_id>", methods=["GET"])
 def get_tasks_by_invoice(invoice_id):
-    tasks = Tasks.query.filter_by(invoice_id=invoice_id).all()
-    if not tasks:
-        return jsonify([]), 200
-
-    return jsonify([{
-        "task_id": task.task_id,
-        "user_id": task.user_id,
-        "assigned_to": task.assigned_to,
-        "task_description": task.task_description,
-        "due_date": task.due_date,
-        "is_completed": task.is_completed,
-        "is_followup": task.is_followup,
-        "account_id": task.account_id,
-        "invoice_id": task.invoice_id,
-        "account_name": Account.query.get(task.account_id).business_name if task.account_id else "No Account",
-        "created_by": Users.query.get(task.user_id).username if task.user_id else "Unknown",
-        "date_created": task.date_created.strftime("%Y-%m-%d %H:%M:%S") if task.date_created else None,
-    } for task in tasks])
+    rows = with_task_columns(Tasks.query).filter(Tasks.invoice_id == invoice_id).all()
+    return jsonify([serialize_task_row(row, include_contact=False) for row in rows])
 
 
 
@@ -268,7 +214,9 @@ def create_task():
         source_id=new_task.task_id,
     )
 
-    _notify_contact_followers(
+    schedule_task_reminders([new_task.task_id])
+
+    notify_contact_followers(
         new_task.contact_id,
         data.get("actor_user_id") or new_task.user_id,
         "Contact task created",
@@ -297,6 +245,7 @@ def create_task():
         invoice_id=new_task.invoice_id,
         contact_id=new_task.contact_id,
     )
+    refresh_rollups(rollup_keys(new_task))
     db.session.commit()
 
     return jsonify({
@@ -373,6 +322,7 @@ def update_task(task_id):
     }
     assigned_before = task.assigned_to
     was_completed = task.is_completed
+    rollup_before = rollup_keys(task)
     if "user_id" in data:
         task.user_id = _clean_int(data["user_id"])
     if "assigned_to" in data:
@@ -387,6 +337,10 @@ def update_task(task_id):
         parsed_completed = _parse_bool(data["is_completed"])
         if parsed_completed is not None:
             task.is_completed = parsed_completed
+            if task.is_completed and not was_completed:
+                task.completed_at = datetime.now()
+            elif not task.is_completed:
+                task.completed_at = None
     if "account_id" in data:
         task.account_id = _clean_int(data["account_id"])
     if "invoice_id" in data:
@@ -426,7 +380,7 @@ def update_task(task_id):
                 source_type="task",
                 source_id=task.task_id,
             )
-        _notify_contact_followers(
+        notify_contact_followers(
             task.contact_id,
             actor_user_id,
             "Contact task completed",
@@ -457,6 +411,8 @@ def update_task(task_id):
         invoice_id=task.invoice_id,
         contact_id=task.contact_id,
     )
+    refresh_rollups(rollup_before | rollup_keys(task))
+    schedule_task_reminders([task.task_id])
     db.session.commit()
 
     return jsonify({
@@ -491,7 +447,9 @@ def delete_task(task_id):
         "invoice_id": task.invoice_id,
     }
 
+    rollup_before = rollup_keys(task)
     db.session.delete(task)
+    unschedule(TASK, [task_id])
     create_audit_log(
         entity_type="task",
         entity_id=task_id,
@@ -503,6 +461,7 @@ def delete_task(task_id):
         account_id=task.account_id,
         invoice_id=task.invoice_id,
     )
+    refresh_rollups(rollup_before)
     db.session.commit()
 
     return jsonify({"message": "Task deleted successfully"}), 200
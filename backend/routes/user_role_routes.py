@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from models import UserRoles
 from database import db
+from reference_cache import all_references, get_reference, invalidate_reference
+from session_profiles import invalidate_session_profiles
 
 user_role_bp = Blueprint("user_roles", __name__)
 
@@ -8,7 +10,7 @@ user_role_bp = Blueprint("user_roles", __name__)
 # Fetch All Roles
 @user_role_bp.route("/roles", methods=["GET"])
 def get_all_roles():
-    roles = UserRoles.query.all()
+    roles = all_references(UserRoles)
     return jsonify([{
         "role_id": role.role_id,
         "role_name": role.role_name,
@@ -20,7 +22,7 @@ def get_all_roles():
 # Fetch Role by ID
 @user_role_bp.route("/roles/<int:role_id>", methods=["GET"])
 def get_role_by_id(role_id):
-    role = UserRoles.query.get(role_id)
+    role = get_reference(UserRoles, role_id)
     if not role:
         return jsonify({"message": "Role not found"}), 404
 
@@ -48,6 +50,8 @@ def create_role():
 
     db.session.add(new_role)
     db.session.commit()
+    invalidate_reference(UserRoles)
+    invalidate_session_profiles()
 
     return jsonify({"message": "Role created successfully", "role_id": new_role.role_id}), 201
 
@@ -65,6 +69,8 @@ def update_role(role_id):
     role.is_lead = data.get("is_lead", role.is_lead)
 
     db.session.commit()
+    invalidate_reference(UserRoles)
+    invalidate_session_profiles()
 
     return jsonify({"message": "Role updated successfully"}), 200
 
@@ -77,5 +83,7 @@ def delete_role(role_id):
 
     db.session.delete(role)
     db.session.commit()
+    invalidate_reference(UserRoles)
+    invalidate_session_profiles()
 
     return jsonify({"message": "Role deleted successfully"}), 200
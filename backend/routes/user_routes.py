@@ -4,6 +4,9 @@ from database import db
 from werkzeug.security import generate_password_hash
 from audit import create_audit_log
 from notifications import create_notification
+from contact_search import contact_ids_for_owner, refresh_contact_search
+from reference_cache import get_reference
+from session_profiles import invalidate_session_profile
 
 user_bp = Blueprint("users", __name__)
 
@@ -198,6 +201,10 @@ def update_user(user_id):
         after_data=after_data,
     )
 
+    if (before_data["first_name"], before_data["last_name"]) != (after_data["first_name"], after_data["last_name"]):
+        refresh_contact_search(contact_ids_for_owner(user.user_id))
+
+    invalidate_session_profile(user.user_id)
     db.session.commit()
     return jsonify({"message": "User updated"}), 200
 
@@ -230,6 +237,7 @@ def delete_user(user_id):
         before_data=before_data,
         after_data=None,
     )
+    invalidate_session_profile(user_id)
     db.session.commit()
     return jsonify({"message": "User deleted"}), 200
 
@@ -244,7 +252,7 @@ def get_user_by_id(user_id):
     # Fetch department name
     department_name = None
     if user.department_id:
-        department = Departments.query.get(user.department_id)
+        department = get_reference(Departments, user.department_id)
         department_name = department.department_name if department else "Unknown"
 
     # Fetch role name and description
@@ -252,7 +260,7 @@ def get_user_by_id(user_id):
     role_description = None
     is_department_lead = False
     if user.role_id:
-        role = UserRoles.query.get(user.role_id)
+        role = get_reference(UserRoles, user.role_id)
         if role:
             role_name = role.role_name
             role_description = role.description
@@ -266,7 +274,7 @@ def get_user_by_id(user_id):
     branch_zip_code = None
     branch_phone_number = None
     if user.branch_id:
-        branch = Branches.query.get(user.branch_id)
+        branch = get_reference(Branches, user.branch_id)
         if branch:
             branch_name = branch.branch_name if branch else "Unknown"
             branch_address = branch.address if branch else "Unknown"
@@ -0,0 +1,237 @@
+import hashlib
+import os
+import re
+import time
+from datetime import datetime
+
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from database import db
+from models import SchemaMigration
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction, so files
+# using it run statement by statement in autocommit mode.
+_CONCURRENT = re.compile(r"\bCONCURRENTLY\b", re.IGNORECASE)
+_CREATE_INDEX_CONCURRENTLY = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?([A-Za-z_][A-Za-z0-9_]*)",
+    re.IGNORECASE,
+)
+
+
+class Migration:
+    def __init__(self, version, path):
+        self.version = version
+        self.path = path
+        self._sql = None
+
+    @property
+    def sql(self):
+        if self._sql is None:
+            with open(self.path, encoding="utf-8") as handle:
+                self._sql = handle.read()
+        return self._sql
+
+    @property
+    def checksum(self):
+        return hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+    @property
+    def transactional(self):
+        return not _CONCURRENT.search(self.sql)
+
+
+def available_migrations(directory=MIGRATIONS_DIR):
+    """
+    Migration files in version order: the file name, sorted as a string.
+
+    Names start with the date (``YYYY_MM_DD_``); files added on the same day
+    carry a two-digit sequence after it (``2026_10_17_01_...``) so they apply
+    in the order they were written.
+    """
+    return [
+        Migration(name[:-4], os.path.join(directory, name))
+        for name in sorted(os.listdir(directory))
+        if name.endswith(".sql")
+    ]
+
+
+def split_statements(sql):
+    """Split a SQL script on top-level semicolons, respecting quotes, comments and $$ bodies."""
+    statements, current = [], []
+    idx, length = 0, len(sql)
+    while idx < length:
+        char = sql[idx]
+        if sql.startswith("--", idx):
+            end = sql.find("\n", idx)
+            idx = length if end == -1 else end
+            continue
+        if sql.startswith("/*", idx):
+            end = sql.find("*/", idx + 2)
+            idx = length if end == -1 else end + 2
+            continue
+        if char in ("'", '"'):
+            end = idx + 1
+            while end < length:
+                if sql[end] == char:
+                    if end + 1 < length and sql[end + 1] == char:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            current.append(sql[idx:end + 1])
+            idx = end + 1
+            continue
+        if char == "$":
+            tag = re.match(r"\$[A-Za-z_]*\$", sql[idx:])
+            if tag:
+                end = sql.find(tag.group(0), idx + len(tag.group(0)))
+                end = length if end == -1 else end + len(tag.group(0))
+                current.append(sql[idx:end])
+                idx = end
+                continue
+        if char == ";":
+            statement = "".join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(char)
+        idx += 1
+    statement = "".join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def _ensure_table():
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+
+
+def applied_migrations():
+    """{version: checksum} of every recorded migration."""
+    _ensure_table()
+    with db.engine.connect() as conn:
+        rows = conn.execute(select(SchemaMigration.version, SchemaMigration.checksum)).all()
+    return {row.version: row.checksum for row in rows}
+
+
+def _record(conn, migration, duration_ms):
+    conn.execute(SchemaMigration.__table__.insert().values(
+        version=migration.version,
+        checksum=migration.checksum,
+        applied_at=datetime.utcnow(),
+        duration_ms=duration_ms,
+    ))
+
+
+def _run(conn, sql):
+    # Straight to the DBAPI cursor: no parameters, so literal % signs survive.
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(sql)
+    finally:
+        cursor.close()
+
+
+def _drop_invalid_index(conn, statement):
+    """A failed CREATE INDEX CONCURRENTLY leaves an INVALID index that IF NOT EXISTS would skip."""
+    match = _CREATE_INDEX_CONCURRENTLY.search(statement)
+    if not match:
+        return
+    invalid = conn.execute(text(
+        "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+        "WHERE c.relname = :name AND NOT i.indisvalid"
+    ), {"name": match.group(1)}).first()
+    if invalid:
+        print(f"⚠️  Dropping invalid index {match.group(1)} left by an earlier attempt")
+        _run(conn, f'DROP INDEX CONCURRENTLY IF EXISTS "{match.group(1)}"')
+
+
+def apply_migration(migration):
+    """Run one migration and record it; returns its wall time in milliseconds."""
+    started = time.perf_counter()
+    if migration.transactional:
+        with db.engine.begin() as conn:
+            _run(conn, migration.sql)
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            _record(conn, migration, duration_ms)
+        return duration_ms
+
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for statement in split_statements(migration.sql):
+            _drop_invalid_index(conn, statement)
+            _run(conn, statement)
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        _record(conn, migration, duration_ms)
+    return duration_ms
+
+
+def pending_migrations():
+    applied = applied_migrations()
+    return [migration for migration in available_migrations() if migration.version not in applied]
+
+
+def upgrade(target=None):
+    """Apply pending migrations in order (up to and including ``target``); returns those applied."""
+    done = []
+    for migration in pending_migrations():
+        if target and migration.version > target:
+            break
+        mode = "" if migration.transactional else " (online, no transaction)"
+        print(f"⏳ {migration.version}{mode}")
+        duration_ms = apply_migration(migration)
+        print(f"✅ {migration.version} in {duration_ms} ms")
+        done.append(migration)
+    return done
+
+
+def baseline(target=None):
+    """Record migrations as applied without running them (databases migrated by hand or built by create_all)."""
+    recorded = []
+    with db.engine.begin() as conn:
+        for migration in pending_migrations():
+            if target and migration.version > target:
+                break
+            _record(conn, migration, 0)
+            recorded.append(migration)
+    return recorded
+
+
+def check_schema(app):
+    """
+    Startup check: compare the recorded versions with the migration files.
+
+    One query against ``schema_migrations``, whatever the size of the schema;
+    nothing is created or altered. ``SCHEMA_CHECK`` (app config or environment)
+    is ``warn`` (default), ``strict`` (refuse to boot when behind) or ``off``.
+    """
+    mode = (app.config.get("SCHEMA_CHECK") or os.environ.get("SCHEMA_CHECK") or "warn").strip().lower()
+    if mode == "off":
+        return None
+
+    files = [name[:-4] for name in os.listdir(MIGRATIONS_DIR) if name.endswith(".sql")]
+    with app.app_context():
+        try:
+            with db.engine.connect() as conn:
+                applied = set(conn.execute(select(SchemaMigration.version)).scalars())
+        except (OperationalError, ProgrammingError) as exc:
+            message = f"schema version unknown ({exc.__class__.__name__}); run python -m scripts.migrate status"
+            if mode == "strict":
+                raise RuntimeError(message) from exc
+            print(f"⚠️  {message}")
+            return None
+        finally:
+            # Don't hand a pooled connection to forked workers.
+            db.engine.dispose()
+
+    pending = sorted(set(files) - applied)
+    if pending:
+        message = f"{len(pending)} pending migration(s), starting with {pending[0]}; run python -m scripts.migrate upgrade"
+        if mode == "strict":
+            raise RuntimeError(message)
+        print(f"⚠️  {message}")
+    return pending
@@ -0,0 +1,70 @@
+import argparse
+import statistics
+import time
+
+from app import app
+from models import Users
+from session_store import SESSION_BACKENDS, init_sessions
+
+
+def _percentile(values, fraction):
+    return values[min(int(round(fraction * (len(values) - 1))), len(values) - 1)]
+
+
+def _bench(backend, user_id, requests, warmup):
+    init_sessions(app, backend)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+        session.permanent = True
+
+    for _ in range(warmup):
+        client.get("/auth/session")
+
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get("/auth/session")
+        timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"{backend}: /auth/session returned {response.status_code}")
+    timings.sort()
+    return {
+        "mean": statistics.mean(timings),
+        "p50": _percentile(timings, 0.50),
+        "p95": _percentile(timings, 0.95),
+        "p99": _percentile(timings, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-request overhead of the session backends on /auth/session.")
+    parser.add_argument("--backends", nargs="+", choices=SESSION_BACKENDS, default=list(SESSION_BACKENDS))
+    parser.add_argument("--requests", type=int, default=500, help="Timed requests per backend")
+    parser.add_argument("--warmup", type=int, default=50, help="Untimed requests per backend")
+    parser.add_argument("--user-id", type=int, help="User to log in as (defaults to the first user)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        user_id = args.user_id or Users.query.order_by(Users.user_id).first().user_id
+
+    results = {}
+    for backend in args.backends:
+        try:
+            results[backend] = _bench(backend, user_id, args.requests, args.warmup)
+        except Exception as exc:
+            print(f"⚠️  {backend}: skipped ({exc})")
+
+    if not results:
+        return
+    baseline = min(result["p50"] for result in results.values())
+    print(f"{'backend':<12}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'p50 +ms':>10}")
+    for backend, result in results.items():
+        print(
+            f"{backend:<12}{result['mean']:>10.2f}{result['p50']:>10.2f}{result['p95']:>10.2f}"
+            f"{result['p99']:>10.2f}{result['p50'] - baseline:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, text
+
+from app import app
+from database import db
+from models import AuditLog, CalendarEvent, ContactInteractions, Invoice, Notifications, Payment, Tasks
+
+
+# At or above this many rows the planner's own choice must not be a sequential
+# scan. Smaller tables (mock data is a few dozen rows) are checked with
+# sequential scans disabled instead, which still shows whether an index fits.
+DEFAULT_MIN_ROWS = 10000
+
+
+def _sample(column):
+    return db.session.query(column).filter(column.isnot(None)).order_by(column).limit(1).scalar()
+
+
+def _main_queries():
+    user_id = _sample(Tasks.assigned_to)
+    sales_rep_id = _sample(Invoice.sales_rep_id)
+    account_id = _sample(Invoice.account_id)
+    invoice_id = _sample(Payment.invoice_id)
+    contact_id = _sample(ContactInteractions.contact_id)
+    notification_user_id = _sample(Notifications.user_id)
+    now = datetime.now()
+    month_start = now.date().replace(day=1)
+    month_end = month_start + timedelta(days=31)
+
+    return {
+        "invoices by sales rep": Invoice.query.filter(Invoice.sales_rep_id == sales_rep_id)
+        .order_by(Invoice.invoice_id.desc()).limit(50),
+        "invoices by account": Invoice.query.filter(Invoice.account_id == account_id),
+        "payments by invoice": Payment.query.filter(Payment.invoice_id == invoice_id),
+        "payment ledger page": Payment.query.order_by(Payment.date_paid.desc(), Payment.payment_id.desc()).limit(50),
+        "payments by account": Payment.query.filter(Payment.account_id == account_id)
+        .order_by(Payment.date_paid.desc()).limit(50),
+        "tasks by assignee": Tasks.query.filter(Tasks.assigned_to == user_id).order_by(Tasks.task_id).limit(50),
+        "overdue tasks": db.session.query(func.count(Tasks.task_id)).filter(
+            Tasks.is_completed == False,
+            Tasks.due_date.isnot(None),
+            Tasks.due_date < now,
+        ),
+        "overdue tasks by assignee": db.session.query(func.count(Tasks.task_id)).filter(
+            Tasks.assigned_to == user_id,
+            Tasks.is_completed == False,
+            Tasks.due_date.isnot(None),
+            Tasks.due_date < now,
+        ),
+        "notification feed": Notifications.query.filter_by(user_id=notification_user_id)
+        .order_by(Notifications.created_at.desc()).limit(50),
+        "unread notifications": Notifications.query.filter_by(user_id=notification_user_id, is_read=False)
+        .order_by(Notifications.created_at.desc()).limit(50),
+        "notification feed by id": Notifications.query.filter_by(user_id=notification_user_id)
+        .order_by(Notifications.notification_id.desc()).limit(50),
+        "audit log by entity type": AuditLog.query.filter(AuditLog.entity_type == "invoice")
+        .order_by(AuditLog.created_at.desc()).limit(200),
+        "contact timeline": ContactInteractions.query.filter_by(contact_id=contact_id)
+        .order_by(ContactInteractions.created_at.desc()),
+        "calendar month for user": CalendarEvent.query.filter(
+            CalendarEvent.user_id == user_id,
+            CalendarEvent.start_date <= month_end,
+            CalendarEvent.end_date >= month_start,
+        ),
+        "calendar month": CalendarEvent.query.filter(
+            CalendarEvent.start_date <= month_end,
+            CalendarEvent.end_date >= month_start,
+        ),
+    }
+
+
+def _seq_scans(plan):
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", ()):
+        yield from _seq_scans(child)
+
+
+def _full_index_walks(plan):
+    """Index scans with no Index Cond that filter rows: the whole index read just to discard most of it."""
+    if "Index" in plan.get("Node Type", "") and "Index Cond" not in plan and "Filter" in plan:
+        yield plan.get("Index Name") or plan.get("Relation Name")
+    for child in plan.get("Plans", ()):
+        yield from _full_index_walks(child)
+
+
+def _explain(sql):
+    plan = db.session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+
+
+def _forced_plan(sql):
+    """The plan with sequential scans disabled; one that still has a Seq Scan has no usable index."""
+    db.session.execute(text("SET LOCAL enable_seqscan = off"))
+    try:
+        return _explain(sql)
+    finally:
+        db.session.rollback()
+
+
+def _table_rows():
+    rows = db.session.execute(text("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'")).all()
+    return {name: int(tuples) for name, tuples in rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="EXPLAIN the main route queries and fail when one can't be served by an index."
+    )
+    parser.add_argument("--min-rows", type=int, default=DEFAULT_MIN_ROWS,
+                        help="Tables this large must not be sequentially scanned even in the planner's own plan")
+    parser.add_argument("--verbose", action="store_true", help="Print every plan")
+    args = parser.parse_args()
+
+    with app.app_context():
+        table_rows = _table_rows()
+        failures = []
+        for name, query in _main_queries().items():
+            sql = str(query.statement.compile(db.engine, compile_kwargs={"literal_binds": True}))
+            plan = _explain(sql)
+            forced = _forced_plan(sql)
+            if args.verbose:
+                print(f"--- {name}\n{json.dumps(plan, indent=2)}\n--- {name} (enable_seqscan = off)\n{json.dumps(forced, indent=2)}")
+            problems = []
+            scanned = sorted({table for table in _seq_scans(plan) if table_rows.get(table, 0) >= args.min_rows})
+            if scanned:
+                problems.append(f"sequential scan on {', '.join(scanned)}")
+            unindexed = sorted(set(_seq_scans(forced)) - set(scanned))
+            if unindexed:
+                problems.append(f"no usable index on {', '.join(unindexed)}")
+            walked = sorted(set(_full_index_walks(forced)))
+            if walked:
+                problems.append(f"full index walk with a filter on {', '.join(walked)}")
+            if problems:
+                failures.append(name)
+                print(f"❌ {name}: {'; '.join(problems)}")
+            else:
+                print(f"✅ {name} (cost {plan['Total Cost']:.0f}, index plan {forced['Total Cost']:.0f})")
+
+    if failures:
+        print(f"⚠️  {len(failures)} quer{'y' if len(failures) == 1 else 'ies'} can't be served by an index.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,10 @@ from datetime import date, datetime, timedelta
 import pytz
 
 from app import app
+from analytics_rollups import rebuild_rollups
+from contact_search import rebuild_contact_search
 from database import db
+from invoice_balances import rebuild_invoice_balances
 from models import (
     Account,
     AccountContacts,
@@ -27,6 +30,7 @@ from models import (
     Users,
     Commissions,
 )
+from reminder_schedule import rebuild_reminder_schedule
 
 
 central = pytz.timezone("America/Chicago")
@@ -468,6 +472,10 @@ def main():
             db.session.add(task)
 
         db.session.commit()
+        rebuild_invoice_balances()
+        rebuild_contact_search()
+        rebuild_rollups()
+        rebuild_reminder_schedule()
 
         print("✅ Mock data generated successfully.")
         print("Accounts created: 3 (1 contact each)")
@@ -0,0 +1,67 @@
+import argparse
+import os
+import sys
+
+# The migrator must start even when SCHEMA_CHECK=strict would refuse to boot.
+os.environ["SCHEMA_CHECK"] = "off"
+
+from app import app
+from database import db
+from schema_migrations import applied_migrations, available_migrations, baseline, upgrade
+
+
+def _status():
+    applied = applied_migrations()
+    pending = 0
+    for migration in available_migrations():
+        if migration.version not in applied:
+            state = "pending"
+            pending += 1
+        elif applied[migration.version] != migration.checksum:
+            state = "changed since applied"
+        else:
+            state = "applied"
+        mode = "" if migration.transactional else "  [online]"
+        print(f"{state:<22}{migration.version}{mode}")
+    return pending
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the versioned SQL migrations in migrations/.")
+    parser.add_argument(
+        "command",
+        choices=("status", "upgrade", "baseline", "init"),
+        help="status: list migrations; upgrade: apply pending ones; "
+             "baseline: mark pending ones up to --to applied without running them (existing databases); "
+             "init: create an empty database from the models, then baseline",
+    )
+    parser.add_argument("--to", dest="target", help="Stop after this version")
+    args = parser.parse_args()
+
+    if args.target and args.target not in {migration.version for migration in available_migrations()}:
+        print(f"❌ Unknown migration version: {args.target}")
+        sys.exit(2)
+
+    with app.app_context():
+        if args.command == "status":
+            pending = _status()
+            print(f"{pending} pending migration(s).")
+            sys.exit(1 if pending else 0)
+        elif args.command == "upgrade":
+            applied = upgrade(args.target)
+            print(f"✅ Applied {len(applied)} migration(s).")
+        else:
+            if args.command == "init":
+                db.create_all()
+            elif not args.target:
+                # Without a target every pending file would be marked applied,
+                # including ones this database has never run.
+                print("❌ baseline needs --to <version>: the last migration already applied by hand.")
+                print("   Run `upgrade` afterwards to apply the rest.")
+                sys.exit(2)
+            recorded = baseline(args.target)
+            print(f"✅ Recorded {len(recorded)} migration(s) as applied.")
+
+
+if __name__ == "__main__":
+    main()
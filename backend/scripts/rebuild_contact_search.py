@@ -0,0 +1,16 @@
+import argparse
+
+from app import app
+from contact_search import rebuild_contact_search
+
+
+def main():
+    argparse.ArgumentParser(description="Rebuild the contact search index from contacts, accounts and users.").parse_args()
+
+    with app.app_context():
+        rebuilt = rebuild_contact_search()
+        print(f"✅ Indexed {rebuilt} contact(s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import argparse
+
+from app import app
+from invoice_balances import rebuild_invoice_balances, verify_invoice_balances
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild or verify the materialized invoice balances.")
+    parser.add_argument("--verify", action="store_true", help="Only report mismatches; do not rewrite balances")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.verify:
+            mismatches = verify_invoice_balances()
+            if not mismatches:
+                print("✅ Invoice balances match payments.")
+                return
+            print(f"⚠️  {len(mismatches)} invoice balance(s) out of sync:")
+            for mismatch in mismatches:
+                print(f"  - {mismatch}")
+            raise SystemExit(1)
+
+        rebuilt = rebuild_invoice_balances()
+        print(f"✅ Rebuilt {rebuilt} invoice balance(s).")
+
+
+if __name__ == "__main__":
+    main()
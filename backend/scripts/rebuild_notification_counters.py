@@ -0,0 +1,28 @@
+import argparse
+
+from app import app
+from notification_counters import rebuild_notification_counters, verify_notification_counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild or verify the per-user unread notification counters.")
+    parser.add_argument("--verify", action="store_true", help="Only report mismatches; do not rewrite counters")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.verify:
+            mismatches = verify_notification_counters()
+            if not mismatches:
+                print("✅ Notification counters match the notifications table.")
+                return
+            print(f"⚠️  {len(mismatches)} notification counter(s) out of sync:")
+            for mismatch in mismatches:
+                print(f"  - {mismatch}")
+            raise SystemExit(1)
+
+        rebuilt = rebuild_notification_counters()
+        print(f"✅ Rewrote {rebuilt} notification counter(s).")
+
+
+if __name__ == "__main__":
+    main()
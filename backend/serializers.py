@@ -0,0 +1,94 @@
+from sqlalchemy.orm import selectinload
+
+from models import Account, Contact, Tasks, Users
+
+
+def contact_load_options(include_accounts=False):
+    """Loader options that fetch contact owners (and account links) in one IN query each."""
+    options = [selectinload(Contact.contact_owner)]
+    if include_accounts:
+        options.append(selectinload(Contact.accounts))
+    return options
+
+
+def serialize_contact(contact, include_accounts=False):
+    owner = contact.contact_owner if contact.contact_owner_user_id else None
+    payload = {
+        "contact_id": contact.contact_id,
+        "first_name": contact.first_name,
+        "last_name": contact.last_name,
+        "title": contact.title,
+        "phone": contact.phone,
+        "email": contact.email,
+        "status": contact.status,
+        "do_not_call": contact.do_not_call,
+        "do_not_call_date": contact.do_not_call_date.isoformat() if contact.do_not_call_date else None,
+        "email_opt_out": contact.email_opt_out,
+        "email_opt_out_date": contact.email_opt_out_date.isoformat() if contact.email_opt_out_date else None,
+        "contact_owner_user_id": contact.contact_owner_user_id,
+        "contact_owner_name": f"{owner.first_name} {owner.last_name}".strip() if owner else None,
+        "created_at": contact.created_at.isoformat() if contact.created_at else None,
+        "updated_at": contact.updated_at.isoformat() if contact.updated_at else None,
+    }
+
+    if include_accounts:
+        payload["accounts"] = [
+            {
+                "account_id": account.account_id,
+                "business_name": account.business_name,
+                "phone_number": account.phone_number,
+                "email": account.email,
+                "address": account.address,
+                "city": account.city,
+                "state": account.state,
+                "zip_code": account.zip_code,
+                "sales_rep_id": account.sales_rep_id,
+            }
+            for account in contact.accounts
+        ]
+
+    return payload
+
+
+def account_load_options():
+    return [selectinload(Account.region_rel)]
+
+
+def with_task_columns(query):
+    """
+    Join the account name and creator username onto a Tasks query.
+
+    Rows then expose ``Tasks``, ``account_name`` and ``creator_username`` for
+    ``serialize_task_row``.
+    """
+    return (
+        query.outerjoin(Account, Account.account_id == Tasks.account_id)
+        .outerjoin(Users, Users.user_id == Tasks.user_id)
+        .add_columns(
+            Account.business_name.label("account_name"),
+            Users.username.label("creator_username"),
+        )
+    )
+
+
+def serialize_task_row(row, include_contact=True):
+    task = row.Tasks
+    payload = {
+        "task_id": task.task_id,
+        "user_id": task.user_id,  # Creator of the task
+        "assigned_to": task.assigned_to,  # Who the task is assigned to
+        "task_description": task.task_description,
+        "due_date": task.due_date,
+        "is_completed": task.is_completed,
+        "is_followup": task.is_followup,
+        "account_id": task.account_id,
+        "invoice_id": task.invoice_id,
+    }
+    if include_contact:
+        payload["contact_id"] = task.contact_id
+    payload.update({
+        "account_name": row.account_name if task.account_id else "No Account",
+        "created_by": row.creator_username if task.user_id else "Unknown",
+        "date_created": task.date_created.strftime("%Y-%m-%d %H:%M:%S") if task.date_created else None,
+    })
+    return payload
@@ -0,0 +1,89 @@
+from cache import cache, invalidate_on_commit
+from database import db
+from models import Branches, Departments, UserRoles, Users
+
+
+PROFILE_CACHE_TTL = 30
+# Every cached profile carries this tag, so role/department/branch edits can
+# drop them all at once; each user's profile also has its own tag.
+SESSION_PROFILES_TAG = "session_profiles"
+
+
+def session_profile_tag(user_id):
+    return f"session_profile:{user_id}"
+
+
+def _load_profile(user_id):
+    row = (
+        db.session.query(
+            Users.user_id,
+            Users.username,
+            Users.first_name,
+            Users.last_name,
+            Users.email,
+            Users.phone_number,
+            Users.extension,
+            Users.department_id,
+            Users.role_id,
+            Users.branch_id,
+            Users.receives_commission,
+            Users.commission_rate,
+            Users.salary,
+            Departments.department_name,
+            UserRoles.role_name,
+            UserRoles.description.label("role_description"),
+            UserRoles.is_lead,
+            Branches.branch_name,
+        )
+        .outerjoin(Departments, Departments.department_id == Users.department_id)
+        .outerjoin(UserRoles, UserRoles.role_id == Users.role_id)
+        .outerjoin(Branches, Branches.branch_id == Users.branch_id)
+        .filter(Users.user_id == user_id)
+        .first()
+    )
+    if row is None:
+        return None
+    return {
+        "user_id": row.user_id,
+        "username": row.username,
+        "first_name": row.first_name,
+        "last_name": row.last_name,
+        "email": row.email,
+        "phone_number": row.phone_number,
+        "extension": row.extension,
+        "department_id": row.department_id,
+        "department_name": row.department_name,
+        "role_id": row.role_id,
+        "role_name": row.role_name,
+        "role_description": row.role_description,
+        "is_department_lead": row.is_lead if row.role_name is not None else False,
+        "branch_id": row.branch_id,
+        "branch_name": row.branch_name,
+        "receives_commission": row.receives_commission,
+        "commission_rate": float(row.commission_rate) if row.commission_rate else None,
+        "salary": float(row.salary) if row.salary else None,
+    }
+
+
+def get_session_profile(user_id):
+    """
+    Profile payload for ``/auth/session``: user, department, role and branch
+    from one joined query, cached for ``PROFILE_CACHE_TTL`` seconds per user.
+    Returns None when the user does not exist (not cached).
+    """
+    return cache.cached(
+        f"auth:session_profile:{user_id}",
+        lambda: _load_profile(user_id),
+        ttl=PROFILE_CACHE_TTL,
+        tags=(session_profile_tag(user_id), SESSION_PROFILES_TAG),
+    )
+
+
+def invalidate_session_profile(user_id):
+    """Drop ``user_id``'s cached profile when the current transaction commits."""
+    invalidate_on_commit(session_profile_tag(user_id))
+
+
+def invalidate_session_profiles():
+    """Drop every cached profile now; call after committing a role/department/branch change."""
+    cache.invalidate_tags(SESSION_PROFILES_TAG)
@@ -0,0 +1,188 @@
+import os
+import secrets
+from datetime import datetime
+
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin, session_json_serializer
+from flask_session import Session
+from itsdangerous import BadSignature, Signer
+from sqlalchemy import delete, insert, select, update
+from werkzeug.datastructures import CallbackDict
+
+from cache import RedisCacheBackend, cache, redis_client
+from database import db
+from models import UserSession
+
+
+SESSION_BACKENDS = ("filesystem", "cookie", "redis", "database")
+SWEEP_BATCH_SIZE = 1000
+
+
+class DatabaseSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, expires_at=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.new = new
+        self.modified = False
+
+
+class DatabaseSessionInterface(SessionInterface):
+    """
+    Server-side sessions in the ``user_sessions`` table.
+
+    The cookie carries only a signed session id. Reads are one primary-key
+    lookup; an unmodified session is written back only once less than half of
+    its lifetime remains, so most requests never write. Expired rows are
+    ignored on read and deleted in batches by ``jobs.sweep_sessions``.
+    Statements run on their own connection so a session save never commits
+    the request's unit of work.
+    """
+
+    serializer = session_json_serializer
+    salt = "theofficecms-session"
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt, key_derivation="hmac")
+
+    def _new_session(self):
+        return DatabaseSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def _lifetime(self, app):
+        return app.permanent_session_lifetime
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return self._new_session()
+        try:
+            sid = self._signer(app).unsign(cookie).decode("utf-8")
+        except BadSignature:
+            return self._new_session()
+
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                select(UserSession.data, UserSession.expires_at)
+                .where(UserSession.session_id == sid)
+                .where(UserSession.expires_at > datetime.utcnow())
+            ).first()
+        if row is None:
+            return self._new_session()
+        return DatabaseSession(self.serializer.loads(row.data), sid=sid, expires_at=row.expires_at)
+
+    def _needs_refresh(self, app, session):
+        if session.expires_at is None:
+            return True
+        remaining = session.expires_at - datetime.utcnow()
+        return remaining < self._lifetime(app) / 2
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                with db.engine.begin() as conn:
+                    conn.execute(delete(UserSession).where(UserSession.session_id == session.sid))
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        refresh = self._needs_refresh(app, session)
+        if not session.modified and not refresh:
+            return
+
+        expires_at = datetime.utcnow() + self._lifetime(app)
+        with db.engine.begin() as conn:
+            if session.modified:
+                values = {"data": self.serializer.dumps(dict(session)), "expires_at": expires_at}
+            else:
+                values = {"expires_at": expires_at}
+            updated = conn.execute(
+                update(UserSession).where(UserSession.session_id == session.sid).values(**values)
+            ).rowcount
+            if not updated:
+                conn.execute(insert(UserSession).values(
+                    session_id=session.sid,
+                    data=self.serializer.dumps(dict(session)),
+                    expires_at=expires_at,
+                ))
+
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid).decode("utf-8"),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+def sweep_expired_sessions(batch_size=SWEEP_BATCH_SIZE, now=None):
+    """Delete expired ``user_sessions`` rows ``batch_size`` at a time; returns the number removed."""
+    now = now or datetime.utcnow()
+    removed = 0
+    while True:
+        expired = (
+            select(UserSession.session_id)
+            .where(UserSession.expires_at <= now)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        with db.engine.begin() as conn:
+            deleted = conn.execute(delete(UserSession).where(UserSession.session_id.in_(expired))).rowcount
+        removed += deleted
+        if deleted < batch_size:
+            return removed
+
+
+def _redis_session_client(app):
+    url = app.config.get("SESSION_REDIS_URL") or os.environ.get("SESSION_REDIS_URL")
+    if url:
+        return redis_client(url)
+    if isinstance(cache.backend, RedisCacheBackend):
+        return cache.backend.client
+    raise RuntimeError("SESSION_BACKEND=redis needs SESSION_REDIS_URL or a Redis CACHE_URL")
+
+
+def session_backend(app):
+    backend = app.config.get("SESSION_BACKEND") or os.environ.get("SESSION_BACKEND")
+    if not backend:
+        # Follow the cache tier: a shared Redis serves sessions too.
+        return "redis" if isinstance(cache.backend, RedisCacheBackend) else "filesystem"
+    backend = backend.strip().lower()
+    if backend not in SESSION_BACKENDS:
+        raise ValueError(f"Unknown SESSION_BACKEND {backend!r}; expected one of {', '.join(SESSION_BACKENDS)}")
+    return backend
+
+
+def init_sessions(app, backend=None):
+    """
+    Install the session interface named by ``SESSION_BACKEND`` (app config or environment).
+
+    ``cookie`` keeps the whole session in Flask's signed cookie: no server
+    I/O, but a session cannot be revoked server-side before it expires.
+    ``database`` stores it in ``user_sessions``; ``redis`` uses flask-session
+    on ``SESSION_REDIS_URL`` or the Redis cache tier, with Redis expiring keys.
+    ``filesystem`` is the original one-file-per-session store. Unset, sessions
+    go to Redis when the cache tier is Redis and to the filesystem otherwise.
+    Call after ``init_cache``.
+    """
+    backend = backend or session_backend(app)
+    if backend == "cookie":
+        app.session_interface = SecureCookieSessionInterface()
+    elif backend == "database":
+        app.session_interface = DatabaseSessionInterface()
+    elif backend == "redis":
+        app.config["SESSION_TYPE"] = "redis"
+        app.config["SESSION_REDIS"] = _redis_session_client(app)
+        Session(app)
+    else:
+        app.config["SESSION_TYPE"] = "filesystem"
+        Session(app)
+    app.config["SESSION_BACKEND"] = backend
+    return backend